@@ -15,12 +15,36 @@
         database for web page applications to use and create web pages from.
 
     Usage:
-        process_graphplots.py -c config_file -d config
+        process_graphplots.py -c config_file -d config [-s cmd[,cmd...]]
+            [-n | -f]
+        process_graphplots.py -c config_file -d config -q query
+        process_graphplots.py -c config_file -d config -b dir_path [-n]
+        process_graphplots.py -c config_file -d config -L [-n]
 
     Arguments:
         -c file => Graphplots configuration file.  Required arg.
             File will be file_name.py, but without the py extension.
         -d dir path => Directory path to config file (-c). Required arg.
+        -s cmd[,cmd...] => Process only the listed commands from
+            validate_cmds.  Each command is locked separately, so runs with
+            different commands can process at the same time.
+        -n => Dry run.  Prints the planned filesystem actions along with the
+            estimated bytes and system calls, but does not execute them.
+            No emails are sent and log entries are written to standard out.
+        -f => Force a full run, even if the configuration and the command
+            directories are unchanged since the last run.
+        -q column=value[,column=value...] => Query the catalog and print the
+            matching files.  Columns:  be, dtg, cmd, cc, region, final_path,
+            status, reason, fname, new_fname, run_id.  The dtg value is
+            matched as a prefix (i.e. dtg=201903).
+        -b dir path => Backfill the graph plot files in a source tree, such
+            as the archive, the non-processed directory or an old web tree,
+            into the web directories.  The source tree is left in place.  A
+            stopped backfill is resumed by rerunning it with the same source.
+        -L => Relayout the web tree.  Moves the files already in the web
+            directories into the directories of the web_layout setting, in
+            the background of the processing runs.  A stopped relayout is
+            resumed by rerunning it.
 
         configuration module -> name is runtime dependent as it can be
             used for different configurations on different servers.
@@ -67,7 +91,7 @@
         mail_notdeck_file = "Mail Not In Deck File"
         # File name for rejected graph plot file names.
         gp_reject_file = "Graph Plot Reject File"
-        # Name of lock file.
+        # Name of lock file.  Command name is appended for each command lock.
         lock_file = "process_graphplots.lock"
 
         # Documentum processing directories.
@@ -100,6 +124,138 @@
         # Directory Perm
         d_perm = 0NNN
 
+        # Multiple node processing (optional)
+        # Process on more than one server using per-file claim leases
+        #   instead of a single program lock.
+        multi_node = False
+        # Directory for the claim leases, must be shared by all servers.
+        #   Defaults to a ".claims" directory under gp_dir.
+        claim_dir = "/Directory Path"
+        # Seconds before an unreleased claim lease is reclaimed.  The leases
+        #   of a run are refreshed while it runs.
+        lease_time = 3600
+
+        # Scheduling (optional)
+        # Relative weight of each command when interleaving the files of the
+        #   commands.  Commands not listed have a weight of 1.
+        cmd_weights = {"command_dir": N, ...}
+        # Order of the files within a command by DTG:  "newest", "oldest" or
+        #   None for directory order.
+        dtg_order = "newest"
+        # Number of files whose actions are executed together, in the order
+        #   above.  0 executes the actions of all files together.
+        schedule_batch = 50
+
+        # No-op fast path (optional)
+        # Name of the state file in temp_dir recording the command directory
+        #   signatures at the end of the last run.
+        state_file = "process_graphplots.state"
+        # Seconds after which a full run is done even if nothing has changed.
+        state_max_age = 3600
+
+        # Backfill (optional)
+        # Number of worker threads placing the files of a backfill (-b).
+        backfill_workers = 8
+        # Number of files in a backfill batch.  Each batch is written to its
+        #   own JSON document and to the catalog and then checkpointed.
+        backfill_batch = 5000
+
+        # Consolidated log (optional)
+        # Log mode:  "run" for a new log in error_dir for each run or
+        #   "consolidated" for a single log shared by all runs.  Each line of
+        #   the consolidated log is prefixed with the time and the run id.
+        log_mode = "run"
+        # File name of the consolidated log in error_dir.
+        log_file = "process_graphplots.log"
+        # Size in bytes at which the consolidated log is rotated.
+        log_max_size = 10485760
+        # Time period of the rotation:  "hourly", "daily", "monthly" or None.
+        log_rotate = "daily"
+        # Number of rotated (compressed) segments kept.  None keeps all.
+        log_keep = 30
+
+        # Derivatives (optional)
+        # Create a thumbnail and a preview of each file placed in the web
+        #   directories, in the thumbs and previews sub-directories of the
+        #   directory of the file.  Requires PIL.
+        derivatives = False
+        # Maximum width and height of the thumbnails and the previews.
+        #   Set to 0 to skip a derivative.
+        thumb_size = 200
+        preview_size = 1024
+        # Number of processes creating the derivatives.  Default is the number
+        #   of cores.
+        derivative_workers = None
+
+        # I/O throttle (optional)
+        # Bandwidth (bytes per second) and IOPS (ops per second) limits of the
+        #   copies and moves to each destination:  image_dir, metacard_dir,
+        #   web and archive.  A destination or limit not set is not limited.
+        io_limits = {"image_dir": {"bytes": 20971520, "ops": 200}, ...}
+
+        # Retries (optional)
+        # Number of retries of a filesystem action failing with a transient
+        #   error (i.e. ESTALE, EIO, EBUSY).  Set to 0 to disable.
+        retry_max = 4
+        # Seconds before the first retry, doubled for each later retry.
+        retry_delay = 0.5
+
+        # Publication mode (optional)
+        # direct writes the web files and JSON document under their final
+        #   names.  atomic writes them to hidden temporary files and renames
+        #   them into place.  durable is atomic and also makes each batch
+        #   durable with one syncfs for each file system written to.
+        publish_mode = "direct"
+
+        # Web layout (optional)
+        # Directory a file is placed in under the region/cc/Gp/YYYY/MM month
+        #   directory:  month (the month directory), day (a DD sub-directory)
+        #   or hash (a sub-directory for each of 256 hash buckets of the file
+        #   name).  Existing web trees are moved to a new layout with -L.
+        web_layout = "month"
+
+        # Pipeline mode (optional)
+        # Validate, export and place each file as it goes in separate stages
+        #   instead of planning all files first.  Ignored for a dry run.
+        pipeline = False
+        # Number of files held in the queue between two stages.
+        pipeline_queue = 100
+
+        # Quiet window (optional)
+        # Files modified within this number of seconds and changed since the
+        #   previous run are deferred as still being written.  Default is 0.
+        quiet_window = 60
+
+        # Archive bundles (optional)
+        # Roll rejected and non-processed files into tar bundles.
+        bundle_archive = False
+        # Bundle period:  "daily" or "monthly".
+        bundle_period = "daily"
+        # Days a non-processed file is left before it is bundled.
+        nonproc_bundle_days = 7
+
+        # Web manifests (optional)
+        # Maintain a manifest in each web month directory with rollups in
+        #   the year and country directories.
+        web_manifest = False
+        # File name of the manifests.
+        manifest_name = "index.json"
+
+        # JPEG structure validation (optional)
+        # Reject JPEG files with a missing SOI/EOI marker or an invalid header
+        #   before any copy or move.  Default is True.
+        validate_jpeg = True
+
+        # Duplicate detection (optional)
+        # Policy for files with the same content as an earlier file:
+        #   hardlink|skip|report.  The hash index is kept in the catalog.
+        dup_policy = "hardlink"
+
+        # Catalog (optional)
+        # SQLite catalog of processed and rejected files.  Place on a local
+        #   file system, not a network mount.
+        catalog_db = "/Directory Path/gp_catalog.db"
+
     Example:
         process_graphplots.py -c graphplots -d config
 
@@ -112,6 +268,18 @@ import sys
 import datetime
 import os
 import re
+import errno
+import stat
+import time
+import io
+import mmap
+import struct
+import marshal
+import types
+import threading
+import traceback
+import signal
+import glob
 
 # Third party
 import json
@@ -120,12 +288,68 @@ import json
 import lib.arg_parser as arg_parser
 import lib.gen_libs as gen_libs
 import system
-import lib.gen_class as gen_class
 import version
 
+# Imported on first use, as a run with nothing to do does not need them.
+gzip = system.LazyImport("gzip")
+tarfile = system.LazyImport("tarfile")
+sqlite3 = system.LazyImport("sqlite3")
+hashlib = system.LazyImport("hashlib")
+queue = system.LazyImport("Queue" if sys.version_info[0] < 3 else "queue")
+gen_class = system.LazyImport("lib.gen_class")
+multiprocessing = system.LazyImport("multiprocessing")
+ctypes = system.LazyImport("ctypes")
+
 # Version
 __version__ = version.__version__
 
+# File extensions checked by the JPEG structure validation.
+JPEG_EXT = ["jpg", "jpeg", "jpe", "jfif"]
+
+# JPEG markers without a length field:  TEM and RST0-RST7.
+JPEG_STANDALONE = [0x01] + list(range(0xD0, 0xD8))
+
+# JPEG start of frame markers, excluding DHT, JPG and DAC.
+JPEG_SOF = [x for x in range(0xC0, 0xD0) if x not in [0xC4, 0xC8, 0xCC]]
+
+# Bytes read from the start of a JPEG file for the image information.
+IMAGE_HEADER_MAX = 131072
+
+# Name of the validation cache in the temp directory.
+VALID_CACHE = "process_graphplots.valid"
+
+# Seconds of the coarsest modify time resolution of the command directories.
+MTIME_TICK = 2
+
+# Name of the routing snapshot in the temp directory and of the index of the
+#   parked files in the non-processed directory.
+ROUTES_SNAPSHOT = "process_graphplots.routes"
+PARKED_INDEX = ".gp_parked.json"
+# Name of the list of parked files moved back for reprocessing.
+REPROCESS_LIST = ".gp_reprocess.json"
+
+# Name of the backfill and relayout checkpoints in the temp directory.
+BACKFILL_CHECKPOINT = "process_graphplots.backfill"
+RELAYOUT_CHECKPOINT = "process_graphplots.relayout"
+
+# Errors of a filesystem action which are retried, such as from an NFS mount.
+TRANSIENT_ERRNOS = [errno.ESTALE, errno.EIO, errno.EBUSY, errno.EAGAIN,
+                    errno.EINTR, errno.ETIMEDOUT, errno.ENOLCK]
+
+# Actions whose destination file is flushed by the fsync fallback of the
+#   durable publication mode.
+SYNC_FILE_OPS = ["copy", "move", "link", "chmod", "chown"]
+
+# Sub-directories of the leaf directory holding the derivatives.
+DERIVATIVE_DIRS = {"thumb": "thumbs", "preview": "previews"}
+
+# Actions executed by the Documentum export stage of the pipeline mode.
+PIPELINE_EXPORT = ["copy", "chmod", "chown"]
+
+# Indexed columns of the catalog.
+CATALOG_INDEXES = ["be", "dtg", "cmd", "cc", "region", "final_path", "status",
+                   "reason"]
+
 
 def help_message():
 
@@ -147,7 +371,10 @@ def setup_validation(GRAPH, dir_set, file_set, **kwargs):
 
     Description:  Validates the directories and files used by the program.
         Checks for existence and permission settings.  Will create directories
-        if the "create" option is set to "True".
+        if the "create" option is set to "True".  A successful validation is
+        cached in the temp directory and the checks are skipped while the
+        configuration file, the user and each path's inode, mode and
+        ownership are unchanged.
 
     Arguments:
         (input) GRAPH -> Graph class instance.
@@ -155,12 +382,33 @@ def setup_validation(GRAPH, dir_set, file_set, **kwargs):
         (input) file_set -> Dictionary list of files and perms.
         (input) **kwargs:
             null_dir -> List of directory variables that can be null.
+            cfg_file -> Full path and name of configuration file.
         (output) v_flag -> True|False - Valiation status.
 
     """
 
     v_flag = True
     null_dir = kwargs.get("null_dir")
+    cfg_file = kwargs.get("cfg_file")
+    cache_file = os.path.join(GRAPH.temp_dir, VALID_CACHE)
+
+    paths = [getattr(GRAPH, x) for x in dir_set
+             if x not in null_dir or getattr(GRAPH, x)]
+    paths.extend([getattr(GRAPH, x) for x in file_set])
+    paths.extend([os.path.join(GRAPH.gp_dir, x) for x in GRAPH.validate_cmds])
+
+    key = {"config": get_path_sig(cfg_file) if cfg_file else None,
+           "user": [os.geteuid(), os.getegid()] + sorted(os.getgroups()),
+           "spec": [dir_set, file_set, null_dir]}
+    cache = load_state(cache_file)
+    cached = cache.get("paths", {})
+
+    # A path is only stat'ed once, a missing path has no signature.
+    if key["config"] and all([cache.get(x) == key[x] for x in key]) \
+       and all([cached.get(x) is not None and cached.get(x) == get_valid_sig(x)
+                for x in paths]):
+
+        return True
 
     for dname in dir_set:
 
@@ -199,9 +447,47 @@ def setup_validation(GRAPH, dir_set, file_set, **kwargs):
              v_flag = status
              print(msg)
 
+    if v_flag and key["config"]:
+
+        if not all([cache.get(x) == key[x] for x in key]):
+            cache = {"paths": {}}
+
+        cache.update(key)
+
+        for path in paths:
+            cache["paths"][path] = get_valid_sig(path)
+
+        write_json(GRAPH, cache_file, cache)
+
     return v_flag
 
 
+def get_valid_sig(path, **kwargs):
+
+    """Function:  get_valid_sig
+
+    Description:  Returns the attributes of a path which the validation of
+        the path depends on.  Unlike get_path_sig, the modify time is not
+        included as it changes whenever files are added to a directory.
+
+    Arguments:
+        (input) path -> File or directory name.
+        (input) **kwargs:
+            None
+        (output) Signature [inode, mode, owner, group] or None if it does not
+            exist.
+
+    """
+
+    try:
+        st = os.stat(path)
+
+        return [st.st_ino, st.st_mode, st.st_uid, st.st_gid]
+
+    except OSError:
+        return None
+
+
 def fetch_files(GRAPH, **kwargs):
 
     """Function:  fetch_files
@@ -209,7 +495,11 @@ def fetch_files(GRAPH, **kwargs):
     Description:  Get list of all files from the input directory for each
         command.  Filter the all file list based on extension name(s).
         The all and filtered file lists will be saved to a
-        dictionary-list for each command.
+        dictionary-list for each command.  Files still being written are
+        deferred to the next run:  a file is deferred if it was modified
+        within the quiet window and its size and modify time have changed
+        since the previous run's scan.  A file and its XML file are always
+        deferred together.
 
     Arguments:
         (input) GRAPH -> Graph class instance.
@@ -219,12 +509,51 @@ def fetch_files(GRAPH, **kwargs):
     """
 
     ext_list = kwargs.get("ext_list")
+    prev_scan = load_state(GRAPH.state_file).get("cmds", {}) \
+        if GRAPH.quiet_window and GRAPH.state_file else {}
+    now = time.time()
 
     for cmd in GRAPH.validate_cmds:
         cmd_dir = os.path.join(GRAPH.gp_dir, cmd)
+        prev_sigs = prev_scan.get(cmd, {}).get("deferred", {})
+        deferred = {}
+        all_file_list = []
+
+        for fname in os.listdir(cmd_dir):
+
+            try:
+                st = os.stat(os.path.join(cmd_dir, fname))
+
+            except OSError:
+                continue
+
+            if not stat.S_ISREG(st.st_mode):
+                continue
+
+            sig = [st.st_size, st.st_mtime]
+
+            if now - st.st_mtime < GRAPH.quiet_window \
+               and prev_sigs.get(fname) != sig:
+                deferred[fname] = sig
+
+            else:
+                all_file_list.append(fname)
 
-        all_file_list = [x for x in os.listdir(cmd_dir)
-                         if os.path.isfile(os.path.join(cmd_dir, x))]
+        # Defer the file and its XML file together.
+        for fname in list(deferred):
+
+            if fname.endswith(".xml"):
+                pair = fname[:-4]
+
+            else:
+                pair = fname + ".xml"
+
+            if pair in all_file_list:
+                all_file_list.remove(pair)
+                st = os.stat(os.path.join(cmd_dir, pair))
+                deferred[pair] = [st.st_size, st.st_mtime]
+
+        GRAPH.deferred[cmd] = deferred
 
         # Filter the files based the file extension.
         file_list = [x for x in all_file_list
@@ -234,6 +563,274 @@ def fetch_files(GRAPH, **kwargs):
         GRAPH.file_dict[cmd] = file_list
 
 
+def claim_lease(GRAPH, cmd, key, **kwargs):
+
+    """Function:  claim_lease
+
+    Description:  Claims an intake file for this worker by exclusively
+        creating a lease file for it.  An existing lease that is older than
+        the lease time is treated as abandoned and is broken by break_lease
+        and then reclaimed.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) cmd -> Name of command.
+        (input) key -> Claim key of the intake file.
+        (input) **kwargs:
+            None
+        (output) True|False -> File was claimed by this worker.
+
+    """
+
+    lease = os.path.join(GRAPH.claim_dir, cmd, key + ".lease")
+
+    for _ in range(2):
+
+        try:
+            fd = os.open(lease, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+
+        except OSError as err:
+
+            if err.errno != errno.EEXIST:
+                raise
+
+            # Lease is still active or was broken by another worker.
+            if not break_lease(GRAPH, cmd, lease):
+                return False
+
+            continue
+
+        try:
+            os.write(fd, (GRAPH.worker_id + "\n").encode("utf-8"))
+
+        except OSError:
+            os.remove(lease)
+            raise
+
+        finally:
+            os.close(fd)
+
+        GRAPH.claims.append(lease)
+
+        return True
+
+    return False
+
+
+def break_lease(GRAPH, cmd, lease, **kwargs):
+
+    """Function:  break_lease
+
+    Description:  Removes a lease that is older than the lease time.  The
+        lease is checked and removed under the claim lock of the command, so
+        a lease broken and claimed again by one worker is not broken by
+        another worker which found the same stale lease.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) cmd -> Name of command.
+        (input) lease -> Full path and name of the lease file.
+        (input) **kwargs:
+            None
+        (output) True|False -> Lease was broken.
+
+    """
+
+    with system.FileLock(os.path.join(GRAPH.claim_dir, cmd, ".claims.lock")):
+
+        try:
+            if os.stat(lease).st_mtime + GRAPH.lease_time > time.time():
+                return False
+
+            os.remove(lease)
+
+        except OSError as err:
+
+            # Another worker has broken or released the lease.
+            if err.errno != errno.ENOENT:
+                raise
+
+            return False
+
+    return True
+
+
+def claim_files(GRAPH, **kwargs):
+
+    """Function:  claim_files
+
+    Description:  Claims the fetched files of each command for this worker
+        and removes the files claimed by other workers from the file lists.
+        An associated XML file shares the claim of its graph plot file.  A
+        file which is gone once claimed has been processed by another worker
+        since it was listed and its claim is released.  Abandoned leases of
+        files no longer in the command directory are removed.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) **kwargs:
+            None
+
+    """
+
+    for cmd in GRAPH.all_file_dict:
+
+        claimed = set()
+        lease_dir = os.path.join(GRAPH.claim_dir, cmd)
+
+        if not os.path.isdir(lease_dir):
+
+            try:
+                os.makedirs(lease_dir)
+
+            except OSError as err:
+
+                if err.errno != errno.EEXIST:
+                    raise
+
+        sweep_leases(GRAPH, cmd, **kwargs)
+
+        for fname in GRAPH.all_file_dict[cmd]:
+
+            key = re.sub(r"\.xml$", "", fname)
+
+            if key in claimed or not claim_lease(GRAPH, cmd, key, **kwargs):
+                continue
+
+            if os.path.exists(os.path.join(GRAPH.gp_dir, cmd, fname)):
+                claimed.add(key)
+
+            else:
+                release_lease(GRAPH, os.path.join(lease_dir, key + ".lease"))
+
+        GRAPH.all_file_dict[cmd] = [x for x in GRAPH.all_file_dict[cmd]
+                                    if re.sub(r"\.xml$", "", x) in claimed]
+        GRAPH.file_dict[cmd] = [x for x in GRAPH.file_dict[cmd]
+                                if x in claimed]
+
+
+def sweep_leases(GRAPH, cmd, **kwargs):
+
+    """Function:  sweep_leases
+
+    Description:  Removes the leases of a command which are older than the
+        lease time and whose file is no longer in the command directory,
+        such as those left behind by a worker which has crashed.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) cmd -> Name of command.
+        (input) **kwargs:
+            None
+
+    """
+
+    lease_dir = os.path.join(GRAPH.claim_dir, cmd)
+
+    for name in os.listdir(lease_dir):
+
+        if not name.endswith(".lease"):
+            continue
+
+        key = name[:-len(".lease")]
+        lease = os.path.join(lease_dir, name)
+
+        if os.path.exists(os.path.join(GRAPH.gp_dir, cmd, key)) \
+           or os.path.exists(os.path.join(GRAPH.gp_dir, cmd, key + ".xml")):
+
+            continue
+
+        try:
+            if os.stat(lease).st_mtime + GRAPH.lease_time <= time.time():
+                break_lease(GRAPH, cmd, lease, **kwargs)
+
+        except OSError as err:
+
+            # Removed by another worker.
+            if err.errno != errno.ENOENT:
+                raise
+
+
+def renew_claims(GRAPH, **kwargs):
+
+    """Function:  renew_claims
+
+    Description:  Refreshes the claim leases held by this worker once a third
+        of the lease time has passed since they were last refreshed, so the
+        files of a run longer than the lease time are not reclaimed by
+        another worker.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) **kwargs:
+            None
+
+    """
+
+    if not GRAPH.claims \
+       or time.time() - GRAPH.claims_renewed < GRAPH.lease_time / 3.0:
+
+        return
+
+    GRAPH.claims_renewed = time.time()
+
+    for lease in GRAPH.claims:
+
+        try:
+            os.utime(lease, None)
+
+        except OSError as err:
+
+            if err.errno != errno.ENOENT:
+                raise
+
+            gen_libs.write_file2(GRAPH.error_log_hdlr, "Warning: Lease " +
+                                 lease + " was broken by another worker.")
+
+
+def release_lease(GRAPH, lease, **kwargs):
+
+    """Function:  release_lease
+
+    Description:  Releases a claim lease held by this worker.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) lease -> Full path and name of the lease file.
+        (input) **kwargs:
+            None
+
+    """
+
+    try:
+        os.remove(lease)
+
+    except OSError as err:
+
+        if err.errno != errno.ENOENT:
+            raise
+
+    if lease in GRAPH.claims:
+        GRAPH.claims.remove(lease)
+
+
+def release_claims(GRAPH, **kwargs):
+
+    """Function:  release_claims
+
+    Description:  Releases the claim leases held by this worker.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) **kwargs:
+            None
+
+    """
+
+    for lease in GRAPH.claims[:]:
+        release_lease(GRAPH, lease)
+
+
 def files_to_proc(list_name, **kwargs):
 
     """Function:  files_to_proc
@@ -264,7 +861,8 @@ def filter_file_names(GRAPH, **kwargs):
     Description:  Does a regular expression search on each file in the
         dictionary-list.  If the pattern matches then add the file to a
         list and add this list to the filtered file dictionary list for
-        each command.
+        each command.  Files which do not match are set to rejected in the
+        outcome table.
 
     Arguments:
         (input) GRAPH -> Graph class instance.
@@ -282,6 +880,31 @@ def filter_file_names(GRAPH, **kwargs):
 
         GRAPH.filtered_file_dict[cmd] = file_list
 
+        for fname in set(GRAPH.file_dict[cmd]) - set(file_list):
+            GRAPH.outcomes.set_state(cmd, fname, "rejected",
+                                     "Rejected: Invalid file name")
+
+
+def init_outcomes(GRAPH, **kwargs):
+
+    """Function:  init_outcomes
+
+    Description:  Adds all of the fetched files of each command to the
+        outcome table.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) **kwargs:
+            None
+
+    """
+
+    for cmd in GRAPH.all_file_dict:
+        cmd_dir = os.path.join(GRAPH.gp_dir, cmd)
+
+        for fname in GRAPH.all_file_dict[cmd]:
+            GRAPH.outcomes.add(cmd, fname, os.path.join(cmd_dir, fname))
+
 
 def email_no_tgt_name(GRAPH, F_INST, cmd, **kwargs):
 
@@ -290,8 +913,8 @@ def email_no_tgt_name(GRAPH, F_INST, cmd, **kwargs):
     Description:  Checks the Class target name to see if set to not in target
         to mean it is not in the Target Deck list.  If the case, then
         check to see if an email notification has been sent on the file.
-        If not previously notified, will add to the not in target deck
-        list and write to the error log.
+        Sets the file to not in deck in the outcome table, to be notified
+        if not previously notified, and writes to the error log.
 
     Arguments:
         (input) GRAPH -> Graph class instance.
@@ -308,13 +931,15 @@ def email_no_tgt_name(GRAPH, F_INST, cmd, **kwargs):
         # Has mail notification has not been previously sent.
         if not gen_libs.file_search(GRAPH.mail_notdeck, F_INST.f_be):
 
-            # Add file to "not in target" list and write to log.
-            GRAPH.gp_not_in_deck[cmd].append(F_INST.fname)
+            # Set file to be notified as "not in target" and write to log.
+            GRAPH.outcomes.set_state(cmd, F_INST.fname, "not_in_deck",
+                                     notify=True)
             gen_libs.write_file2(GRAPH.error_log_hdlr, F_INST.fname +
                                  " is not in target deck and will be mailed.")
 
         else:
             # Write to log, as has been previously notified of file via email.
+            GRAPH.outcomes.set_state(cmd, F_INST.fname, "not_in_deck")
             gen_libs.write_file2(GRAPH.error_log_hdlr, F_INST.fname +
                                  " isn't in target deck & has been mailed.")
 
@@ -324,10 +949,13 @@ def dctm_processing(GRAPH, F_INST, **kwargs):
     """Function:  dctm_processing
 
     Description:  Checks to see if the Documentum processing has been
-        requested.  If so, copies the graph plot file and any associated XML
-        file to a number of directories and then moves the XML file to the
-        Metacard directory.  A number of entries are made to the Class
-        stating the file name and location of the files.
+        requested.  If so, plans the copies of the graph plot file and any
+        associated XML file to a number of directories and then plans the
+        move of the XML file to the Metacard directory.  A number of entries
+        are made to the Class stating the file name and location of the files.
+        With the hardlink duplicate policy, the graph plot file of a
+        duplicate is not copied, as its content has already been sent, but
+        its XML file is, as the metacard is specific to the file.
 
     Arguments:
         (input) GRAPH -> Graph class instance.
@@ -338,17 +966,19 @@ def dctm_processing(GRAPH, F_INST, **kwargs):
     """
 
     src_dir = os.path.join(GRAPH.gp_dir, F_INST.cmd)
+    key = (F_INST.cmd, F_INST.fname)
 
-    # If Documentum processing has been requested.
-    if GRAPH.image_dir:
-        gen_libs.cp_file2(F_INST.fname, src_dir, GRAPH.image_dir,
-                          F_INST.new_fname, **kwargs)
+    # If Documentum processing has been requested and is not a duplicate.
+    if GRAPH.image_dir \
+       and not (F_INST.dup_of and GRAPH.dup_policy == "hardlink"):
 
-        os.chmod(os.path.join(GRAPH.image_dir, F_INST.new_fname), GRAPH.f_perm)
-        os.chown(os.path.join(GRAPH.image_dir, F_INST.new_fname), GRAPH.img_id,
-                 GRAPH.img_grp)
+        dst_file = os.path.join(GRAPH.image_dir, F_INST.new_fname)
 
-        F_INST.add_file_loc(F_INST.new_fname, GRAPH.image_dir)
+        GRAPH.plan.add("copy", os.path.join(src_dir, F_INST.fname), dst_file,
+                       key, perm=GRAPH.f_perm, owner=GRAPH.img_id,
+                       group=GRAPH.img_grp, hash=F_INST.f_hash)
+
+        F_INST.add_file_loc(F_INST.new_fname, GRAPH.image_dir, F_INST.f_hash)
 
     # If Documentum processing has been requested and an XML file is present.
     if os.path.isfile(os.path.join(src_dir, F_INST.xml_fname)) \
@@ -356,18 +986,17 @@ def dctm_processing(GRAPH, F_INST, **kwargs):
 
         F_INST.set_xml()
 
-        gen_libs.cp_file2(F_INST.xml_fname, src_dir, GRAPH.metacard_dir,
-                          F_INST.new_xml_fname, **kwargs)
+        src_file = os.path.join(src_dir, F_INST.xml_fname)
+        dst_file = os.path.join(GRAPH.metacard_dir, F_INST.new_xml_fname)
 
-        os.chmod(os.path.join(GRAPH.metacard_dir, F_INST.new_xml_fname),
-                 GRAPH.f_perm)
-        os.chown(os.path.join(GRAPH.metacard_dir, F_INST.new_xml_fname),
-                 GRAPH.img_id, GRAPH.img_grp)
+        GRAPH.plan.add("copy", src_file, dst_file, key, perm=GRAPH.f_perm,
+                       owner=GRAPH.img_id, group=GRAPH.img_grp)
 
         F_INST.add_file_loc(F_INST.new_xml_fname, GRAPH.metacard_dir)
 
-        gen_libs.mv_file(F_INST.xml_fname, src_dir, GRAPH.gp_meta_dir,
-                         F_INST.new_xml_dctm_fname, **kwargs)
+        GRAPH.plan.add("move", src_file,
+                       os.path.join(GRAPH.gp_meta_dir,
+                                    F_INST.new_xml_dctm_fname), key)
 
         F_INST.add_file_loc(F_INST.new_xml_dctm_fname, GRAPH.gp_meta_dir)
 
@@ -388,13 +1017,18 @@ def process_graph_file(GRAPH, F_INST, cmd, **kwargs):
 
     """
 
+    GRAPH.outcomes.set_state(cmd, F_INST.fname, "accepted", be=F_INST.f_be)
+
     # See if a NOT IN DECK TARGET notification has been sent.
     email_no_tgt_name(GRAPH, F_INST, cmd, **kwargs)
 
     dctm_processing(GRAPH, F_INST, **kwargs)
 
-    gen_libs.rename_file(F_INST.fname, F_INST.new_fname,
-                         os.path.join(GRAPH.gp_dir, F_INST.cmd), **kwargs)
+    src_dir = os.path.join(GRAPH.gp_dir, F_INST.cmd)
+
+    GRAPH.plan.add("rename", os.path.join(src_dir, F_INST.fname),
+                   os.path.join(src_dir, F_INST.new_fname),
+                   (F_INST.cmd, F_INST.fname))
 
     F_INST.upd_to_loc(F_INST.fname, os.path.join(GRAPH.gp_dir, F_INST.cmd),
                       new_fname=F_INST.new_fname)
@@ -407,8 +1041,8 @@ def process_reject(GRAPH, fname, cmd, err_str, **kwargs):
     """Function:  process_reject
 
     Description:  Processes a reject file by adding to reject dictionary-list,
-        writes an error log entry, and moves the file to the reject
-        directory.
+        writes an error log entry, and plans the move of the file to the
+        reject directory.
 
     Arguments:
         (input) GRAPH -> Graph class instance.
@@ -421,645 +1055,4121 @@ def process_reject(GRAPH, fname, cmd, err_str, **kwargs):
     """
 
     GRAPH.reject_dict[cmd].append({fname: err_str})
+    GRAPH.outcomes.set_state(cmd, fname, "rejected", err_str)
 
     gen_libs.write_file2(GRAPH.error_log_hdlr,
                          "File: " + fname + " " + err_str)
 
-    gen_libs.mv_file(fname, os.path.join(GRAPH.gp_dir, cmd),
-                     GRAPH.rejected_dir, fname, **kwargs)
+    GRAPH.plan.add("move", os.path.join(GRAPH.gp_dir, cmd, fname),
+                   os.path.join(GRAPH.rejected_dir, fname), (cmd, fname))
 
+    f_parts = fname.split("_")
+    add_catalog_row(GRAPH, fname, cmd, "rejected",
+                    be=(f_parts[2:3] or [None])[0],
+                    dtg="_".join(f_parts[0:2]),
+                    final_path=os.path.join(GRAPH.rejected_dir, fname),
+                    reason=err_str)
 
-def process_dir_files(GRAPH, **kwargs):
 
-    """Function:  process_dir_files
+def process_reject_xml(GRAPH, fname, cmd, reason, **kwargs):
 
-    Description:  Controls the processing of the files in the input directory.
-        For each command, takes the filtered file list and rejects any
-        file that is empty, has an invalid year, or invalid date and/or
-        time.  Creates a F_Graph class instance for each valid file and
-        appends the instance to array of class instances and also calls
-        functions to process this file.
+    """Function:  process_reject_xml
+
+    Description:  Plans the move of the XML file associated with a rejected
+        file to the reject directory, if one exists.
 
     Arguments:
         (input) GRAPH -> Graph class instance.
+        (input) fname -> File name.
+        (input) cmd -> Name of command.
+        (input) reason -> Reason for the reject.
         (input) **kwargs:
             None
-        (output) fgraph_ary -> Dictionary-list of F_Graph instances.
 
     """
 
-    fgraph_ary = {}
+    xml_file = os.path.join(GRAPH.gp_dir, cmd, ".".join([fname, "xml"]))
 
-    for cmd in GRAPH.filtered_file_dict:
+    if os.path.isfile(xml_file):
+        gen_libs.write_file2(GRAPH.error_log_hdlr, "File: " + fname +
+                             ".xml rejected due to " + reason + ".")
+        GRAPH.plan.add("move", xml_file,
+                       os.path.join(GRAPH.rejected_dir,
+                                    ".".join([fname, "xml"])),
+                       (cmd, fname))
 
-        file_loc_list = []
-        GRAPH.gp_not_in_deck[cmd] = []
-        GRAPH.gp_valid_list[cmd] = []
-        GRAPH.reject_dict[cmd] = []
 
-        for fname in GRAPH.filtered_file_dict[cmd]:
+def validate_jpeg(fname, **kwargs):
 
-            fullname = os.path.join(os.path.join(GRAPH.gp_dir, cmd), fname)
+    """Function:  validate_jpeg
 
-            if os.stat(fullname).st_size == 0:
+    Description:  Checks the structure of a JPEG file without reading the
+        image data.  The file is memory mapped and only the header segments
+        up to the start of scan and the trailer are touched.  Checks for the
+        SOI marker, a valid chain of segments containing a frame header and
+        the EOI marker at the end of the file, followed only by padding.
 
-                err_str = "Rejected:  Zero file size"
-                process_reject(GRAPH, fname, cmd, err_str)
+    Arguments:
+        (input) fname -> Full path and name of the file.
+        (input) **kwargs:
+            None
+        (output) err_str -> Reason for the reject or None if valid.
 
-                # Check for associated XML file.
-                if os.path.isfile(".".join([fullname, "xml"])):
+    """
 
-                    gen_libs.write_file2(GRAPH.error_log_hdlr, "File: " +
-                                         fname +
-                                         ".xml rejected due to 0 file size.")
-                    gen_libs.mv_file(".".join([fname, "xml"]),
-                                     os.path.join(GRAPH.gp_dir, cmd),
-                                     GRAPH.rejected_dir,
-                                     ".".join([fname, "xml"]))
+    f_hdlr = open(fname, "rb")
 
-                # Go to next file.
-                continue
+    try:
+        # Too short to hold the SOI and EOI markers, also cannot be mapped.
+        if os.fstat(f_hdlr.fileno()).st_size < 4:
+            return "Rejected: Truncated JPEG header"
 
-            F_INST = system.FGraph(fname, cmd, GRAPH.tgtdeck, GRAPH.gp_dir)
+        data = mmap.mmap(f_hdlr.fileno(), 0, access=mmap.ACCESS_READ)
 
-            # Validate the year range from 1965 to current year.
-            #   Year 1965 was selected as it was first imagery file created.
-            if not 1965 <= F_INST.f_year \
-               <= datetime.datetime.strftime(datetime.datetime.now(), "%Y"):
+    finally:
+        f_hdlr.close()
 
-                err_str = "Rejected: Invalid year"
-                process_reject(GRAPH, fname, cmd, err_str)
+    try:
+        f_size = len(data)
 
-                # Go to next file and do not add F_INST to file location list.
-                continue
+        if data[0:2] != b"\xff\xd8":
+            return "Rejected: Missing JPEG SOI marker"
 
-            # Validate the date and time.
-            elif not gen_libs.validate_date(F_INST.f_date + F_INST.f_time[0:4],
-                                            dtg_format="%Y%m%d%H%M"):
+        # Only padding bytes (0x00 or 0xFF) may follow the EOI marker.
+        end = f_size
 
-                err_str = "Rejected: Invalid datetime"
-                process_reject(GRAPH, fname, cmd, err_str)
+        while end > 4 and data[end - 1:end] in [b"\x00", b"\xff"]:
+            end -= 1
+
+        if data[end - 2:end] != b"\xff\xd9":
+            return "Rejected: Missing JPEG EOI marker"
+
+        pos = 2
+        sof = False
+
+        while True:
+
+            if pos + 2 > f_size or data[pos:pos + 1] != b"\xff":
+                return "Rejected: Invalid JPEG segment at offset " + str(pos)
 
-                # Go to next file and do not add F_INST to file location list.
+            # Skip any fill bytes before the marker.
+            while data[pos + 1:pos + 2] == b"\xff" and pos + 2 < f_size:
+                pos += 1
+
+            marker = struct.unpack(">B", data[pos + 1:pos + 2])[0]
+            pos += 2
+
+            if marker == 0xDA:
+                break
+
+            elif marker in JPEG_STANDALONE:
                 continue
 
-            # Save F_Graph class to an array list.
-            else:
-                file_loc_list.append(F_INST)
+            elif pos + 2 > f_size:
+                return "Rejected: Truncated JPEG header"
 
-            process_graph_file(GRAPH, F_INST, cmd, **kwargs)
+            seg_len = struct.unpack(">H", data[pos:pos + 2])[0]
 
-        if file_loc_list:
-            fgraph_ary[cmd] = file_loc_list
+            if seg_len < 2 or pos + seg_len > f_size:
+                return "Rejected: Truncated JPEG header"
 
-    return fgraph_ary
+            if marker in JPEG_SOF:
+                sof = True
+
+            pos += seg_len
+
+        if not sof:
+            return "Rejected: Missing JPEG frame header"
+
+    finally:
+        data.close()
 
+    return None
 
-def fetch_rejected_gps(GRAPH, fgraph_ary, **kwargs):
 
-    """Function:  fetch_rejected_gps
+def read_image_info(fname, **kwargs):
 
-    Description:  Compares the original first filtered list with the current
-        F_Graph instance array.  Any files left are rejected.  See if
-        a previously notification has been sent out on the rejected
-        file and if not add the file to the reject list.
+    """Function:  read_image_info
+
+    Description:  Reads the size of a file and, for a JPEG file, the image
+        width, height, number of color components and the EXIF date and
+        time from the header segments.  Only the start of the file, up to
+        IMAGE_HEADER_MAX bytes, is read with a single read and the image
+        data is never decoded.  Values not found are None.  With a hasher,
+        the rest of the file is read through the same descriptor, so the
+        content hash is computed in the same pass as the header read.
 
     Arguments:
-        (input) GRAPH -> Graph class instance.
-        (input) fgraph_ary -> Dictionary-list of F_Graph instances.
+        (input) fname -> Full path and name of the file.
         (input) **kwargs:
-            None
+            sys_calls -> StatCounter instance for system call counts.
+            hasher -> Hash object updated with the content of the file.
+        (output) info -> Dictionary of size, width, height, components and
+            datetime.
 
     """
 
-    f_hdlr = open(GRAPH.rejected_gps, "r")
+    sys_calls = kwargs.get("sys_calls", system.StatCounter("System calls"))
+    hasher = kwargs.get("hasher")
+    info = {"size": None, "width": None, "height": None, "components": None,
+            "datetime": None}
+    is_jpeg = fname.rsplit(".", 1)[-1].lower() in JPEG_EXT
+    data = b""
 
-    for cmd in GRAPH.file_dict:
+    sys_calls.add("open")
+    fd = os.open(fname, os.O_RDONLY)
 
-        for fname in GRAPH.file_dict[cmd]:
+    try:
+        info["size"] = os.fstat(fd).st_size
 
-            # Is the file name NOT in the array of F_Graph instances array.
-            if not any(F_INST.fname == fname for F_INST in fgraph_ary[cmd]):
+        if is_jpeg or hasher:
+            sys_calls.add("read")
+            data = os.read(fd, IMAGE_HEADER_MAX)
 
-                # See if a previously notification has NOT been sent out.
-                if not re.search(fname, f_hdlr.read()):
+        if hasher:
+            chunk = data
 
-                    # Add the file to the reject list.
-                    GRAPH.gp_rejects.append("/".join([cmd, fname]))
+            while chunk:
+                hasher.update(chunk)
+                sys_calls.add("read")
+                chunk = os.read(fd, system.ActionPlan.buf_size)
 
-                # Reset file pointer for next search.
-                f_hdlr.seek(0)
+    finally:
+        sys_calls.add("close")
+        os.close(fd)
 
-    f_hdlr.close()
+    if not is_jpeg:
+        return info
 
+    if data[0:2] != b"\xff\xd8":
+        return info
 
-def process_rejected_gps(GRAPH, **kwargs):
+    pos = 2
 
-    """Function:  process_rejected_gps
+    while pos + 4 <= len(data) and data[pos:pos + 1] == b"\xff":
+
+        # Skip any fill bytes before the marker.
+        while data[pos + 1:pos + 2] == b"\xff" and pos + 4 < len(data):
+            pos += 1
+
+        marker = struct.unpack(">B", data[pos + 1:pos + 2])[0]
+        pos += 2
+
+        if marker in [0xD9, 0xDA]:
+            break
+
+        elif marker in JPEG_STANDALONE:
+            continue
+
+        seg_len = struct.unpack(">H", data[pos:pos + 2])[0]
+        seg = data[pos + 2:pos + seg_len]
+
+        if marker in JPEG_SOF and len(seg) >= 6:
+            info["height"], info["width"], info["components"] = \
+                struct.unpack(">HHB", seg[1:6])
+            break
+
+        elif marker == 0xE1 and seg[0:6] == b"Exif\x00\x00":
+            info["datetime"] = read_exif_datetime(seg[6:])
+
+        pos += seg_len
+
+    return info
+
+
+def read_exif_ifd(tiff, order, offset, **kwargs):
+
+    """Function:  read_exif_ifd
+
+    Description:  Reads the entries of an EXIF image file directory.
+
+    Arguments:
+        (input) tiff -> EXIF TIFF structure.
+        (input) order -> Byte order of the TIFF structure:  < or >.
+        (input) offset -> Offset of the directory in the TIFF structure.
+        (input) **kwargs:
+            None
+        (output) entries -> Dictionary of tag:  (count, value or offset).
+
+    """
+
+    entries = {}
+    cnt = struct.unpack(order + "H", tiff[offset:offset + 2])[0]
+
+    for entry in range(offset + 2, offset + 2 + 12 * cnt, 12):
+        tag, _, count, value = struct.unpack(order + "HHI4s",
+                                             tiff[entry:entry + 12])
+        entries[tag] = (count, value)
+
+    return entries
+
+
+def read_exif_datetime(tiff, **kwargs):
+
+    """Function:  read_exif_datetime
+
+    Description:  Returns the EXIF date and time of an image.  The original
+        date and time from the EXIF sub-directory is used and if not set,
+        the date and time of the image file directory.
+
+    Arguments:
+        (input) tiff -> EXIF TIFF structure following the Exif header.
+        (input) **kwargs:
+            None
+        (output) EXIF date and time (YYYY:MM:DD HH:MM:SS) or None.
+
+    """
+
+    order = {b"II": "<", b"MM": ">"}.get(tiff[0:2])
+
+    if not order:
+        return None
+
+    try:
+        ifd0 = read_exif_ifd(tiff, order,
+                             struct.unpack(order + "I", tiff[4:8])[0])
+        entry = None
+
+        # DateTimeOriginal in the EXIF sub-directory.
+        if 0x8769 in ifd0:
+            entry = read_exif_ifd(tiff, order, struct.unpack(
+                order + "I", ifd0[0x8769][1])[0]).get(0x9003)
+
+        # DateTime of the image.
+        entry = entry or ifd0.get(0x0132)
+
+        if not entry:
+            return None
+
+        count, value = entry
+
+        # Values over four bytes are stored at an offset.
+        if count > 4:
+            offset = struct.unpack(order + "I", value)[0]
+            value = tiff[offset:offset + count]
+
+        return value[:count].rstrip(b"\x00").decode("ascii") or None
+
+    except (struct.error, UnicodeDecodeError):
+        return None
+
+
+def find_duplicate(GRAPH, F_INST, **kwargs):
+
+    """Function:  find_duplicate
+
+    Description:  Looks up the content hash of a file in the hash index of
+        the current run and then in the hash index of the catalog.  If the
+        content has not been seen, the file is added to the run's index.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) F_INST -> File Graph class instance.
+        (input) **kwargs:
+            None
+        (output) orig -> Dictionary of the original file name and its final
+            path (None if not known yet) or None if not a duplicate.
+
+    """
+
+    orig = GRAPH.hash_index.get(F_INST.f_hash)
+
+    if not orig and GRAPH.catalog_db:
+        row = get_catalog(GRAPH).execute(
+            "SELECT fname, final_path FROM hashes WHERE hash = ?",
+            (F_INST.f_hash,)).fetchone()
+
+        if row:
+            orig = {"fname": row[0], "path": row[1]}
+            GRAPH.hash_index[F_INST.f_hash] = orig
+
+    if not orig:
+        GRAPH.hash_index[F_INST.f_hash] = {"fname": F_INST.fname,
+                                           "path": None}
+
+    return orig
+
+
+def schedule_files(GRAPH, **kwargs):
+
+    """Function:  schedule_files
+
+    Description:  Creates the processing order of the filtered files across
+        all commands.  Files within a command are ordered by their DTG if
+        requested and the commands are interleaved using a smooth weighted
+        round robin on the command weights, so a large number of files in
+        one command does not hold up the files of the other commands.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) **kwargs:
+            None
+        (output) schedule -> List of (command, file name) in processing order.
+
+    """
+
+    queues = {}
+    current = {}
+    schedule = []
+
+    for cmd in GRAPH.filtered_file_dict:
+        f_list = list(GRAPH.filtered_file_dict[cmd])
+
+        if GRAPH.dtg_order:
+            f_list.sort(key=lambda x: x.split("_")[0:2],
+                        reverse=GRAPH.dtg_order == "newest")
+
+        # Reverse the list so the next file is popped from the end.
+        f_list.reverse()
+        queues[cmd] = f_list
+        current[cmd] = 0
+
+    active = [x for x in queues if queues[x]]
+
+    while active:
+        total = 0
+
+        for cmd in active:
+            weight = GRAPH.cmd_weights.get(cmd, 1)
+            current[cmd] += weight
+            total += weight
+
+        cmd = max(active, key=lambda x: current[x])
+        current[cmd] -= total
+        schedule.append((cmd, queues[cmd].pop()))
+
+        if not queues[cmd]:
+            active.remove(cmd)
+
+    return schedule
+
+
+def validate_file_date(F_INST, **kwargs):
+
+    """Function:  validate_file_date
+
+    Description:  Validates the year range and the date and time in the file
+        name of a file.
+
+    Arguments:
+        (input) F_INST -> File Graph class instance.
+        (input) **kwargs:
+            None
+        (output) err_str -> Reason for the reject or None if valid.
+
+    """
+
+    # Validate the year range from 1965 to current year.
+    #   Year 1965 was selected as it was first imagery file created.
+    if not "1965" <= F_INST.f_year \
+       <= datetime.datetime.strftime(datetime.datetime.now(), "%Y"):
+
+        return "Rejected: Invalid year"
+
+    # Validate the date and time.
+    elif not gen_libs.validate_date(F_INST.f_date + F_INST.f_time[0:4],
+                                    dtg_format="%Y%m%d%H%M"):
+
+        return "Rejected: Invalid datetime"
+
+    return None
+
+
+def process_intake_file(GRAPH, cmd, fname, **kwargs):
+
+    """Function:  process_intake_file
+
+    Description:  Rejects the file if it is empty, is not a structurally
+        valid JPEG, has an invalid year, or invalid date and/or time.
+        Otherwise creates a F_Graph class instance for the file, reads the
+        image information and calls functions to process this file.  If
+        duplicate detection is set, the content hash of the file is computed
+        in the same read as the image information and a duplicate is
+        rejected, reported or later hardlinked based on the duplicate policy.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) cmd -> Name of command.
+        (input) fname -> File name.
+        (input) **kwargs:
+            None
+        (output) F_INST -> File Graph class instance or None if rejected.
+
+    """
+
+    renew_claims(GRAPH)
+    fullname = os.path.join(os.path.join(GRAPH.gp_dir, cmd), fname)
+
+    if os.stat(fullname).st_size == 0:
+
+        err_str = "Rejected:  Zero file size"
+        process_reject(GRAPH, fname, cmd, err_str)
+        process_reject_xml(GRAPH, fname, cmd, "0 file size")
+
+        return None
+
+    if GRAPH.validate_jpeg \
+       and fname.rsplit(".", 1)[-1].lower() in JPEG_EXT:
+
+        err_str = validate_jpeg(fullname)
+
+        if err_str:
+            process_reject(GRAPH, fname, cmd, err_str)
+            process_reject_xml(GRAPH, fname, cmd, "invalid JPEG structure")
+
+            return None
+
+    F_INST = system.FGraph(fname, cmd, GRAPH.tgtdeck, GRAPH.gp_dir,
+                           reprocessed="/".join([cmd, fname]) in
+                           GRAPH.reprocessed)
+    err_str = validate_file_date(F_INST)
+
+    if err_str:
+        process_reject(GRAPH, fname, cmd, err_str)
+
+        return None
+
+    hasher = GRAPH.dup_policy and hashlib.sha256()
+    F_INST.set_image_info(read_image_info(fullname, sys_calls=GRAPH.sys_calls,
+                                          hasher=hasher))
+
+    if GRAPH.dup_policy:
+        F_INST.set_hash(hasher.hexdigest())
+        orig = find_duplicate(GRAPH, F_INST)
+
+        if orig:
+            F_INST.dup_of = orig["fname"]
+
+            if GRAPH.dup_policy == "skip":
+                err_str = "Rejected: Duplicate of " + orig["fname"]
+                process_reject(GRAPH, fname, cmd, err_str)
+                process_reject_xml(GRAPH, fname, cmd, "duplicate file")
+
+                return None
+
+            gen_libs.write_file2(GRAPH.error_log_hdlr, "File: " + fname +
+                                 " Duplicate of " + orig["fname"])
+
+    process_graph_file(GRAPH, F_INST, cmd, **kwargs)
+
+    return F_INST
+
+
+def process_dir_files(GRAPH, **kwargs):
+
+    """Function:  process_dir_files
+
+    Description:  Controls the processing of the files in the input directory.
+        Processes the filtered files of all commands in the order created by
+        schedule_files, which is also the order the actions of the files are
+        executed in by batches.  Appends the F_Graph instance of each valid
+        file to the array of class instances for its command.  Starts the
+        queue wait clock, the wait of each file is recorded when it is
+        placed.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) **kwargs:
+            None
+        (output) fgraph_ary -> Dictionary-list of F_Graph instances.
+
+    """
+
+    fgraph_ary = {}
+
+    for cmd in GRAPH.filtered_file_dict:
+
+        GRAPH.gp_valid_list[cmd] = []
+        GRAPH.reject_dict[cmd] = []
+        GRAPH.queue_wait[cmd] = {"files": 0, "total": 0.0, "max": 0.0}
+
+    schedule = schedule_files(GRAPH, **kwargs)
+    GRAPH.plan.schedule(schedule)
+    GRAPH.queue_start = time.time()
+
+    for cmd, fname in schedule:
+
+        F_INST = process_intake_file(GRAPH, cmd, fname, **kwargs)
+
+        # Save F_Graph class to an array list.
+        if F_INST:
+            fgraph_ary.setdefault(cmd, []).append(F_INST)
+
+    return fgraph_ary
+
+
+def record_wait(GRAPH, cmd, **kwargs):
+
+    """Function:  record_wait
+
+    Description:  Records the time a file of a command waited from the start
+        of the processing of the files until it was placed in the web
+        directories.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) cmd -> Name of command.
+        (input) **kwargs:
+            None
+
+    """
+
+    if cmd in GRAPH.queue_wait:
+        wait = time.time() - GRAPH.queue_start
+        GRAPH.queue_wait[cmd]["files"] += 1
+        GRAPH.queue_wait[cmd]["total"] += wait
+        GRAPH.queue_wait[cmd]["max"] = max(GRAPH.queue_wait[cmd]["max"], wait)
+
+
+def write_queue_wait(GRAPH, **kwargs):
+
+    """Function:  write_queue_wait
+
+    Description:  Writes a summary of the time the files of each command
+        waited to be placed in the web directories to the error log.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) **kwargs:
+            None
+
+    """
+
+    for cmd in sorted(GRAPH.queue_wait):
+
+        if GRAPH.queue_wait[cmd]["files"]:
+            gen_libs.write_file2(
+                GRAPH.error_log_hdlr,
+                "Queue wait: {0} files={1} avg={2:.3f}s max={3:.3f}s".format(
+                    cmd, GRAPH.queue_wait[cmd]["files"],
+                    GRAPH.queue_wait[cmd]["total"] /
+                    GRAPH.queue_wait[cmd]["files"],
+                    GRAPH.queue_wait[cmd]["max"]))
+
+
+def load_routes(GRAPH, **kwargs):
+
+    """Function:  load_routes
+
+    Description:  Reads the Region Country list files and the BE number files
+        of each country and returns the country and region directory each
+        BE number is placed in.  A BE number is routed to the first country
+        it is in, same as process_valid_files.  Plans the creation of the
+        region directories.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) **kwargs:
+            None
+        (output) routes -> Dictionary of BE number:  (country, region dir).
+
+    """
+
+    routes = {}
+
+    for region in GRAPH.process_cmds:
+        f_cc = os.path.join(GRAPH.list_dir, "".join([region, "-country_list"]))
+
+        if not os.path.isfile(f_cc) or os.stat(f_cc).st_size == 0 \
+           or not os.access(f_cc, os.R_OK):
+
+            gen_libs.write_file2(GRAPH.error_log_hdlr,
+                                 "Error: No file, empty, or non-readable: " +
+                                 f_cc)
+            continue
+
+        reg_dir = os.path.join(GRAPH.graphbase_dir, region)
+
+        for d_name in [reg_dir, os.path.join(reg_dir, "targets")]:
+            GRAPH.plan.add("mkdir", None, d_name, owner=GRAPH.web_id,
+                           group=GRAPH.web_grp, perm=GRAPH.d_perm)
+
+        with open(f_cc) as f_hdlr:
+            cc_list = [x.strip() for x in f_hdlr]
+
+        for cc in cc_list:
+            f_be = os.path.join(GRAPH.benum_dir, "".join([cc, "_benums"]))
+
+            if not os.path.isfile(f_be) or os.stat(f_be).st_size == 0 \
+               or not os.access(f_be, os.R_OK):
+
+                gen_libs.write_file2(GRAPH.error_log_hdlr,
+                                     "Error: No file, empty, non-readable: " +
+                                     f_be)
+                continue
+
+            with open(f_be) as f_hdlr:
+                for be in f_hdlr:
+                    routes.setdefault(be.strip(), (cc, reg_dir))
+
+    return routes
+
+
+def pipeline_stage(GRAPH, func, in_q, out_q, errors, **kwargs):
+
+    """Function:  pipeline_stage
+
+    Description:  Runs a pipeline stage.  Takes items from the input queue,
+        passes each to the stage function and puts the result on the output
+        queue until the end marker (None) is received, which is passed on.
+        After an error in any stage, the remaining items are drained so no
+        stage is left blocked on a full queue.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) func -> Stage function:  func(GRAPH, item) -> item.
+        (input) in_q -> Input queue.
+        (input) out_q -> Output queue or None for the last stage.
+        (input) errors -> List of the exceptions raised in the stages.
+        (input) **kwargs:
+            None
+
+    """
+
+    while True:
+        item = in_q.get()
+
+        if item is None:
+            break
+
+        if errors:
+            continue
+
+        try:
+            item = func(GRAPH, item)
+
+            if out_q:
+                out_q.put(item)
+
+        except Exception:
+            errors.append(sys.exc_info())
+
+    if out_q:
+        out_q.put(None)
+
+
+def pipeline_validate(GRAPH, item, **kwargs):
+
+    """Function:  pipeline_validate
+
+    Description:  Pipeline stage which validates an intake file, builds the
+        F_Graph instance and plans the actions for the file, including the
+        web placement or the move to the non-processed directory.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) item -> Pipeline item:  {"cmd", "fname", "routes"}.
+        (input) **kwargs:
+            None
+        (output) item -> Pipeline item with "f_inst" and "actions" added.
+
+    """
+
+    cmd = item["cmd"]
+    F_INST = process_intake_file(GRAPH, cmd, item["fname"])
+
+    if F_INST:
+        route = item["routes"].get(F_INST.f_be)
+
+        if route:
+            process_fgraph_dir(GRAPH, {cmd: [F_INST]}, route[0], route[1],
+                               [F_INST.f_be])
+
+        plan_nonproc_files(GRAPH, {cmd: [F_INST]})
+
+    item["f_inst"] = F_INST
+    item["actions"] = GRAPH.plan.take()
+
+    return item
+
+
+def pipeline_export(GRAPH, item, **kwargs):
+
+    """Function:  pipeline_export
+
+    Description:  Pipeline stage which executes the Documentum copies of a
+        file.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) item -> Pipeline item.
+        (input) **kwargs:
+            None
+        (output) item -> Pipeline item.
+
+    """
+
+    execute_actions(GRAPH, [x for x in item["actions"]
+                            if x["op"] in PIPELINE_EXPORT])
+
+    return item
+
+
+def pipeline_place(GRAPH, item, **kwargs):
+
+    """Function:  pipeline_place
+
+    Description:  Pipeline stage which executes the renames and moves of a
+        file, placing it in the web or reject directories.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) item -> Pipeline item.
+        (input) **kwargs:
+            None
+        (output) item -> Pipeline item.
+
+    """
+
+    execute_actions(GRAPH, [x for x in item["actions"]
+                            if x["op"] not in PIPELINE_EXPORT])
+
+    return item
+
+
+def pipeline_record(GRAPH, item, **kwargs):
+
+    """Function:  pipeline_record
+
+    Description:  Pipeline stage which records the F_Graph instance of a
+        placed file for the JSON document, manifests and catalog.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) item -> Pipeline item.
+        (input) **kwargs:
+            None
+
+    """
+
+    if item["f_inst"]:
+        item["fgraph_ary"].setdefault(item["cmd"], []).append(item["f_inst"])
+
+
+def process_pipeline(GRAPH, **kwargs):
+
+    """Function:  process_pipeline
+
+    Description:  Pipeline mode of process_dir_files.  The files are passed
+        through the validate, Documentum export, web placement and record
+        stages, each in its own thread with bounded queues in between, so
+        the first files are placed while later files are still being
+        validated.  A full queue holds up the stage feeding it.  The files
+        are fed in the order created by schedule_files.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) **kwargs:
+            None
+        (output) fgraph_ary -> Dictionary-list of F_Graph instances.
+
+    """
+
+    fgraph_ary = {}
+    errors = []
+
+    for cmd in GRAPH.filtered_file_dict:
+
+        GRAPH.gp_valid_list[cmd] = []
+        GRAPH.reject_dict[cmd] = []
+        GRAPH.queue_wait[cmd] = {"files": 0, "total": 0.0, "max": 0.0}
+
+    routes = load_routes(GRAPH, **kwargs)
+    execute_actions(GRAPH, GRAPH.plan.take())
+
+    stages = [pipeline_validate, pipeline_export, pipeline_place,
+              pipeline_record]
+    queues = [queue.Queue(GRAPH.pipeline_queue) for x in stages]
+    threads = []
+
+    for cnt, func in enumerate(stages):
+        out_q = queues[cnt + 1] if cnt + 1 < len(queues) else None
+        thr = threading.Thread(target=pipeline_stage,
+                               args=(GRAPH, func, queues[cnt], out_q, errors))
+        thr.daemon = True
+        thr.start()
+        threads.append(thr)
+
+    GRAPH.queue_start = time.time()
+
+    for cmd, fname in schedule_files(GRAPH, **kwargs):
+
+        queues[0].put({"cmd": cmd, "fname": fname, "routes": routes,
+                       "fgraph_ary": fgraph_ary})
+
+    queues[0].put(None)
+
+    for thr in threads:
+        thr.join()
+
+    if errors:
+        gen_libs.write_file2(GRAPH.error_log_hdlr,
+                             "".join(traceback.format_exception(*errors[0])))
+        raise errors[0][1]
+
+    return fgraph_ary
+
+
+def collect_outcomes(GRAPH, **kwargs):
+
+    """Function:  collect_outcomes
+
+    Description:  Builds the reject, not in deck, non-processed and left
+        behind lists from a single pass over the outcome table.  A rejected
+        file is only added to the reject list if a notification has not
+        previously been sent out on the file.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) **kwargs:
+            None
+
+    """
+
+    with system.FileLock(GRAPH.rejected_gps, shared=True) as LOCK:
+        LOCK.f_hdlr.seek(0)
+        mailed = set([x.strip().split("/")[-1] for x in LOCK.f_hdlr])
+
+    GRAPH.gp_rejects = []
+    GRAPH.gp_not_in_deck = {}
+    GRAPH.gp_nonproc = []
+    GRAPH.gp_left = {}
+
+    for entry in GRAPH.outcomes.entries():
+        cmd = entry["cmd"]
+
+        if entry["state"] == "rejected" and entry["fname"] not in mailed:
+            GRAPH.gp_rejects.append("/".join([cmd, entry["fname"]]))
+
+        elif entry["state"] == "non_processed":
+            GRAPH.gp_nonproc.append("/".join([cmd, entry["new_fname"]]))
+
+        if entry.get("notify"):
+            GRAPH.gp_not_in_deck.setdefault(cmd, []).append(entry["fname"])
+
+        if not entry["moved"]:
+            GRAPH.gp_left.setdefault(cmd, []).append(entry["fname"])
+
+
+def process_rejected_gps(GRAPH, **kwargs):
+
+    """Function:  process_rejected_gps
 
     Description:  If there are rejected files, processes them by creating an
         email of the rejected files and also adds the rejected files
-        to the rejected mailed file for future reference.
+        to the rejected mailed file for future reference.  The mailed file
+        is locked while it is updated, as it is shared between workers.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) **kwargs:
+            None
+
+    """
+
+    # Are there rejected files.
+    if GRAPH.gp_rejects:
+
+        MAIL = gen_class.Mail(GRAPH.emailtowarn,
+                              "Invalid Graphplot File Names",
+                              GRAPH.emailfrom)
+        MAIL.add_2_msg("Invalid file names that were rejected:\n")
+
+        with system.FileLock(GRAPH.rejected_gps) as LOCK:
+
+            for x in GRAPH.gp_rejects:
+
+                MAIL.add_2_msg(x + "\n")
+                gen_libs.write_file2(LOCK.f_hdlr, x)
+
+        MAIL.send_mail()
+
+
+def process_notindeck(GRAPH, **kwargs):
+
+    """Function:  process_notindeck
+
+    Description:  Email out a list of files that were not found in the target
+        deck list and also adds the file to the not in deck mailed file.  The
+        mailed file is locked while it is updated, as it is shared between
+        workers.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) **kwargs:
+            None
+
+    """
+
+    MAIL = gen_class.Mail(GRAPH.emailtotgt,
+                          "GraphPlots File Name Not In Deck\n",
+                          GRAPH.emailfrom)
+    MAIL.add_2_msg("File names that are not in the target deck.\n")
+    MAIL.add_2_msg("There is no facility name for below mentioned files.\n")
+    MAIL.add_2_msg("Target be added to Target Deck along with Be Number.\n")
+
+    with system.FileLock(GRAPH.mail_notdeck) as LOCK:
+
+        for cmd in GRAPH.gp_not_in_deck:
+
+            for x in GRAPH.gp_not_in_deck[cmd]:
+
+                MAIL.add_2_msg("/".join([cmd, x]) + "\n")
+                gen_libs.write_file2(LOCK.f_hdlr, "/".join([cmd, x]))
+
+    MAIL.send_mail()
+
+
+def find_rejects(GRAPH, **kwargs):
+
+    """Function:  find_rejects
+
+    Description:  Controls the processing of the rejected files and files not
+        found in the target deck.  See collect_outcomes for the lists.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) **kwargs:
+            None
+
+    """
+
+    process_rejected_gps(GRAPH, **kwargs)
+
+    for cmd in GRAPH.gp_not_in_deck:
+
+        if GRAPH.gp_not_in_deck[cmd]:
+            process_notindeck(GRAPH, **kwargs)
+
+            # Break as the process_notindeck processes all files.
+            break
+
+
+def create_dir(d_name, owner=-1, group=-1, perm=None, **kwargs):
+
+    """Function:  create_dir
+
+    Description:  Creates a directory with optional arguments for owner and
+        group settings along with permission settings.  The permissions are
+        set at creation and the owner, group and any permissions masked by
+        the umask are then set through a descriptor on the new directory,
+        only if they do not already match.
+
+    Arguments:
+        (input) d_name -> Directory name.
+        (input) owner -> Numeric id for owner.  -1 leaves id unchanged.
+        (input) group -> Numeri id for group.  -1 leaves id unchanged.
+        (input) perm -> Octal permission setting.
+        (input) **kwargs:
+            sys_calls -> StatCounter instance for system call counts.
+
+    """
+
+    sys_calls = kwargs.get("sys_calls", system.StatCounter("System calls"))
+
+    sys_calls.add("stat")
+
+    if not os.path.isdir(d_name):
+
+        try:
+            sys_calls.add("mkdir")
+            os.mkdir(d_name, perm or 0o777)
+
+        except OSError as err:
+
+            # Parent directory is missing.
+            if err.errno == errno.ENOENT:
+                os.makedirs(d_name, perm or 0o777)
+
+            # Directory was created by a concurrent run.
+            elif err.errno != errno.EEXIST:
+                raise
+
+        sys_calls.add("open")
+        fd = os.open(d_name, os.O_RDONLY)
+
+        try:
+            set_fd_attrs(fd, perm, owner, group, sys_calls=sys_calls)
+
+        finally:
+            sys_calls.add("close")
+            os.close(fd)
+
+
+def set_fd_attrs(fd, perm=None, owner=-1, group=-1, **kwargs):
+
+    """Function:  set_fd_attrs
+
+    Description:  Sets the permissions, owner and group of an open file or
+        directory through its descriptor.  Only settings that do not
+        already match are changed.
+
+    Arguments:
+        (input) fd -> Open file descriptor.
+        (input) perm -> Octal permission setting.
+        (input) owner -> Numeric id for owner.  -1 leaves id unchanged.
+        (input) group -> Numeric id for group.  -1 leaves id unchanged.
+        (input) **kwargs:
+            sys_calls -> StatCounter instance for system call counts.
+
+    """
+
+    sys_calls = kwargs.get("sys_calls", system.StatCounter("System calls"))
+
+    sys_calls.add("fstat")
+    st = os.fstat(fd)
+
+    if perm and stat.S_IMODE(st.st_mode) != perm:
+        sys_calls.add("fchmod")
+        os.fchmod(fd, perm)
+
+    if owner not in (-1, st.st_uid) or group not in (-1, st.st_gid):
+        sys_calls.add("fchown")
+        os.fchown(fd, owner, group)
+
+
+def copy_file(src, dst, perm=None, owner=-1, group=-1, **kwargs):
+
+    """Function:  copy_file
+
+    Description:  Copies a file through open descriptors.  The destination is
+        created with the permissions and the owner, group and any
+        permissions masked by the umask are set on the open descriptor,
+        only if they do not already match.  With a throttle, the copy is
+        paced to the bandwidth and IOPS limits of the destination.  An
+        atomic copy is written to a hidden temporary file and renamed into
+        place, so readers never see a partial file.
+
+    Arguments:
+        (input) src -> Full path and name of the source file.
+        (input) dst -> Full path and name of the destination file.
+        (input) perm -> Octal permission setting.
+        (input) owner -> Numeric id for owner.  -1 leaves id unchanged.
+        (input) group -> Numeric id for group.  -1 leaves id unchanged.
+        (input) **kwargs:
+            sys_calls -> StatCounter instance for system call counts.
+            hasher -> Hash object updated with the data as it is copied.
+            throttle -> Dictionary of the bytes and ops TokenBucket instances
+                of the destination.
+            atomic -> True to write to a temporary file and rename it.
+
+    """
+
+    sys_calls = kwargs.get("sys_calls", system.StatCounter("System calls"))
+    hasher = kwargs.get("hasher")
+    throttle = kwargs.get("throttle") or {}
+    tmp_file = dst
+
+    if kwargs.get("atomic"):
+        tmp_file = os.path.join(os.path.dirname(dst),
+                                ".".join(["", os.path.basename(dst),
+                                          str(os.getpid()), "tmp"]))
+
+    if throttle.get("ops"):
+        throttle["ops"].take()
+
+    sys_calls.add("open")
+    fd_src = os.open(src, os.O_RDONLY)
+
+    try:
+        sys_calls.add("open")
+        fd_dst = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                         perm or 0o666)
+
+        try:
+            while True:
+                sys_calls.add("read")
+                data = os.read(fd_src, system.ActionPlan.buf_size)
+
+                if not data:
+                    break
+
+                if hasher:
+                    hasher.update(data)
+
+                if throttle.get("bytes"):
+                    throttle["bytes"].take(len(data))
+
+                if throttle.get("ops"):
+                    throttle["ops"].take()
+
+                while data:
+                    sys_calls.add("write")
+                    data = data[os.write(fd_dst, data):]
+
+            set_fd_attrs(fd_dst, perm, owner, group, sys_calls=sys_calls)
+
+        finally:
+            sys_calls.add("close")
+            os.close(fd_dst)
+
+        if tmp_file != dst:
+            sys_calls.add("rename")
+            os.rename(tmp_file, dst)
+
+    except EnvironmentError:
+
+        # Do not leave a partial temporary file behind.
+        if tmp_file != dst and os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+        raise
+
+    finally:
+        sys_calls.add("close")
+        os.close(fd_src)
+
+
+def move_file(src, dst, **kwargs):
+
+    """Function:  move_file
+
+    Description:  Moves a file.  A move across file systems is done by
+        copy_file, keeping the permissions, ownership and modified time,
+        and the removal of the source file, so it can be throttled and
+        written atomically.
+
+    Arguments:
+        (input) src -> Full path and name of the source file.
+        (input) dst -> Full path and name of the destination file.
+        (input) **kwargs:
+            sys_calls -> StatCounter instance for system call counts.
+            throttle -> Dictionary of the bytes and ops TokenBucket instances
+                of the destination.
+            atomic -> True to copy across file systems through a temporary
+                file.
+
+    """
+
+    sys_calls = kwargs.get("sys_calls", system.StatCounter("System calls"))
+    throttle = kwargs.get("throttle") or {}
+
+    try:
+        if throttle.get("ops"):
+            throttle["ops"].take()
+
+        sys_calls.add("rename")
+        os.rename(src, dst)
+
+    except OSError as err:
+
+        if err.errno != errno.EXDEV:
+            raise
+
+        st = os.stat(src)
+        copy_file(src, dst, stat.S_IMODE(st.st_mode), st.st_uid, st.st_gid,
+                  **kwargs)
+        os.utime(dst, (st.st_atime, st.st_mtime))
+        sys_calls.add("unlink")
+        os.remove(src)
+
+
+def get_throttle(GRAPH, path, **kwargs):
+
+    """Function:  get_throttle
+
+    Description:  Returns the throttle of the destination a path is in:
+        image_dir, metacard_dir, the web tree (web) or the archive (archive).
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) path -> Full path and name of the destination file.
+        (input) **kwargs:
+            None
+        (output) Dictionary of the bytes and ops TokenBucket instances or
+            None if the destination is not limited.
+
+    """
+
+    for dest, d_name in [("image_dir", GRAPH.image_dir),
+                         ("metacard_dir", GRAPH.metacard_dir),
+                         ("web", GRAPH.graphbase_dir),
+                         ("archive", GRAPH.archive_dir)]:
+
+        if dest in GRAPH.throttles and d_name \
+           and path.startswith(os.path.join(d_name, "")):
+
+            return GRAPH.throttles[dest]
+
+    return None
+
+
+def write_throttle(GRAPH, **kwargs):
+
+    """Function:  write_throttle
+
+    Description:  Writes the bytes and operations of each throttled
+        destination and the time they were held up by the limits to the
+        error log.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) **kwargs:
+            None
+
+    """
+
+    for dest in sorted(GRAPH.throttles):
+        line = ["Throttle: " + dest]
+
+        for unit in sorted(GRAPH.throttles[dest]):
+            bucket = GRAPH.throttles[dest][unit]
+            line.append("{0}={1} {0}_wait={2:.3f}s".format(
+                unit, bucket.taken, bucket.waited))
+
+        gen_libs.write_file2(GRAPH.error_log_hdlr, " ".join(line))
+
+
+def add_touched(GRAPH, d_name, fname=None, **kwargs):
+
+    """Function:  add_touched
+
+    Description:  Records a directory, and a file in it, written to since the
+        last sync for the durable publication mode.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) d_name -> Directory path.
+        (input) fname -> Full path and name of the file or None.
+        (input) **kwargs:
+            None
+
+    """
+
+    if GRAPH.publish_mode == "durable":
+        files = GRAPH.touched.setdefault(d_name, set())
+
+        if fname:
+            files.add(fname)
+
+
+def sync_fs(fd, **kwargs):
+
+    """Function:  sync_fs
+
+    Description:  Flushes the file system a descriptor is on with syncfs.
+
+    Arguments:
+        (input) fd -> Open descriptor of a file or directory.
+        (input) **kwargs:
+            None
+        (output) True if synced or False if syncfs is not available.
+
+    """
+
+    try:
+        func = ctypes.CDLL(None, use_errno=True).syncfs
+
+    except (OSError, AttributeError):
+        return False
+
+    if func(fd) != 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+
+    return True
+
+
+def sync_touched(GRAPH, **kwargs):
+
+    """Function:  sync_touched
+
+    Description:  Makes the files written since the last sync durable for the
+        durable publication mode, with a single syncfs for each file system
+        touched.  Where syncfs is not available, each touched file and then
+        its directory is flushed with fsync instead.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) **kwargs:
+            None
+
+    """
+
+    if GRAPH.publish_mode != "durable" or not GRAPH.touched:
+        return
+
+    touched, GRAPH.touched = GRAPH.touched, {}
+    stats = system.StatCounter("Sync")
+    synced = set()
+    use_syncfs = True
+
+    for d_name in sorted(touched):
+
+        try:
+            dev = os.stat(d_name).st_dev
+
+            if dev in synced:
+                continue
+
+            fd = os.open(d_name, os.O_RDONLY)
+
+            try:
+                if use_syncfs and sync_fs(fd):
+                    stats.add("syncfs")
+                    synced.add(dev)
+                    continue
+
+                use_syncfs = False
+
+                for fname in sorted(touched[d_name]):
+
+                    # Moved on or removed by a later action.
+                    if not os.path.exists(fname):
+                        continue
+
+                    fd_file = os.open(fname, os.O_RDONLY)
+
+                    try:
+                        os.fsync(fd_file)
+                        stats.add("fsync")
+
+                    finally:
+                        os.close(fd_file)
+
+                os.fsync(fd)
+                stats.add("fsync")
+
+            finally:
+                os.close(fd)
+
+        except EnvironmentError as err:
+            stats.add("error")
+            gen_libs.write_file2(GRAPH.error_log_hdlr, "Sync: " + d_name +
+                                 " " + str(err))
+
+    gen_libs.write_file2(GRAPH.error_log_hdlr, stats.report())
+
+
+def process_fgraph_dir(GRAPH, fgraph_ary, cc, reg_dir, be_list, **kwargs):
+
+    """Function:  process_fgraph_dir
+
+    Description:  Plans the move of the graph plot file to the correct web
+        directory location for the web layout along with the creation of
+        the necessary directories if they do not exist.  Updates F_Graph
+        instance to the new location and sets the processed attribute
+        within the class.
+        A file is only placed for the first country its BE number is in.
+        With the hardlink duplicate policy, a file whose content has
+        already been placed is linked to the placed file instead.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) fgraph_ary -> Dictionary-list of F_Graph instances.
+        (input) cc -> Country name.
+        (input) reg_dir -> Region path directory.
+        (input) be_list -> List of BE Numbers.
+        (input) **kwargs:
+            None
+
+    """
+
+    for cmd in fgraph_ary:
+
+        for f_inst in fgraph_ary[cmd]:
+
+            # Check to see if file's BE number is in the BE list.
+            if f_inst.f_be in be_list and not f_inst.processed:
+                f_inst.set_dirs(cc, reg_dir, GRAPH.web_layout)
+
+                for d_name in f_inst.get_dirs():
+                    GRAPH.plan.add("mkdir", None, d_name, owner=GRAPH.web_id,
+                                   group=GRAPH.web_grp, perm=GRAPH.d_perm)
+
+                src_file = os.path.join(GRAPH.gp_dir, cmd, f_inst.new_fname)
+                dst_file = os.path.join(f_inst.leaf_dir, f_inst.new_fname)
+                orig = GRAPH.hash_index.get(f_inst.f_hash)
+
+                if GRAPH.dup_policy == "hardlink" and orig and orig["path"]:
+                    GRAPH.plan.add("link", orig["path"], dst_file,
+                                   (cmd, f_inst.fname), fallback=src_file,
+                                   perm=GRAPH.f_perm, owner=GRAPH.web_id,
+                                   group=GRAPH.web_grp, place=True)
+                    GRAPH.plan.add("unlink", None, src_file,
+                                   (cmd, f_inst.fname))
+
+                else:
+                    GRAPH.plan.add("move", src_file, dst_file,
+                                   (cmd, f_inst.fname), place=True)
+
+                    # First placement of the content is linked to by the rest.
+                    if orig:
+                        orig["path"] = dst_file
+
+                f_inst.upd_to_loc(f_inst.new_fname,
+                                  os.path.join(GRAPH.gp_dir, cmd),
+                                  new_path=f_inst.leaf_dir)
+
+                f_inst.set_processed()
+                GRAPH.outcomes.set_state(cmd, f_inst.fname, "published")
+
+
+def process_fgraph_web(GRAPH, fgraph_ary, **kwargs):
+
+    """Function:  process_fgraph_web
+
+    Description:  Pulls the F_Graph attributes and converts them to a
+        dictionary format.  All of the instances are saved to a dictionary
+        which is then converted to a JSON document and written to a file.
+        Process File Graph instances for web entry.  The processed files
+        are also added to the catalog rows and the content hashes of the
+        original files to the catalog's hash index.  For the atomic and
+        durable publication modes, the JSON document is written through a
+        temporary file and renamed into place.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) fgraph_ary -> Dictionary-list of F_Graph instances.
+        (input) **kwargs:
+            None
+
+    """
+
+    jdoc = {}
+
+    for cmd in fgraph_ary:
+
+        for f_inst in fgraph_ary[cmd]:
+
+            if f_inst.processed is True:
+                # Pull class information and save to dictionary.
+                jdoc[f_inst.new_fname] = f_inst.__dict__
+
+                final_path = os.path.join(f_inst.leaf_dir, f_inst.new_fname)
+                add_catalog_row(
+                    GRAPH, f_inst.fname, cmd, "published",
+                    new_fname=f_inst.new_fname, be=f_inst.f_be,
+                    dtg="_".join([f_inst.f_date, f_inst.f_time]),
+                    cc=f_inst.cc, region=f_inst.region,
+                    final_path=final_path,
+                    reason=f_inst.dup_of and "Duplicate of " + f_inst.dup_of)
+
+                if f_inst.f_hash and not f_inst.dup_of and GRAPH.catalog_db:
+                    GRAPH.hash_rows.append((f_inst.f_hash, f_inst.fname,
+                                            final_path, GRAPH.run_id))
+
+    # Convert dictionary to JSON and write to file.
+    if GRAPH.publish_mode == "direct":
+        gen_libs.write_file(GRAPH.json_doc, "w", json.dumps(jdoc, indent=4))
+
+    else:
+        write_json(GRAPH, GRAPH.json_doc, jdoc, indent=4)
+        add_touched(GRAPH, os.path.dirname(GRAPH.json_doc), GRAPH.json_doc)
+
+
+def process_region_cc(GRAPH, fgraph_ary, f_cc, reg_dir, tgt_dir, **kwargs):
+
+    """Function:  process_region_cc
+
+    Description:  Process each country in the Region Country list by creating a
+        list of BE numbers for the region and passing this to the
+        function to process the graph plot files.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) fgraph_ary -> Dictionary-list of F_Graph instances.
+        (input) f_cc -> Region Country List file name.
+        (input) reg_dir -> Region path directory.
+        (input) tgt_dir -> Region Target path directory.
+        (input) **kwargs:
+            None
+
+    """
+
+    with open(f_cc) as fname:
+        for cc in fname:
+
+            # Clean up the country name.
+            cc = cc.strip()
+
+            # Create the BE number file name.
+            #   "_benums" is the default ending for the BE file name.
+            f_be = os.path.join(GRAPH.benum_dir, "".join([cc, "_benums"]))
+
+            # If the BE file does not exist, file is empty or not readable.
+            if not os.path.isfile(f_be) or os.stat(f_be).st_size == 0 \
+               or not os.access(f_be, os.R_OK):
+
+                gen_libs.write_file2(GRAPH.error_log_hdlr,
+                                     "Error: No file, empty, non-readable: " +
+                                     f_be)
+
+                # Go to the next country.
+                continue
+
+            else:
+                with open(f_be) as fname2:
+                    # Read BEs into a list, clean up the BE number.
+                    be_list = [x.strip() for x in fname2]
+
+            # Process the F_Graph instances.
+            process_fgraph_dir(GRAPH, fgraph_ary, cc, reg_dir, be_list)
+
+
+def process_valid_files(GRAPH, fgraph_ary, **kwargs):
+
+    """Function:  process_valid_files
+
+    Description:  Setup the Region's country list file and directories and then
+        call the function to process each country in the region.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) fgraph_ary -> Dictionary-list of F_Graph instances.
+        (input) **kwargs:
+            None
+
+    """
+
+    for region in GRAPH.process_cmds:
+
+        # Create the Region's Country list file name.
+        #   "-country_list" is default ending for the Country list file name.
+        f_cc = os.path.join(GRAPH.list_dir, "".join([region, "-country_list"]))
+
+        # If the Region Country list file does not exist, file is empty
+        #   or not readable.
+        if not os.path.isfile(f_cc) or os.stat(f_cc).st_size == 0 \
+           or not os.access(f_cc, os.R_OK):
+
+            gen_libs.write_file2(GRAPH.error_log_hdlr,
+                                 "Error: No file, empty, or non-readable: " +
+                                 f_cc)
+
+            # Go to the next command.
+            continue
+
+        # NOTE: "targets" directory may not be required if the web pages are
+        #   created from the Mongodb database.
+        # Create the Region's directory variables.
+        reg_dir = os.path.join(GRAPH.graphbase_dir, region)
+        tgt_dir = os.path.join(reg_dir, "targets")
+
+        GRAPH.plan.add("mkdir", None, reg_dir, owner=GRAPH.web_id,
+                       group=GRAPH.web_grp, perm=GRAPH.d_perm)
+        GRAPH.plan.add("mkdir", None, tgt_dir, owner=GRAPH.web_id,
+                       group=GRAPH.web_grp, perm=GRAPH.d_perm)
+
+        # Process each Country within the Region.
+        process_region_cc(GRAPH, fgraph_ary, f_cc, reg_dir, tgt_dir, **kwargs)
+
+
+def update_manifests(GRAPH, fgraph_ary, **kwargs):
+
+    """Function:  update_manifests
+
+    Description:  Adds the files placed in the web directories to the
+        manifest of their month directory and updates the rollups in the
+        year and country directories.  Each manifest is replaced atomically
+        and the manifests of a country are updated under one lock, so web
+        consumers can read a manifest instead of listing the directories.
+        For the day and hash layouts, the sub-directory of the month
+        directory a file is in is recorded with the file.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) fgraph_ary -> Dictionary-list of F_Graph instances.
+        (input) **kwargs:
+            None
+
+    """
+
+    mm_list = {}
+    perms = {"perm": GRAPH.f_perm, "owner": GRAPH.web_id,
+             "group": GRAPH.web_grp}
+
+    for cmd in fgraph_ary:
+
+        for f_inst in fgraph_ary[cmd]:
+
+            if f_inst.processed is True:
+                mm_list.setdefault(f_inst.cc_dir, {}).setdefault(
+                    f_inst.yy_dir, {}).setdefault(f_inst.mm_dir, []).append(
+                        f_inst)
+
+    for cc_dir in mm_list:
+
+        with system.FileLock(os.path.join(cc_dir, ".manifest.lock"),
+                             **perms):
+            cc_name = os.path.join(cc_dir, GRAPH.manifest_name)
+            cc_doc = load_state(cc_name)
+            cc_doc.setdefault("years", {})
+
+            for yy_dir in mm_list[cc_dir]:
+                yy_name = os.path.join(yy_dir, GRAPH.manifest_name)
+                yy_doc = load_state(yy_name)
+                yy_doc.setdefault("months", {})
+
+                for mm_dir in mm_list[cc_dir][yy_dir]:
+                    mm_name = os.path.join(mm_dir, GRAPH.manifest_name)
+                    mm_doc = load_state(mm_name)
+                    mm_doc.setdefault("files", {})
+
+                    for f_inst in mm_list[cc_dir][yy_dir][mm_dir]:
+                        st = os.stat(os.path.join(f_inst.leaf_dir,
+                                                  f_inst.new_fname))
+                        entry = {
+                            "be": f_inst.f_be, "tgt_name": f_inst.tgt_name,
+                            "dtg": "_".join([f_inst.f_date, f_inst.f_time]),
+                            "cmd": f_inst.cmd, "size": st.st_size,
+                            "mtime": st.st_mtime}
+
+                        # Sub-directory of the day and hash layouts.
+                        if f_inst.leaf_dir != mm_dir:
+                            entry["dir"] = os.path.relpath(f_inst.leaf_dir,
+                                                           mm_dir)
+
+                        mm_doc["files"][f_inst.new_fname] = entry
+
+                    mm_doc["count"] = len(mm_doc["files"])
+                    mm_doc["bytes"] = sum([x["size"] for x in
+                                           mm_doc["files"].values()])
+                    mm_doc["updated"] = time.time()
+                    write_json(GRAPH, mm_name, mm_doc, **perms)
+                    add_touched(GRAPH, mm_dir, mm_name)
+
+                    yy_doc["months"][os.path.basename(mm_dir)] = {
+                        "count": mm_doc["count"], "bytes": mm_doc["bytes"],
+                        "updated": mm_doc["updated"]}
+
+                yy_doc["count"] = sum([x["count"] for x in
+                                       yy_doc["months"].values()])
+                yy_doc["bytes"] = sum([x["bytes"] for x in
+                                       yy_doc["months"].values()])
+                yy_doc["updated"] = time.time()
+                write_json(GRAPH, yy_name, yy_doc, **perms)
+                add_touched(GRAPH, yy_dir, yy_name)
+
+                cc_doc["years"][os.path.basename(yy_dir)] = {
+                    "count": yy_doc["count"], "bytes": yy_doc["bytes"],
+                    "updated": yy_doc["updated"]}
+
+            cc_doc["count"] = sum([x["count"] for x in
+                                   cc_doc["years"].values()])
+            cc_doc["bytes"] = sum([x["bytes"] for x in
+                                   cc_doc["years"].values()])
+            cc_doc["updated"] = time.time()
+            write_json(GRAPH, cc_name, cc_doc, **perms)
+            add_touched(GRAPH, cc_dir, cc_name)
+
+
+def make_derivative(task):
+
+    """Function:  make_derivative
+
+    Description:  Process pool worker which creates the derivatives of a
+        graph plot file.  The image is decoded once at a reduced scale for
+        the largest derivative and each derivative is written to a hidden
+        temporary file and renamed into place.  A derivative which is newer
+        than the file is up to date and is left as is.
+
+    Arguments:
+        (input) task -> (file name, [(kind, derivative name, size), ...],
+            perm, owner, group).  Largest derivative first.
+        (output) results -> List of (kind, derivative name, status).
+            Status is created, current or the error message.
+
+    """
+
+    from PIL import Image
+
+    fname, outs, perm, owner, group = task
+    results = []
+    img = None
+
+    try:
+        f_mtime = os.stat(fname).st_mtime
+
+    except OSError as err:
+        return [(kind, dst, str(err)) for kind, dst, size in outs]
+
+    for kind, dst, size in outs:
+
+        try:
+            if os.path.exists(dst) and os.stat(dst).st_mtime >= f_mtime:
+                results.append((kind, dst, "current"))
+                continue
+
+            if img is None:
+                img = Image.open(fname)
+                img.draft("RGB", (size, size))
+                img = img.convert("RGB")
+
+            d_img = img.copy()
+            d_img.thumbnail((size, size),
+                            getattr(Image, "LANCZOS", None) or Image.ANTIALIAS)
+            tmp_file = os.path.join(os.path.dirname(dst), ".".join(
+                ["", os.path.basename(dst), str(os.getpid()), "tmp"]))
+            d_img.save(tmp_file, "JPEG", quality=85)
+            os.chmod(tmp_file, perm)
+
+            if owner != -1 or group != -1:
+                os.chown(tmp_file, owner, group)
+
+            os.rename(tmp_file, dst)
+            results.append((kind, dst, "created"))
+
+        except (IOError, OSError) as err:
+            results.append((kind, dst, str(err)))
+
+    return results
+
+
+def make_derivatives(GRAPH, fgraph_ary, **kwargs):
+
+    """Function:  make_derivatives
+
+    Description:  Creates the thumbnail and preview of each file placed in the
+        web directories with a process pool across the cores.  The
+        derivatives are placed in a sub-directory of the leaf directory
+        and are added to the file locations of the F_Graph instances, so
+        they are in the JSON document.  Skipped if PIL is not installed.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) fgraph_ary -> Dictionary-list of F_Graph instances.
+        (input) **kwargs:
+            None
+
+    """
+
+    try:
+        __import__("PIL.Image")
+
+    except ImportError:
+        gen_libs.write_file2(GRAPH.error_log_hdlr, "Derivatives: PIL is not "
+                             "installed, derivatives are not created.")
+        return
+
+    sizes = sorted([(GRAPH.preview_size, "preview"),
+                    (GRAPH.thumb_size, "thumb")], reverse=True)
+    stats = system.StatCounter("Derivatives")
+    created = set()
+    tasks = []
+    insts = []
+
+    for cmd in fgraph_ary:
+
+        for f_inst in [x for x in fgraph_ary[cmd] if x.processed is True]:
+            outs = []
+
+            for size, kind in [x for x in sizes if x[0]]:
+                d_name = os.path.join(f_inst.leaf_dir,
+                                      DERIVATIVE_DIRS[kind])
+
+                if d_name not in created:
+                    create_dir(d_name, GRAPH.web_id, GRAPH.web_grp,
+                               GRAPH.d_perm, sys_calls=GRAPH.sys_calls)
+                    created.add(d_name)
+
+                outs.append((kind, os.path.join(d_name, f_inst.new_fname),
+                             size))
+
+            tasks.append((os.path.join(f_inst.leaf_dir, f_inst.new_fname),
+                          outs, GRAPH.f_perm, GRAPH.web_id, GRAPH.web_grp))
+            insts.append(f_inst)
+
+    if not tasks:
+        return
+
+    workers = GRAPH.derivative_workers or multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(workers)
+
+    try:
+        results = pool.map(make_derivative, tasks,
+                           max(1, len(tasks) // (4 * workers)))
+
+    finally:
+        pool.close()
+        pool.join()
+
+    for f_inst, result in zip(insts, results):
+
+        for kind, dst, status in result:
+
+            if status in ["created", "current"]:
+                f_inst.set_derivative(kind, dst)
+                stats.add(status)
+
+                if status == "created":
+                    add_touched(GRAPH, os.path.dirname(dst), dst)
+
+            else:
+                stats.add("error")
+                gen_libs.write_file2(GRAPH.error_log_hdlr, "Derivatives: " +
+                                     dst + " " + status)
+
+    gen_libs.write_file2(GRAPH.error_log_hdlr, stats.report())
+
+
+def open_catalog(db_file, **kwargs):
+
+    """Function:  open_catalog
+
+    Description:  Opens the SQLite catalog of processed graph plot files and
+        creates the tables and indexes if they do not exist.  The hashes
+        table is the content hash index used for duplicate detection.
+
+    Arguments:
+        (input) db_file -> Full path and name of the catalog database.
+        (input) **kwargs:
+            None
+        (output) conn -> SQLite connection.
+
+    """
+
+    conn = sqlite3.connect(db_file, timeout=60, check_same_thread=False)
+    conn.execute("""CREATE TABLE IF NOT EXISTS graphplots (
+        id INTEGER PRIMARY KEY, fname TEXT, new_fname TEXT, be TEXT,
+        dtg TEXT, cmd TEXT, cc TEXT, region TEXT, final_path TEXT,
+        status TEXT, reason TEXT, run_id TEXT, ts REAL)""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS hashes (
+        hash TEXT PRIMARY KEY, fname TEXT, final_path TEXT, run_id TEXT)""")
+
+    for col in CATALOG_INDEXES:
+        conn.execute("CREATE INDEX IF NOT EXISTS graphplots_{0} ON "
+                     "graphplots ({0})".format(col))
+
+    conn.commit()
+
+    return conn
+
+
+def get_catalog(GRAPH, **kwargs):
+
+    """Function:  get_catalog
+
+    Description:  Returns the catalog connection of the run, opening it on
+        first use.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) **kwargs:
+            None
+        (output) GRAPH.catalog_conn -> SQLite connection.
+
+    """
+
+    if not GRAPH.catalog_conn:
+        GRAPH.catalog_conn = open_catalog(GRAPH.catalog_db)
+
+    return GRAPH.catalog_conn
+
+
+def add_catalog_row(GRAPH, fname, cmd, status, **kwargs):
+
+    """Function:  add_catalog_row
+
+    Description:  Adds a row for a file to the catalog rows of the run.  The
+        rows are written to the catalog in one transaction by write_catalog.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) fname -> Original file name.
+        (input) cmd -> Name of command.
+        (input) status -> Status:  published|rejected|non_processed.
+        (input) **kwargs:
+            new_fname -> New file name.
+            be -> BE number.
+            dtg -> Date and time group of the file.
+            cc -> Country name.
+            region -> Region name.
+            final_path -> Full path and name of the file after processing.
+            reason -> Reason for a reject or the original of a duplicate.
+
+    """
+
+    if GRAPH.catalog_db:
+        GRAPH.catalog_rows.append(
+            (fname, kwargs.get("new_fname"), kwargs.get("be"),
+             kwargs.get("dtg"), cmd, kwargs.get("cc"), kwargs.get("region"),
+             kwargs.get("final_path"), status, kwargs.get("reason"),
+             GRAPH.run_id, time.time()))
+
+
+def write_catalog(GRAPH, **kwargs):
+
+    """Function:  write_catalog
+
+    Description:  Writes the catalog rows and content hashes of the run to
+        the catalog in a single transaction and closes the catalog.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) **kwargs:
+            None
+
+    """
+
+    if GRAPH.catalog_db and (GRAPH.catalog_rows or GRAPH.hash_rows):
+        conn = get_catalog(GRAPH)
+
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO graphplots (fname, new_fname, be, dtg, cmd, "
+                    "cc, region, final_path, status, reason, run_id, ts) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    GRAPH.catalog_rows)
+                conn.executemany(
+                    "INSERT OR IGNORE INTO hashes (hash, fname, final_path, "
+                    "run_id) VALUES (?, ?, ?, ?)", GRAPH.hash_rows)
+
+        finally:
+            conn.close()
+            GRAPH.catalog_conn = None
+
+        GRAPH.catalog_rows = []
+        GRAPH.hash_rows = []
+
+    elif GRAPH.catalog_conn:
+        GRAPH.catalog_conn.close()
+        GRAPH.catalog_conn = None
+
+
+def query_catalog(db_file, query, **kwargs):
+
+    """Function:  query_catalog
+
+    Description:  Prints the catalog rows matching a query.  The query is a
+        comma separated list of column=value pairs.  The dtg value is
+        matched as a prefix, so "dtg=201903" returns all of March 2019.
+
+    Arguments:
+        (input) db_file -> Full path and name of the catalog database.
+        (input) query -> Query string:  column=value[,column=value...].
+        (input) **kwargs:
+            None
+        (output) status -> True|False - Query was valid.
+
+    """
+
+    where = []
+    values = []
+
+    for item in [x for x in query.split(",") if x]:
+        col, _, value = item.partition("=")
+
+        if col not in CATALOG_INDEXES + ["fname", "new_fname", "run_id"]:
+            print("Error:  Invalid catalog column: {0}".format(col))
+            return False
+
+        if col == "dtg":
+            where.append("dtg LIKE ?")
+            values.append(value + "%")
+
+        else:
+            where.append(col + " = ?")
+            values.append(value)
+
+    sql = "SELECT dtg, be, cmd, region, cc, status, final_path, reason " \
+          "FROM graphplots"
+
+    if where:
+        sql = sql + " WHERE " + " AND ".join(where)
+
+    conn = open_catalog(db_file)
+
+    try:
+        for row in conn.execute(sql + " ORDER BY dtg", values):
+            print("\t".join([str(x) for x in row]))
+
+    finally:
+        conn.close()
+
+    return True
+
+
+def plan_nonproc_files(GRAPH, fgraph_ary, **kwargs):
+
+    """Function:  plan_nonproc_files
+
+    Description:  Plans the move of files that have passed name validation,
+        but were not processed to the non-processed directory.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) fgraph_ary -> Dictionary-list of F_Graph instances.
+        (input) **kwargs:
+            None
+
+    """
+
+    for cmd in fgraph_ary:
+
+        for f_inst in fgraph_ary[cmd]:
+
+            if f_inst.processed is False:
+                GRAPH.plan.add("move",
+                               os.path.join(GRAPH.gp_dir, cmd,
+                                            f_inst.new_fname),
+                               os.path.join(GRAPH.web_nonproc_dir,
+                                            f_inst.new_fname),
+                               (cmd, f_inst.fname))
+
+                add_catalog_row(
+                    GRAPH, f_inst.fname, cmd, "non_processed",
+                    new_fname=f_inst.new_fname, be=f_inst.f_be,
+                    dtg="_".join([f_inst.f_date, f_inst.f_time]),
+                    final_path=os.path.join(GRAPH.web_nonproc_dir,
+                                            f_inst.new_fname),
+                    reason="Not in a region BE list")
+
+                GRAPH.outcomes.set_state(cmd, f_inst.fname, "non_processed",
+                                         "Not in a region BE list",
+                                         new_fname=f_inst.new_fname,
+                                         be=f_inst.f_be)
+
+
+def execute_plan(GRAPH, **kwargs):
+
+    """Function:  execute_plan
+
+    Description:  Executes the filesystem actions in the Graph class plan in
+        execution order (batch of files in processing order, phase,
+        destination device and directory) and then clears the plan.  The
+        system calls made, the retries and the throttled time are written
+        to the error log.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) **kwargs:
+            None
+
+    """
+
+    execute_actions(GRAPH, GRAPH.plan.ordered(), **kwargs)
+
+    if GRAPH.sys_calls.counts:
+        gen_libs.write_file2(GRAPH.error_log_hdlr, GRAPH.sys_calls.report())
+
+    if GRAPH.retry_stats.counts:
+        gen_libs.write_file2(GRAPH.error_log_hdlr, GRAPH.retry_stats.report())
+
+    write_throttle(GRAPH, **kwargs)
+    GRAPH.plan.clear()
+
+
+def execute_actions(GRAPH, actions, **kwargs):
+
+    """Function:  execute_actions
+
+    Description:  Executes a list of filesystem actions in the order given.
+        An action failing with a transient error (i.e. ESTALE, EIO, EBUSY)
+        is put on a retry queue, along with the later actions for the same
+        intake file, and retried with exponential backoff after the other
+        actions, up to the retry limit.  Actions failing with a permanent
+        error or after the last retry are escalated by escalate_failure,
+        along with the actions of the intake file not run yet, which are
+        then skipped.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) actions -> List of actions from the Graph class plan.
+        (input) **kwargs:
+            None
+
+    """
+
+    retries = []
+    held = {}
+
+    for cnt, action in enumerate(actions):
+        key = action.get("key")
+
+        # Actions of a file which has failed are dropped.
+        if key and key in GRAPH.failed:
+            continue
+
+        # Later actions of a file waiting on a retry wait with it.
+        if key in held:
+            held[key]["actions"].append(action)
+            continue
+
+        try:
+            run_action(GRAPH, action, **kwargs)
+
+        except EnvironmentError as err:
+            GRAPH.retry_stats.add("error")
+
+            if key and GRAPH.retry_max \
+               and getattr(err, "errno", None) in TRANSIENT_ERRNOS:
+
+                held[key] = {"actions": [action], "attempt": 1,
+                             "due": time.time() + GRAPH.retry_delay}
+                retries.append(held[key])
+
+            else:
+                escalate_failure(GRAPH, action,
+                                 [x for x in actions[cnt + 1:]
+                                  if key and x.get("key") == key],
+                                 err, **kwargs)
+
+    while retries:
+        entry = min(retries, key=lambda x: x["due"])
+        retries.remove(entry)
+        time.sleep(max(0.0, entry["due"] - time.time()))
+        GRAPH.retry_stats.add("retry")
+
+        for cnt, action in enumerate(entry["actions"]):
+
+            try:
+                run_action(GRAPH, action, **kwargs)
+
+            except EnvironmentError as err:
+
+                if entry["attempt"] < GRAPH.retry_max \
+                   and getattr(err, "errno", None) in TRANSIENT_ERRNOS:
+
+                    entry["actions"] = entry["actions"][cnt:]
+                    entry["due"] = time.time() + \
+                        GRAPH.retry_delay * 2 ** entry["attempt"]
+                    entry["attempt"] += 1
+                    retries.append(entry)
+
+                else:
+                    escalate_failure(GRAPH, action, entry["actions"][cnt + 1:],
+                                     err, **kwargs)
+
+                break
+
+        else:
+            GRAPH.retry_stats.add("recovered")
+
+
+def run_action(GRAPH, action, **kwargs):
+
+    """Function:  run_action
+
+    Description:  Executes a filesystem action.  Intake files leaving the
+        intake directory are recorded in the outcome table.  Copies and
+        moves to a destination with I/O limits are throttled.  For the
+        atomic and durable publication modes, copies and moves across file
+        systems are written to a hidden temporary file and renamed into
+        place and for the durable mode, the directories written to are
+        recorded for the sync after the batch.  The queue wait of a file is
+        recorded when it is placed in the web directories.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) action -> Action from the Graph class plan.
+        (input) **kwargs:
+            None
+
+    """
+
+    sys_calls = GRAPH.sys_calls
+    atomic = GRAPH.publish_mode != "direct"
+    renew_claims(GRAPH)
+
+    if action["op"] == "mkdir":
+        create_dir(action["dst"], action["owner"], action["group"],
+                   action["perm"], sys_calls=sys_calls)
+
+    elif action["op"] == "copy":
+        hasher = action.get("hash") and hashlib.sha256()
+        copy_file(action["src"], action["dst"], action.get("perm"),
+                  action.get("owner", -1), action.get("group", -1),
+                  sys_calls=sys_calls, hasher=hasher,
+                  throttle=get_throttle(GRAPH, action["dst"]), atomic=atomic)
+
+        if hasher and hasher.hexdigest() != action["hash"]:
+            gen_libs.write_file2(
+                GRAPH.error_log_hdlr, "File: " + action["src"] +
+                " changed after intake, copy hash does not match.")
+
+    elif action["op"] == "chmod":
+        sys_calls.add("chmod")
+        os.chmod(action["dst"], action["perm"])
+
+    elif action["op"] == "chown":
+        sys_calls.add("chown")
+        os.chown(action["dst"], action["owner"], action["group"])
+
+    elif action["op"] == "rename":
+        sys_calls.add("rename")
+        gen_libs.rename_file(os.path.basename(action["src"]),
+                             os.path.basename(action["dst"]),
+                             os.path.dirname(action["src"]))
+        GRAPH.outcomes.set_moved(action["src"])
+
+    elif action["op"] == "move":
+        throttle = get_throttle(GRAPH, action["dst"])
+
+        # Throttled and atomic moves across file systems are copied by
+        #   copy_file.
+        if throttle or atomic:
+            move_file(action["src"], action["dst"], sys_calls=sys_calls,
+                      throttle=throttle, atomic=atomic)
+
+        else:
+            sys_calls.add("rename")
+            gen_libs.mv_file(os.path.basename(action["src"]),
+                             os.path.dirname(action["src"]),
+                             os.path.dirname(action["dst"]),
+                             os.path.basename(action["dst"]))
+
+        GRAPH.outcomes.set_moved(action["src"])
+
+    elif action["op"] == "link":
+
+        try:
+            sys_calls.add("link")
+            os.link(action["src"], action["dst"])
+
+        except OSError:
+            # Original is gone or on another device, copy instead.
+            copy_file(action["fallback"], action["dst"], action["perm"],
+                      action["owner"], action["group"],
+                      sys_calls=sys_calls,
+                      throttle=get_throttle(GRAPH, action["dst"]),
+                      atomic=atomic)
+
+    elif action["op"] == "unlink":
+        sys_calls.add("unlink")
+        os.remove(action["dst"])
+        GRAPH.outcomes.set_moved(action["dst"])
+
+    add_touched(GRAPH, os.path.dirname(action["dst"]),
+                action["op"] in SYNC_FILE_OPS and action["dst"])
+
+    if action["op"] in ["move", "rename"]:
+        add_touched(GRAPH, os.path.dirname(action["src"]))
+
+    if action.get("place"):
+        record_wait(GRAPH, action["key"][0])
+
+
+def escalate_failure(GRAPH, action, remaining, err, **kwargs):
+
+    """Function:  escalate_failure
+
+    Description:  Handles an action which has failed permanently.  The
+        file is recorded as failed, so the remaining actions of the intake
+        file are dropped.  If the graph plot file is still in its input
+        directory, it is moved to the non-processed directory, along with
+        its XML file, and set to non-processed in the outcome table, unless
+        it was rejected or already planned for the non-processed directory.
+        A rejected file is left in the input directory and is reported as
+        not processed.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) action -> Action which failed.
+        (input) remaining -> Remaining actions of the intake file.
+        (input) err -> Exception raised by the action.
+        (input) **kwargs:
+            None
+
+    """
+
+    key = action.get("key")
+    GRAPH.retry_stats.add("failed")
+    gen_libs.write_file2(GRAPH.error_log_hdlr, "Failed: " + action["op"] +
+                         " " + action["dst"] + " " + str(err))
+
+    # Directory actions are not for a single file.
+    if not key:
+        return
+
+    GRAPH.failed[key] = str(err)
+    cmd_dir = os.path.join(GRAPH.gp_dir, key[0])
+
+    if GRAPH.outcomes.files[key]["state"] == "rejected":
+        return
+
+    xml_file = os.path.join(cmd_dir, key[1] + ".xml")
+
+    for act in [action] + remaining:
+
+        if act["src"] and os.path.dirname(act["src"]) == cmd_dir \
+           and act["src"] != xml_file and os.path.exists(act["src"]):
+
+            fname = os.path.basename(act["src"])
+
+            try:
+                gen_libs.mv_file(fname, cmd_dir, GRAPH.web_nonproc_dir)
+
+                if os.path.exists(xml_file):
+                    gen_libs.mv_file(os.path.basename(xml_file), cmd_dir,
+                                     GRAPH.web_nonproc_dir)
+
+            except EnvironmentError as mv_err:
+                gen_libs.write_file2(GRAPH.error_log_hdlr, "Failed: move " +
+                                     act["src"] + " " + str(mv_err))
+                return
+
+            GRAPH.outcomes.set_moved(act["src"])
+
+            # Planned for the non-processed directory, already recorded.
+            if GRAPH.outcomes.files[key]["state"] == "non_processed":
+                break
+
+            be = GRAPH.outcomes.files[key].get("be")
+            GRAPH.outcomes.set_state(key[0], key[1], "non_processed",
+                                     "Failed: " + str(err), new_fname=fname,
+                                     be=be)
+            add_catalog_row(GRAPH, key[1], key[0], "non_processed",
+                            new_fname=fname, be=be,
+                            final_path=os.path.join(GRAPH.web_nonproc_dir,
+                                                    fname),
+                            reason="Failed: " + str(err))
+            break
+
+
+def drop_failed(GRAPH, fgraph_ary, **kwargs):
+
+    """Function:  drop_failed
+
+    Description:  Sets the F_Graph instances of the files with a failed
+        action as not processed, so they are left out of the manifests,
+        derivatives, JSON document and catalog.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) fgraph_ary -> Dictionary-list of F_Graph instances.
+        (input) **kwargs:
+            None
+
+    """
+
+    for cmd in fgraph_ary:
+
+        for f_inst in fgraph_ary[cmd]:
+
+            if (cmd, f_inst.fname) in GRAPH.failed:
+                f_inst.processed = False
+
+
+def print_plan(GRAPH, **kwargs):
+
+    """Function:  print_plan
+
+    Description:  Prints the filesystem actions in the Graph class plan in
+        execution order along with the estimated bytes and system calls.
+        Used for the dry run option.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) **kwargs:
+            None
+
+    """
+
+    for action in GRAPH.plan.ordered():
+
+        if action["src"]:
+            print("{0:6} {1} -> {2} ({3} bytes)".format(
+                action["op"], action["src"], action["dst"], action["bytes"]))
+
+        else:
+            print("{0:6} {1}".format(action["op"], action["dst"]))
+
+    t_bytes, t_calls, op_cnt = GRAPH.plan.estimate()
+
+    print("\nActions:  " + ", ".join(["{0}={1}".format(x, op_cnt[x])
+                                      for x in sorted(op_cnt)]))
+    print("Estimated bytes:  {0}".format(t_bytes))
+    print("Estimated system calls:  {0}".format(t_calls))
+
+
+def find_nonproc_files(GRAPH, **kwargs):
+
+    """Function:  find_nonproc_files
+
+    Description:  Any fetched file left in the input directories means the
+        file was not processed.  Send out an email on non-processed files
+        and write entry to error log.  Also handles files that have passed
+        name validation, but have failed for another reason by sending out
+        email and log notifications.  See plan_nonproc_files for the move
+        of those files and collect_outcomes for the lists.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) **kwargs:
+            None
+
+    """
+
+    # If any files were detected that were not processed.
+    if GRAPH.gp_left:
+        MAIL = gen_class.Mail(GRAPH.emailtowarn, "Non-Processed File Names",
+                              GRAPH.emailfrom)
+        MAIL.add_2_msg("File names that were not processed:\n")
+
+        for cmd in GRAPH.gp_left:
+
+            for fname in GRAPH.gp_left[cmd]:
+                MAIL.add_2_msg(fname + "\n")
+                gen_libs.write_file2(GRAPH.error_log_hdlr, cmd + "/" + fname +
+                                     ":  File was not processed.")
+
+        MAIL.send_mail()
+
+    # 20160830 - Added handling of valid name non-processed files.
+    ###########################################################################
+    if GRAPH.gp_nonproc:
+
+        MAIL = gen_class.Mail(GRAPH.emailtowarn,
+                              "Valid File Name, but Non-Processed File(s)",
+                              GRAPH.emailfrom)
+        MAIL.add_2_msg("These file(s) passed name validation, but failed ")
+        MAIL.add_2_msg("for another reason.  Please investigate.\n")
+        MAIL.add_2_msg("Files moved to " + GRAPH.web_nonproc_dir + "\n\n")
+
+        for fname in GRAPH.gp_nonproc:
+
+            MAIL.add_2_msg(fname + "\n")
+            gen_libs.write_file2(GRAPH.error_log_hdlr,
+                                 "Warning: " + fname + " valid name, but" +
+                                 " has failed for another reason." +
+                                 "  Please investigate.")
+
+        MAIL.send_mail()
+    ###########################################################################
+
+
+def process_reject_dict(GRAPH, **kwargs):
+
+    """Function:  process_reject_dict
+
+    Description:  Looks for any files that are in the reject dictionary and if
+        detected creates an email with a list of rejected files and the
+        reason for the reject.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) **kwargs:
+            None
+
+    """
+
+    proc_flag = False
+
+    for cmd in GRAPH.reject_dict:
+
+        # If there are files to be processed and proc_flag is False.
+        if GRAPH.reject_dict[cmd] and not proc_flag:
+
+            MAIL = gen_class.Mail(GRAPH.emailtowarn, "GP:  Rejected files",
+                                  GRAPH.emailfrom)
+            MAIL.add_2_msg("File names that were not processed:\n")
+            proc_flag = True
+
+        for reject in GRAPH.reject_dict[cmd]:
+
+            for dict_key in reject:
+
+                MAIL.add_2_msg(dict_key + ":  " + reject[dict_key] + "\n")
+
+    if proc_flag:
+        MAIL.send_mail()
+
+
+def dir_cleanup(GRAPH, **kwargs):
+
+    """Function:  dir_cleanup
+
+    Description:  Clean up a number of directories of old files based on the
+        last modified date for the files.  The expiration day value is
+        hardcoded into the function call.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) **kwargs:
+            None
+
+    """
+
+    for cmd in GRAPH.validate_cmds:
+        # Cleans the input directory of each command.
+        gen_libs.file_cleanup(os.path.join(GRAPH.gp_dir, cmd), 9, **kwargs)
+
+    # Removes old reject files after N days old.
+    gen_libs.file_cleanup(GRAPH.rejected_dir, 60, **kwargs)
+
+
+def bundle_files(GRAPH, d_name, min_age, **kwargs):
+
+    """Function:  bundle_files
+
+    Description:  Rolls the loose files in a directory that are at least the
+        minimum age into the daily or monthly tar bundle of the directory.
+        Each file is gzip compressed into its own tar member and the data
+        offset and size of the member are recorded in an index file next to
+        the bundle, so a single file can be read back with one seek.  Loose
+        files are only removed after the index has been replaced.  The files
+        are listed, bundled and removed under the bundle lock of the
+        directory, so concurrent workers do not bundle the same files, and
+        files which disappear before they are read are skipped.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) d_name -> Directory name.
+        (input) min_age -> Minimum age of the files in seconds.
+        (input) **kwargs:
+            None
+        (output) bundle -> Full path and name of the bundle.
+        (output) f_list -> List of the files added to the bundle.
+
+    """
+
+    if GRAPH.bundle_period == "monthly":
+        period = datetime.datetime.strftime(datetime.datetime.now(), "%Y%m")
+
+    else:
+        period = datetime.datetime.strftime(datetime.datetime.now(), "%Y%m%d")
+
+    bundle = os.path.join(d_name, ".".join(["gp_bundle", period, "tar"]))
+
+    with system.FileLock(os.path.join(d_name, ".gp_bundle.lock")):
+        f_list = []
+
+        for fname in os.listdir(d_name):
+
+            if fname.startswith("gp_bundle.") or fname.startswith("."):
+                continue
+
+            try:
+                st = os.stat(os.path.join(d_name, fname))
+
+            except OSError as err:
+
+                # Removed since the listing.
+                if err.errno != errno.ENOENT:
+                    raise
+
+                continue
+
+            if stat.S_ISREG(st.st_mode) \
+               and st.st_mtime + min_age <= time.time():
+                f_list.append(fname)
+
+        if not f_list:
+            return bundle, f_list
+
+        index = load_state(bundle + ".idx")
+        tar = tarfile.open(bundle, "a")
+        added = []
+
+        try:
+            for fname in f_list:
+                buf = io.BytesIO()
+
+                try:
+                    with open(os.path.join(d_name, fname), "rb") as f_hdlr:
+                        data = f_hdlr.read()
+
+                except IOError as err:
+
+                    # Removed since the listing.
+                    if err.errno != errno.ENOENT:
+                        raise
+
+                    continue
+
+                gz_hdlr = gzip.GzipFile(fname, "wb", 9, buf)
+                gz_hdlr.write(data)
+                gz_hdlr.close()
+
+                tarinfo = tarfile.TarInfo(fname + ".gz")
+                tarinfo.size = len(buf.getvalue())
+                tarinfo.mtime = time.time()
+                buf.seek(0)
+                tar.addfile(tarinfo, buf)
+
+                # Data ends at the current offset, less the block padding.
+                index[fname] = [tar.offset - (tarinfo.size + 511) // 512 *
+                                512, tarinfo.size]
+                added.append(fname)
+
+        finally:
+            tar.close()
+
+        write_json(GRAPH, bundle + ".idx", index)
+
+        for fname in added:
+            os.remove(os.path.join(d_name, fname))
+
+    return bundle, added
+
+
+def extract_bundle_member(bundle, fname, dst_dir, **kwargs):
+
+    """Function:  extract_bundle_member
+
+    Description:  Extracts a single file from a tar bundle created by
+        bundle_files by seeking to its data offset from the bundle index.
+
+    Arguments:
+        (input) bundle -> Full path and name of the bundle.
+        (input) fname -> File name to extract.
+        (input) dst_dir -> Directory to extract the file to.
+        (input) **kwargs:
+            None
+        (output) True|False -> File was found in the bundle.
+
+    """
+
+    index = load_state(bundle + ".idx")
+
+    if fname not in index:
+        return False
+
+    offset, size = index[fname]
+
+    with open(bundle, "rb") as f_hdlr:
+        f_hdlr.seek(offset)
+        gz_hdlr = gzip.GzipFile(fname, "rb", 9, io.BytesIO(f_hdlr.read(size)))
+
+    with open(os.path.join(dst_dir, fname), "wb") as f_hdlr:
+        f_hdlr.write(gz_hdlr.read())
+
+    gz_hdlr.close()
+
+    return True
+
+
+def archive_bundles(GRAPH, **kwargs):
+
+    """Function:  archive_bundles
+
+    Description:  Rolls the rejected files and the non-processed files older
+        than the configured number of days into tar bundles.  The bundle of
+        each parked file is recorded in the parked file index.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) **kwargs:
+            None
+
+    """
+
+    bundle_files(GRAPH, GRAPH.rejected_dir, 0, **kwargs)
+    bundle, f_list = bundle_files(GRAPH, GRAPH.web_nonproc_dir,
+                                  GRAPH.nonproc_bundle_days * 86400, **kwargs)
+
+    if f_list:
+        update_parked_index(GRAPH, bundle=bundle, bundled=f_list, **kwargs)
+
+
+def update_parked_index(GRAPH, **kwargs):
+
+    """Function:  update_parked_index
+
+    Description:  Updates the index of the files parked in the non-processed
+        directory.  The index holds for each BE number a list of
+        [command, file name, bundle] for its parked files, where the bundle
+        is None while the file is loose in the directory.  New parked files
+        are taken from the outcome table.  Reprocessed files no longer in
+        the input directory are removed from the reprocess list.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) **kwargs:
+            bundle -> Full path and name of the bundle of the bundled files.
+            bundled -> List of parked files rolled into the bundle.
+
+    """
+
+    index_file = os.path.join(GRAPH.web_nonproc_dir, PARKED_INDEX)
+    reproc_file = os.path.join(GRAPH.web_nonproc_dir, REPROCESS_LIST)
+    bundled = set(kwargs.get("bundled", []))
+    parked = [x for x in GRAPH.outcomes.entries()
+              if x["state"] == "non_processed" and x["moved"]
+              and not x.get("indexed")]
+    done = [x for x in GRAPH.reprocessed
+            if not os.path.exists(os.path.join(GRAPH.gp_dir, x))]
+
+    if not parked and not bundled and not done:
+        return
+
+    with system.FileLock(index_file + ".lock"):
+
+        if done:
+            reproc = set(load_state(reproc_file).get("files", []))
+            GRAPH.reprocessed = reproc - set(done)
+            write_json(GRAPH, reproc_file,
+                       {"files": sorted(GRAPH.reprocessed)})
+
+        index = load_state(index_file)
+
+        for entry in parked:
+            index.setdefault(entry["be"], []).append(
+                [entry["cmd"], entry["new_fname"], None])
+            entry["indexed"] = True
+
+        if bundled:
+
+            for be in index:
+
+                for item in index[be]:
+
+                    if item[1] in bundled:
+                        item[2] = kwargs.get("bundle")
+
+        write_json(GRAPH, index_file, index)
+
+
+def get_routes_sig(list_dir, benum_dir, tgtdeck_file, **kwargs):
+
+    """Function:  get_routes_sig
+
+    Description:  Returns the signature of the target deck, the Region
+        Country list files and the BE number files.
+
+    Arguments:
+        (input) list_dir -> Directory of the Region Country list files.
+        (input) benum_dir -> Directory of the BE number files.
+        (input) tgtdeck_file -> Name of the target deck file.
+        (input) **kwargs:
+            None
+        (output) sig -> List of [name, inode, size, modify time].
+
+    """
+
+    sig = []
+
+    for d_name in [list_dir, benum_dir]:
+
+        for fname in sorted(os.listdir(d_name)):
+
+            if fname.endswith("-country_list") or fname.endswith("_benums") \
+               or fname == tgtdeck_file:
+
+                st = os.stat(os.path.join(d_name, fname))
+                sig.append([fname, st.st_ino, st.st_size, st.st_mtime])
+
+    return sig
+
+
+def reprocess_parked(GRAPH, **kwargs):
+
+    """Function:  reprocess_parked
+
+    Description:  Diffs the target deck and BE number files against the
+        snapshot of the previous run.  If they have changed, the parked
+        files in the non-processed directory whose BE number has become
+        routable are found from the parked file index and are moved (or
+        extracted from their bundle) back into the input directory of their
+        command, to be processed by this run.  Files which cannot be moved
+        are kept in the parked file index and the snapshot is only updated
+        once all of the routable files have been moved, so they are retried
+        by the next run.  The files moved are added to the reprocess list,
+        so their names are not given the target name again.  For a dry run,
+        the files are only listed.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) **kwargs:
+            None
+
+    """
+
+    snap_file = os.path.join(GRAPH.temp_dir, ROUTES_SNAPSHOT)
+    index_file = os.path.join(GRAPH.web_nonproc_dir, PARKED_INDEX)
+    reproc_file = os.path.join(GRAPH.web_nonproc_dir, REPROCESS_LIST)
+    sig = get_routes_sig(GRAPH.list_dir, GRAPH.benum_dir, GRAPH.tgtdeck_file)
+    snap = load_state(snap_file)
+    GRAPH.reprocessed = set(load_state(reproc_file).get("files", []))
+
+    if snap.get("sig") == sig:
+        return
+
+    routes = load_routes(GRAPH, **kwargs)
+    new_bes = set(routes) - set(snap.get("bes", []))
+
+    with system.FileLock(index_file + ".lock"):
+        index = load_state(index_file)
+        failed = False
+
+        for be in [x for x in index if x in new_bes]:
+            kept = []
+
+            for cmd, fname, bundle in index[be]:
+                gen_libs.write_file2(GRAPH.error_log_hdlr, "Reprocess: " +
+                                     cmd + "/" + fname + " BE is routable.")
+
+                if GRAPH.dry_run:
+                    continue
+
+                try:
+                    if bundle:
+                        extract_bundle_member(
+                            bundle, fname, os.path.join(GRAPH.gp_dir, cmd))
+
+                    else:
+                        os.rename(os.path.join(GRAPH.web_nonproc_dir, fname),
+                                  os.path.join(GRAPH.gp_dir, cmd, fname))
+
+                    GRAPH.reprocessed.add("/".join([cmd, fname]))
+
+                except (IOError, OSError) as err:
+                    gen_libs.write_file2(GRAPH.error_log_hdlr,
+                                         "Reprocess: " + fname + " " +
+                                         str(err))
+                    kept.append([cmd, fname, bundle])
+                    failed = True
+
+            if kept:
+                index[be] = kept
+
+            elif not GRAPH.dry_run:
+                del index[be]
+
+        if not GRAPH.dry_run:
+            write_json(GRAPH, reproc_file,
+                       {"files": sorted(GRAPH.reprocessed)})
+            write_json(GRAPH, index_file, index)
+
+            if not failed:
+                write_json(GRAPH, snap_file,
+                           {"sig": sig, "bes": sorted(routes)})
+
+
+def process_files(GRAPH, **kwargs):
+
+    """Function:  process_files
+
+    Description:  Controls the processing of graph plot files.  Fetch a list of
+        files, runs a number of validation checks against the files,
+        creates an array of F_Graph instances which holds all of the
+        information for each file in a seperate class instance.  The
+        filesystem actions for all files are planned first and then executed
+        together (or only printed for a dry run), unless the pipeline mode
+        is set.  Also processes rejected and non-processed files and finally
+        runs a clean up of old files and directories.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) **kwargs:
+            pattern -> Regex search parameter for file names.
+            ext_list -> List of allowable extensions to graphplot files.
+
+    """
+
+    reprocess_parked(GRAPH, **kwargs)
+    fetch_files(GRAPH, **kwargs)
+
+    # Only process the files claimed by this worker.
+    if GRAPH.multi_node:
+        claim_files(GRAPH, **kwargs)
+
+    init_outcomes(GRAPH, **kwargs)
+
+    # Are there files to process.
+    if files_to_proc(GRAPH.file_dict, **kwargs):
+
+        # Regex expr for valid file names.
+        filter_file_names(GRAPH, **kwargs)
+
+        # Are there valid files to process.
+        if files_to_proc(GRAPH.filtered_file_dict, **kwargs):
+
+            # Pipeline mode executes the actions of each file as it goes.
+            if GRAPH.pipeline and not GRAPH.dry_run:
+                fgraph_ary = process_pipeline(GRAPH, **kwargs)
+
+            else:
+                fgraph_ary = process_dir_files(GRAPH, **kwargs)
+
+                if fgraph_ary:
+                    process_valid_files(GRAPH, fgraph_ary, **kwargs)
+                    plan_nonproc_files(GRAPH, fgraph_ary, **kwargs)
+
+            if GRAPH.dry_run:
+                print_plan(GRAPH, **kwargs)
+                return
+
+            execute_plan(GRAPH, **kwargs)
+            write_queue_wait(GRAPH, **kwargs)
+
+            if fgraph_ary and GRAPH.failed:
+                drop_failed(GRAPH, fgraph_ary, **kwargs)
+
+            update_parked_index(GRAPH, **kwargs)
+
+            if fgraph_ary and GRAPH.derivatives:
+                make_derivatives(GRAPH, fgraph_ary, **kwargs)
+
+            if fgraph_ary and GRAPH.web_manifest:
+                update_manifests(GRAPH, fgraph_ary, **kwargs)
+
+            # Placed files are durable before the JSON document lists them.
+            sync_touched(GRAPH, **kwargs)
+            collect_outcomes(GRAPH, **kwargs)
+
+            if fgraph_ary:
+                find_rejects(GRAPH, **kwargs)
+
+                # Create JSON document.
+                process_fgraph_web(GRAPH, fgraph_ary, **kwargs)
+
+            write_catalog(GRAPH, **kwargs)
+            sync_touched(GRAPH, **kwargs)
+
+            find_nonproc_files(GRAPH, **kwargs)
+
+            process_reject_dict(GRAPH, **kwargs)
+
+            if GRAPH.bundle_archive:
+                archive_bundles(GRAPH, **kwargs)
+
+            dir_cleanup(GRAPH, **kwargs)
+
+        else:
+            gen_libs.write_file2(GRAPH.error_log_hdlr,
+                                 "There are no valid file names to process.")
+
+    else:
+        gen_libs.write_file2(GRAPH.error_log_hdlr,
+                             "There are no files to process.")
+
+
+def load_deck(tgtdeck, **kwargs):
+
+    """Function:  load_deck
+
+    Description:  Reads the target deck into a dictionary, so a bulk run does
+        not search the target deck file for each file.  The first line of a
+        BE number is used, same as a search of the file.
+
+    Arguments:
+        (input) tgtdeck -> Full path and name of target deck file.
+        (input) **kwargs:
+            None
+        (output) deck -> Dictionary of BE number:  target deck line.
+
+    """
+
+    deck = {}
+
+    with open(tgtdeck) as f_hdlr:
+        for line in f_hdlr:
+            deck.setdefault(line.split("\t")[0].strip(), line)
+
+    return deck
+
+
+def backfill_file(GRAPH, src_dir, fname, **kwargs):
+
+    """Function:  backfill_file
+
+    Description:  Parses and routes a file of the backfill source tree and
+        places it in its web directory under the new file name.  The file is
+        hardlinked, or copied if the source is on another device, so the
+        source tree is left in place.  Empty files, files that fail the JPEG
+        structure validation or the year and date validation of the intake
+        files, files with a BE number that is not routable and files already
+        in place are skipped.  For a dry run, the placement is only printed.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) src_dir -> Directory path of the file.
+        (input) fname -> File name.
+        (input) **kwargs:
+            routes -> Dictionary of BE number:  (country, region dir).
+            deck -> Dictionary of BE number:  target deck line.
+            stats -> StatCounter instance for the backfill counts.
+            created -> Set of the web directories already created.
+        (output) F_INST -> File Graph class instance or None if not placed.
+
+    """
+
+    stats = kwargs.get("stats")
+    created = kwargs.get("created")
+
+    src_file = os.path.join(src_dir, fname)
+
+    if os.stat(src_file).st_size == 0 \
+       or (GRAPH.validate_jpeg and fname.rsplit(".", 1)[-1].lower()
+           in JPEG_EXT and validate_jpeg(src_file)):
+
+        stats.add("invalid")
+        return None
+
+    F_INST = system.FGraph(fname, os.path.basename(src_dir), GRAPH.tgtdeck,
+                           os.path.dirname(src_dir), deck=kwargs.get("deck"))
+
+    if validate_file_date(F_INST):
+        stats.add("invalid")
+        return None
+
+    route = kwargs.get("routes").get(F_INST.f_be)
+
+    if not route:
+        stats.add("no_route")
+        return None
+
+    F_INST.set_image_info(read_image_info(src_file))
+
+    F_INST.set_dirs(route[0], route[1], GRAPH.web_layout)
+    dst_file = os.path.join(F_INST.leaf_dir, F_INST.new_fname)
+
+    if os.path.lexists(dst_file):
+        stats.add("exists")
+        return None
+
+    if GRAPH.dry_run:
+        print("Backfill: {0} -> {1}".format(src_file, dst_file))
+        stats.add("published")
+        return None
+
+    for d_name in F_INST.get_dirs():
+
+        if d_name not in created:
+            create_dir(d_name, GRAPH.web_id, GRAPH.web_grp, GRAPH.d_perm,
+                       sys_calls=GRAPH.sys_calls)
+            created.add(d_name)
+            add_touched(GRAPH, os.path.dirname(d_name))
+
+    throttle = get_throttle(GRAPH, dst_file) or {}
+
+    try:
+        if throttle.get("ops"):
+            throttle["ops"].take()
+
+        GRAPH.sys_calls.add("link")
+        os.link(src_file, dst_file)
+
+    except OSError as err:
+
+        # Placed by another worker from a file with the same new name.
+        if err.errno == errno.EEXIST:
+            stats.add("exists")
+            return None
+
+        copy_file(src_file, dst_file, GRAPH.f_perm, GRAPH.web_id,
+                  GRAPH.web_grp, sys_calls=GRAPH.sys_calls, throttle=throttle,
+                  atomic=GRAPH.publish_mode != "direct")
+
+    add_touched(GRAPH, F_INST.leaf_dir, dst_file)
+    F_INST.upd_to_loc(fname, src_dir, new_fname=F_INST.new_fname,
+                      new_path=F_INST.leaf_dir)
+    F_INST.set_processed()
+    stats.add("published")
+
+    return F_INST
+
+
+def backfill_worker(GRAPH, items, lock, stop, records, errors, **kwargs):
+
+    """Function:  backfill_worker
+
+    Description:  Worker thread of a backfill batch.  Takes files from the
+        shared iterator and places them until the iterator is empty or the
+        batch is stopped.  A file that fails with an I/O error is logged and
+        skipped, any other error stops the batch.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) items -> Iterator of (directory path, file name).
+        (input) lock -> Lock for the iterator.
+        (input) stop -> Event set to stop the batch.
+        (input) records -> List of the File Graph instances placed.
+        (input) errors -> List of the exceptions raised in the workers.
+        (input) **kwargs:
+            stats -> StatCounter instance for the backfill counts.
+            Also see backfill_file.
+
+    """
+
+    while not stop.is_set():
+
+        with lock:
+            item = next(items, None)
+
+        if item is None:
+            break
+
+        try:
+            F_INST = backfill_file(GRAPH, item[0], item[1], **kwargs)
+
+            if F_INST:
+                records.append(F_INST)
+
+        except (IOError, OSError) as err:
+            kwargs.get("stats").add("error")
+            gen_libs.write_file2(GRAPH.error_log_hdlr, "Backfill: " +
+                                 os.path.join(item[0], item[1]) + " " +
+                                 str(err))
+
+        except Exception:
+            errors.append(sys.exc_info())
+            stop.set()
+
+
+def backfill_batch(GRAPH, batch, stop, **kwargs):
+
+    """Function:  backfill_batch
+
+    Description:  Places a batch of files from the backfill source tree with
+        the configured number of worker threads.  When the stop event is
+        set, the workers stop after their current file, so the files placed
+        so far are still recorded.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) batch -> List of (directory path, file name).
+        (input) stop -> Event set to stop the backfill.
+        (input) **kwargs:
+            See backfill_file.
+        (output) records -> List of the File Graph instances placed.
+
+    """
+
+    items = iter(batch)
+    lock = threading.Lock()
+    records = []
+    errors = []
+    threads = []
+
+    for _ in range(min(GRAPH.backfill_workers, len(batch))):
+        thr = threading.Thread(target=backfill_worker,
+                               args=(GRAPH, items, lock, stop, records,
+                                     errors),
+                               kwargs=kwargs)
+        thr.daemon = True
+        thr.start()
+        threads.append(thr)
+
+    for thr in threads:
+
+        # Join with a timeout, so a stop signal is not held up.
+        while thr.is_alive():
+            thr.join(1.0)
+
+    if errors:
+        gen_libs.write_file2(GRAPH.error_log_hdlr,
+                             "".join(traceback.format_exception(*errors[0])))
+        raise errors[0][1]
+
+    return records
+
+
+def write_backfill(GRAPH, records, seq, **kwargs):
+
+    """Function:  write_backfill
+
+    Description:  Creates the derivatives of the files of a backfill batch,
+        if set, and writes the File Graph instances of the batch to a JSON
+        document of their own and to the catalog in one transaction.  For
+        the durable publication mode, the files of the batch are synced
+        before the JSON document is written and the JSON document after.
 
     Arguments:
         (input) GRAPH -> Graph class instance.
+        (input) records -> List of the File Graph instances placed.
+        (input) seq -> Sequence number of the JSON document.
         (input) **kwargs:
             None
 
     """
 
-    # Are there rejected files.
-    if GRAPH.gp_rejects:
-        f_hdlr = open(GRAPH.rejected_gps, "a")
+    if not records:
+        return
 
-        MAIL = gen_class.Mail(GRAPH.emailtowarn,
-                              "Invalid Graphplot File Names",
-                              GRAPH.emailfrom)
-        MAIL.add_2_msg("Invalid file names that were rejected:\n")
+    fgraph_ary = {}
+
+    for f_inst in records:
+        fgraph_ary.setdefault(f_inst.cmd, []).append(f_inst)
+
+    if GRAPH.derivatives:
+        make_derivatives(GRAPH, fgraph_ary, **kwargs)
+
+    sync_touched(GRAPH, **kwargs)
+    GRAPH.json_doc = os.path.join(
+        GRAPH.json_dir, ".".join([GRAPH.json_name.rsplit(".", 1)[0],
+                                  str(seq), "json"]))
+    process_fgraph_web(GRAPH, fgraph_ary, **kwargs)
+    write_catalog(GRAPH, **kwargs)
+    sync_touched(GRAPH, **kwargs)
+
+
+def backfill(GRAPH, source, **kwargs):
+
+    """Function:  backfill
+
+    Description:  Bulk backfill of a source tree, such as the archive, the
+        non-processed directory or an old web tree.  The files matching the
+        file name pattern are parsed, routed and placed in the web
+        directories by a pool of worker threads in batches.  After each
+        batch, the batch is written to a JSON document and the catalog and
+        the directories completed are saved to a checkpoint file in the
+        temp directory.  The command of a backfilled file is the name of
+        its source directory.  A stopped run is resumed from the checkpoint by
+        rerunning it with the same source.  Files already in place are
+        skipped, so a directory left part way is safely rerun.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) source -> Directory path of the source tree.
+        (input) **kwargs:
+            pattern -> Regex search parameter for file names.
+            ext_list -> List of allowable extensions to graphplot files.
+        (output) True|False -> Backfill completed.
+
+    """
+
+    pattern = kwargs.get("pattern")
+    ext_list = kwargs.get("ext_list", [])
+    source = os.path.abspath(source)
+    ckpt_file = os.path.join(GRAPH.temp_dir, BACKFILL_CHECKPOINT)
+    ckpt = load_state(ckpt_file)
+
+    if ckpt.get("source") != source:
+        ckpt = {"source": source, "done": []}
+
+    done = set(ckpt["done"])
+    stats = system.StatCounter("Backfill")
+
+    # The first strptime call imports a module and is not thread safe.
+    datetime.datetime.strptime("1965", "%Y")
+
+    opts = {"deck": load_deck(GRAPH.tgtdeck), "stats": stats,
+            "created": set(), "routes": load_routes(GRAPH, **kwargs)}
+
+    if GRAPH.dry_run:
+        GRAPH.plan.clear()
+
+    else:
+        execute_actions(GRAPH, GRAPH.plan.take())
+
+    batch = []
+    pending = []
+    seq = 0
+    stop = threading.Event()
+    handlers = {}
+
+    # A stop signal ends the backfill after the files in progress.
+    for signum in [signal.SIGINT, signal.SIGTERM]:
+        handlers[signum] = signal.signal(signum, lambda *args: stop.set())
+
+    try:
+        for src_dir, dirs, files in os.walk(source):
+
+            dirs[:] = sorted([x for x in dirs if not x.startswith(".")])
+            rel_dir = os.path.relpath(src_dir, source)
+
+            if rel_dir in done:
+                continue
+
+            for fname in sorted(files):
+
+                if os.path.splitext(fname)[1] in ext_list \
+                   and re.search(pattern, fname):
+
+                    batch.append((src_dir, fname))
+
+                if len(batch) >= GRAPH.backfill_batch or stop.is_set():
+                    records = backfill_batch(GRAPH, batch, stop, **opts)
+                    batch = []
+
+                    if not stop.is_set():
+                        done.update(pending)
+                        pending = []
+
+                    if not GRAPH.dry_run:
+                        seq += 1
+                        write_backfill(GRAPH, records, seq, **kwargs)
+                        ckpt["done"] = sorted(done)
+                        write_json(GRAPH, ckpt_file, ckpt)
+
+                    if stop.is_set():
+                        break
+
+            if stop.is_set():
+                break
+
+            pending.append(rel_dir)
+
+        else:
+            records = backfill_batch(GRAPH, batch, stop, **opts)
+
+            if not stop.is_set():
+                done.update(pending)
+
+            if not GRAPH.dry_run:
+                write_backfill(GRAPH, records, seq + 1, **kwargs)
+                ckpt["done"] = sorted(done)
+                write_json(GRAPH, ckpt_file, ckpt)
+
+    finally:
+        for signum in handlers:
+            signal.signal(signum, handlers[signum])
+
+    # Completed, the next backfill starts over.
+    if not stop.is_set() and os.path.exists(ckpt_file):
+        os.remove(ckpt_file)
+
+    gen_libs.write_file2(GRAPH.error_log_hdlr, stats.report())
+    write_throttle(GRAPH, **kwargs)
+
+    if stop.is_set():
+        gen_libs.write_file2(GRAPH.error_log_hdlr, "Backfill stopped, rerun "
+                             "with the same source to resume.")
+
+    return not stop.is_set()
+
+
+def relayout_file(GRAPH, src_dir, fname, mm_dir, **kwargs):
+
+    """Function:  relayout_file
+
+    Description:  Moves a file of the web tree, along with its derivatives,
+        into its leaf directory for the web layout.  The file keeps its name,
+        as published, and the command and target name are taken from its
+        manifest entry, if any, as the target deck may have changed since.  A
+        file already in place is left as is and a file whose new location is
+        already taken is skipped.  For a dry run, the move is only printed.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) src_dir -> Directory path of the file.
+        (input) fname -> File name.
+        (input) mm_dir -> Month directory of the file.
+        (input) **kwargs:
+            deck -> Dictionary of BE number:  target deck line.
+            files -> Dictionary of file name:  entry from the manifest.
+            stats -> StatCounter instance for the relayout counts.
+            created -> Set of the web directories already created.
+        (output) F_INST -> File Graph class instance or None if not moved.
+
+    """
+
+    stats = kwargs.get("stats")
+    created = kwargs.get("created")
+    cc_dir = os.path.dirname(os.path.dirname(os.path.dirname(mm_dir)))
+
+    F_INST = system.FGraph(fname, os.path.basename(src_dir), GRAPH.tgtdeck,
+                           os.path.dirname(src_dir), deck=kwargs.get("deck"))
+    entry = kwargs.get("files").get(fname, {})
+    F_INST.cmd = entry.get("cmd") or F_INST.cmd
+    F_INST.tgt_name = entry.get("tgt_name") or F_INST.tgt_name
+
+    # No target deck renaming, the leaf directory is for the name on disk.
+    F_INST.new_fname = fname
+    F_INST.new_xml_fname = ".".join([fname, "xml"])
+    F_INST.new_xml_dctm_fname = ".".join([fname, "IPL", "xml"])
+    F_INST.set_dirs(os.path.basename(cc_dir), os.path.dirname(cc_dir),
+                    GRAPH.web_layout)
+
+    if F_INST.leaf_dir == src_dir:
+        stats.add("current")
+        return None
+
+    src_file = os.path.join(src_dir, fname)
+    dst_file = os.path.join(F_INST.leaf_dir, fname)
+
+    if os.path.lexists(dst_file):
+        stats.add("exists")
+        gen_libs.write_file2(GRAPH.error_log_hdlr, "Relayout: " + src_file +
+                             " not moved, " + dst_file + " already exists.")
+        return None
+
+    if GRAPH.dry_run:
+        print("Relayout: {0} -> {1}".format(src_file, dst_file))
+        stats.add("moved")
+        return None
+
+    for d_name in F_INST.get_dirs():
+
+        if d_name not in created:
+            create_dir(d_name, GRAPH.web_id, GRAPH.web_grp, GRAPH.d_perm,
+                       sys_calls=GRAPH.sys_calls)
+            created.add(d_name)
+            add_touched(GRAPH, os.path.dirname(d_name))
+
+    F_INST.set_image_info(read_image_info(src_file))
+    move_file(src_file, dst_file, sys_calls=GRAPH.sys_calls,
+              throttle=get_throttle(GRAPH, dst_file),
+              atomic=GRAPH.publish_mode != "direct")
+    add_touched(GRAPH, src_dir)
+    add_touched(GRAPH, F_INST.leaf_dir, dst_file)
+
+    for kind in sorted(DERIVATIVE_DIRS):
+        d_src = os.path.join(src_dir, DERIVATIVE_DIRS[kind], fname)
+
+        if not os.path.exists(d_src):
+            continue
+
+        d_name = os.path.join(F_INST.leaf_dir, DERIVATIVE_DIRS[kind])
+        d_dst = os.path.join(d_name, fname)
+
+        if d_name not in created:
+            create_dir(d_name, GRAPH.web_id, GRAPH.web_grp, GRAPH.d_perm,
+                       sys_calls=GRAPH.sys_calls)
+            created.add(d_name)
+
+        move_file(d_src, d_dst, sys_calls=GRAPH.sys_calls,
+                  throttle=get_throttle(GRAPH, d_dst),
+                  atomic=GRAPH.publish_mode != "direct")
+        add_touched(GRAPH, d_name, d_dst)
+        F_INST.set_derivative(kind, d_dst)
+
+    F_INST.upd_to_loc(fname, src_dir, new_path=F_INST.leaf_dir)
+    F_INST.set_processed()
+    stats.add("moved")
+
+    return F_INST
+
+
+def relayout_files(mm_dir, pattern, ext_list, **kwargs):
+
+    """Function:  relayout_files
+
+    Description:  Returns the graph plot files in a month directory and its
+        sub-directories, leaving out hidden directories and the derivatives.
+
+    Arguments:
+        (input) mm_dir -> Month directory path.
+        (input) pattern -> Regex search parameter for file names.
+        (input) ext_list -> List of allowable extensions to graphplot files.
+        (input) **kwargs:
+            None
+        (output) List of (directory path, file name).
+
+    """
+
+    skip = list(DERIVATIVE_DIRS.values())
+    items = []
+
+    for src_dir, dirs, files in os.walk(mm_dir):
+
+        dirs[:] = sorted([x for x in dirs
+                          if not x.startswith(".") and x not in skip])
+
+        for fname in sorted(files):
+
+            if os.path.splitext(fname)[1] in ext_list \
+               and re.search(pattern, fname):
+
+                items.append((src_dir, fname))
+
+    return items
+
+
+def prune_dirs(GRAPH, d_list, **kwargs):
+
+    """Function:  prune_dirs
+
+    Description:  Removes the directories, and their derivative
+        sub-directories, a relayout has moved files out of if they are left
+        empty, deepest first.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) d_list -> List of directory paths.
+        (input) **kwargs:
+            None
+
+    """
+
+    for d_name in sorted(d_list, key=lambda x: (-x.count(os.sep), x)):
+
+        for sub_dir in [os.path.join(d_name, x) for x in
+                        sorted(DERIVATIVE_DIRS.values())] + [d_name]:
+
+            try:
+                os.rmdir(sub_dir)
+                add_touched(GRAPH, os.path.dirname(sub_dir))
+
+            except OSError as err:
+
+                # Not empty, such as a file placed by a concurrent run.
+                if err.errno not in [errno.ENOTEMPTY, errno.EEXIST,
+                                     errno.ENOENT]:
+                    raise
+
+
+def relayout(GRAPH, **kwargs):
+
+    """Function:  relayout
+
+    Description:  Migrates the web tree to the web layout by moving each file,
+        along with its derivatives, into its leaf directory for the layout.
+        The month directories are migrated one at a time and the moved files
+        are written to JSON documents, the catalog and the manifests in
+        batches, as for a backfill, and the month directories completed are
+        saved to a checkpoint file in the temp directory.  Empty directories
+        left behind are removed.  The moves are renames within the web tree,
+        paced by the web I/O limits, so the relayout can run in the
+        background alongside the processing runs.  A stopped run is resumed
+        from the checkpoint by rerunning it.
+
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) **kwargs:
+            pattern -> Regex search parameter for file names.
+            ext_list -> List of allowable extensions to graphplot files.
+        (output) True|False -> Relayout completed.
+
+    """
+
+    pattern = kwargs.get("pattern")
+    ext_list = kwargs.get("ext_list", [])
+    ckpt_file = os.path.join(GRAPH.temp_dir, RELAYOUT_CHECKPOINT)
+    ckpt = load_state(ckpt_file)
+
+    if ckpt.get("layout") != GRAPH.web_layout:
+        ckpt = {"layout": GRAPH.web_layout, "done": []}
+
+    done = set(ckpt["done"])
+    stats = system.StatCounter("Relayout")
+    opts = {"deck": load_deck(GRAPH.tgtdeck), "stats": stats,
+            "created": set()}
+    records = []
+    moves = []
+    seq = 0
+    stop = threading.Event()
+    handlers = {}
+
+    # Month directories:  region/country/Gp/year/month.
+    mm_dirs = sorted([x for x in glob.glob(os.path.join(
+        GRAPH.graphbase_dir, "*", "*", "Gp", "*", "*")) if os.path.isdir(x)])
+
+    # A stop signal ends the relayout after the file in progress.
+    for signum in [signal.SIGINT, signal.SIGTERM]:
+        handlers[signum] = signal.signal(signum, lambda *args: stop.set())
+
+    try:
+        for mm_dir in mm_dirs:
+
+            if mm_dir in done:
+                continue
+
+            manifest = load_state(os.path.join(mm_dir, GRAPH.manifest_name))
+            opts["files"] = manifest.get("files", {})
+            emptied = set()
+
+            for src_dir, fname in relayout_files(mm_dir, pattern, ext_list):
+
+                if stop.is_set():
+                    break
+
+                try:
+                    F_INST = relayout_file(GRAPH, src_dir, fname, mm_dir,
+                                           **opts)
+
+                except (IOError, OSError) as err:
+                    stats.add("error")
+                    gen_libs.write_file2(GRAPH.error_log_hdlr, "Relayout: " +
+                                         os.path.join(src_dir, fname) + " " +
+                                         str(err))
+                    continue
+
+                if F_INST:
+                    records.append(F_INST)
+                    moves.append((os.path.join(F_INST.leaf_dir, fname),
+                                  os.path.join(src_dir, fname)))
+                    emptied.add(src_dir)
+
+                if len(records) >= GRAPH.backfill_batch:
+                    seq += 1
+                    write_relayout(GRAPH, records, moves, seq, **kwargs)
+                    records = []
+                    moves = []
+
+            if records:
+                seq += 1
+                write_relayout(GRAPH, records, moves, seq, **kwargs)
+                records = []
+                moves = []
+
+            prune_dirs(GRAPH, [x for x in emptied if x != mm_dir])
+
+            if stop.is_set():
+                break
+
+            done.add(mm_dir)
+
+            if not GRAPH.dry_run:
+                ckpt["done"] = sorted(done)
+                write_json(GRAPH, ckpt_file, ckpt)
+
+    finally:
+        for signum in handlers:
+            signal.signal(signum, handlers[signum])
 
-        for x in GRAPH.gp_rejects:
+    # Completed, the next relayout starts over.
+    if not stop.is_set() and os.path.exists(ckpt_file):
+        os.remove(ckpt_file)
 
-            MAIL.add_2_msg(x + "\n")
-            gen_libs.write_file2(f_hdlr, x)
+    gen_libs.write_file2(GRAPH.error_log_hdlr, stats.report())
+    write_throttle(GRAPH, **kwargs)
 
-        MAIL.send_mail()
+    if stop.is_set():
+        gen_libs.write_file2(GRAPH.error_log_hdlr, "Relayout stopped, rerun "
+                             "to resume.")
 
+    return not stop.is_set()
 
-def process_notindeck(GRAPH, **kwargs):
 
-    """Function:  process_notindeck
+def write_relayout(GRAPH, records, moves, seq, **kwargs):
 
-    Description:  Email out a list of files that were not found in the target
-        deck list and also adds the file to the not in deck mailed file.
+    """Function:  write_relayout
+
+    Description:  Updates the manifests, if set, and the content hashes of
+        the catalog, if set, with the new locations of the files moved by a
+        relayout and writes them to a JSON document and the catalog by
+        write_backfill.
 
     Arguments:
         (input) GRAPH -> Graph class instance.
+        (input) records -> List of the File Graph instances moved.
+        (input) moves -> List of (new path, old path) of the files moved.
+        (input) seq -> Sequence number of the JSON document.
         (input) **kwargs:
             None
 
     """
 
-    f_hdlr = open(GRAPH.mail_notdeck, "a")
+    if not records:
+        return
 
-    MAIL = gen_class.Mail(GRAPH.emailtotgt,
-                          "GraphPlots File Name Not In Deck\n",
-                          GRAPH.emailfrom)
-    MAIL.add_2_msg("File names that are not in the target deck.\n")
-    MAIL.add_2_msg("There is no facility name for below mentioned files.\n")
-    MAIL.add_2_msg("Target be added to Target Deck along with Be Number.\n")
+    if GRAPH.web_manifest:
+        fgraph_ary = {}
 
-    for cmd in GRAPH.gp_not_in_deck:
+        for f_inst in records:
+            fgraph_ary.setdefault(f_inst.cmd, []).append(f_inst)
 
-        for x in GRAPH.gp_not_in_deck[cmd]:
+        update_manifests(GRAPH, fgraph_ary, **kwargs)
 
-            MAIL.add_2_msg("/".join([cmd, x]) + "\n")
-            gen_libs.write_file2(f_hdlr, "/".join([cmd, x]))
+    # Duplicate detection looks up the original by its content hash.
+    if GRAPH.catalog_db and moves:
+        conn = get_catalog(GRAPH)
 
-    MAIL.send_mail()
+        with conn:
+            conn.executemany(
+                "UPDATE hashes SET final_path = ? WHERE final_path = ?", moves)
 
-    f_hdlr.close()
+    write_backfill(GRAPH, records, seq, **kwargs)
 
 
-def find_rejects(GRAPH, fgraph_ary, **kwargs):
+def get_path_sig(path, **kwargs):
 
-    """Function:  find_rejects
+    """Function:  get_path_sig
 
-    Description:  Controls the processing of the rejected files and files not
-        found in the target deck.
+    Description:  Returns the signature of a file or directory.  The signature
+        of a directory changes when an entry is added to, removed from or
+        renamed in the directory.
 
     Arguments:
-        (input) GRAPH -> Graph class instance.
-        (input) fgraph_ary -> Dictionary-list of F_Graph instances.
+        (input) path -> File or directory name.
         (input) **kwargs:
             None
+        (output) Signature [inode, modify time] or None if it does not exist.
 
     """
 
-    fetch_rejected_gps(GRAPH, fgraph_ary, **kwargs)
-
-    process_rejected_gps(GRAPH, **kwargs)
-
-    for cmd in GRAPH.gp_not_in_deck:
+    try:
+        st = os.stat(path)
 
-        if GRAPH.gp_not_in_deck[cmd]:
-            process_notindeck(GRAPH, **kwargs)
+        return [st.st_ino, st.st_mtime]
 
-            # Break as the process_notindeck processes all files.
-            break
+    except OSError:
+        return None
 
 
-def create_dir(d_name, owner=-1, group=-1, perm=None, **kwargs):
+def load_state(state_file, **kwargs):
 
-    """Function:  create_dir
+    """Function:  load_state
 
-    Description:  Creates a directory with optional arguments for owner and
-        group settings along with permission settings.
+    Description:  Loads the state file of the previous runs.
 
     Arguments:
-        (input) d_name -> Directory name.
-        (input) owner -> Numeric id for owner.  -1 leaves id unchanged.
-        (input) group -> Numeri id for group.  -1 leaves id unchanged.
-        (input) perm -> Octal permission setting.
+        (input) state_file -> Full path and name of state file.
         (input) **kwargs:
             None
+        (output) state -> Dictionary of the state file or empty dictionary.
 
     """
 
-    if not os.path.isdir(d_name):
-        os.makedirs(d_name)
-        os.chown(d_name, owner, group)
+    try:
+        with open(state_file) as f_hdlr:
+            return json.load(f_hdlr)
 
-        if perm:
-            os.chmod(d_name, perm)
+    except (IOError, ValueError):
+        return {}
 
 
-def process_fgraph_dir(GRAPH, fgraph_ary, cc, reg_dir, be_list, **kwargs):
+def write_json(GRAPH, fname, data, perm=None, owner=-1, group=-1, **kwargs):
 
-    """Function:  process_fgraph_dir
+    """Function:  write_json
 
-    Description:  Moves the graph plot file to the correct web directory
-        location.  Creates the necessary directories if they do not exist.
-        Updates F_Graph instance to the new location and sets the processed
-        attribute within the class.
+    Description:  Writes data as a JSON document to a temporary file and
+        renames it into place, so readers never see a partial document.
 
     Arguments:
         (input) GRAPH -> Graph class instance.
-        (input) fgraph_ary -> Dictionary-list of F_Graph instances.
-        (input) cc -> Country name.
-        (input) reg_dir -> Region path directory.
-        (input) be_list -> List of BE Numbers.
+        (input) fname -> Full path and name of the JSON file.
+        (input) data -> Data to be written.
+        (input) perm -> Octal permission setting.
+        (input) owner -> Numeric id for owner.  -1 leaves id unchanged.
+        (input) group -> Numeric id for group.  -1 leaves id unchanged.
         (input) **kwargs:
-            None
+            indent -> Indent level of the JSON document.
 
     """
 
-    for cmd in fgraph_ary:
+    tmp_file = os.path.join(os.path.dirname(fname),
+                            ".".join(["", os.path.basename(fname),
+                                      str(GRAPH.pid), "tmp"]))
+    fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                 perm or 0o644)
 
-        for f_inst in fgraph_ary[cmd]:
+    try:
+        set_fd_attrs(fd, perm, owner, group)
+        data = json.dumps(data, indent=kwargs.get("indent"))
 
-            # Check to see if file's BE number is in the BE list.
-            if f_inst.f_be in be_list:
-                f_inst.set_dirs(cc, reg_dir)
-
-                create_dir(f_inst.cc_dir, GRAPH.web_id, GRAPH.web_grp,
-                           GRAPH.d_perm, **kwargs)
-                create_dir(f_inst.gp_dir, GRAPH.web_id, GRAPH.web_grp,
-                           GRAPH.d_perm, **kwargs)
-                create_dir(f_inst.yy_dir, GRAPH.web_id, GRAPH.web_grp,
-                           GRAPH.d_perm, **kwargs)
-                create_dir(f_inst.mm_dir, GRAPH.web_id, GRAPH.web_grp,
-                           GRAPH.d_perm, **kwargs)
-
-                gen_libs.mv_file(f_inst.new_fname,
-                                 os.path.join(GRAPH.gp_dir, cmd),
-                                 f_inst.mm_dir)
+        if not isinstance(data, bytes):
+            data = data.encode("utf-8")
 
-                f_inst.upd_to_loc(f_inst.new_fname,
-                                  os.path.join(GRAPH.gp_dir, cmd),
-                                  new_path=f_inst.mm_dir)
+        while data:
+            data = data[os.write(fd, data):]
 
-                f_inst.set_processed()
+    finally:
+        os.close(fd)
 
+    os.rename(tmp_file, fname)
 
-def process_fgraph_web(GRAPH, fgraph_ary, **kwargs):
 
-    """Function:  process_fgraph_web
+def is_unchanged(prog_cfg, cmd_list, state_file, cfg_file, **kwargs):
 
-    Description:  Pulls the F_Graph attributes and converts them to a
-        dictionary format.  All of the instances are saved to a dictionary
-        which is then converted to a JSON document and written to a file.
-        Process File Graph instances for web entry.
+    """Function:  is_unchanged
+
+    Description:  Checks the state file to see if the configuration, the
+        target deck and BE number files and the input directory of each
+        command are unchanged since the end of the last successful run and
+        that run left nothing pending.  Used to exit early when there is
+        nothing to do.
 
     Arguments:
-        (input) GRAPH -> Graph class instance.
-        (input) fgraph_ary -> Dictionary-list of F_Graph instances.
+        (input) prog_cfg -> Configuration module.
+        (input) cmd_list -> List of command names.
+        (input) state_file -> Full path and name of state file.
+        (input) cfg_file -> Full path and name of configuration file.
         (input) **kwargs:
             None
+        (output) True|False -> Nothing has changed since the last run.
 
     """
 
-    jdoc = {}
+    state = load_state(state_file)
+    max_age = getattr(prog_cfg, "state_max_age", 3600)
 
-    for cmd in fgraph_ary:
+    if not cmd_list or state.get("config") != get_path_sig(cfg_file):
+        return False
 
-        for f_inst in fgraph_ary[cmd]:
+    # Target deck or BE number files changed, parked files may be routable.
+    snap = load_state(os.path.join(prog_cfg.temp_dir, ROUTES_SNAPSHOT))
 
-            if f_inst.processed is True:
-                # Pull class information and save to dictionary.
-                jdoc[f_inst.new_fname] = f_inst.__dict__
+    if snap.get("sig") != get_routes_sig(
+            prog_cfg.list_dir, os.path.join(prog_cfg.list_dir,
+                                            prog_cfg.be_folder),
+            prog_cfg.tgtdeck_file):
 
-    # Convert dictionary to JSON and write to file.
-    gen_libs.write_file(GRAPH.json_doc, "w", json.dumps(jdoc, indent=4))
+        return False
 
+    for cmd in cmd_list:
+        entry = state.get("cmds", {}).get(cmd)
 
-def process_region_cc(GRAPH, fgraph_ary, f_cc, reg_dir, tgt_dir, **kwargs):
+        if not entry or entry["status"] != "ok" \
+           or entry["time"] + max_age < time.time() \
+           or entry["sig"] != get_path_sig(os.path.join(prog_cfg.gp_dir, cmd)):
 
-    """Function:  process_region_cc
+            return False
+
+    return True
 
-    Description:  Process each country in the Region Country list by creating a
-        list of BE numbers for the region and passing this to the
-        function to process the graph plot files.
+
+def save_state(GRAPH, cfg_file, status, **kwargs):
+
+    """Function:  save_state
+
+    Description:  Updates the state file with the signature and status of the
+        input directory of each command processed.  A command is set to
+        pending if files not seen by this run, including deferred files,
+        are in the directory or if the directory was modified within a
+        modify time tick of the listing.  The scan signatures of the
+        deferred files are kept for the next run.  The state file is locked
+        and replaced atomically, as concurrent runs may update different
+        commands.
 
     Arguments:
         (input) GRAPH -> Graph class instance.
-        (input) fgraph_ary -> Dictionary-list of F_Graph instances.
-        (input) f_cc -> Region Country List file name.
-        (input) reg_dir -> Region path directory.
-        (input) tgt_dir -> Region Target path directory.
+        (input) cfg_file -> Full path and name of configuration file.
+        (input) status -> Status of the run:  ok|running.
         (input) **kwargs:
             None
 
     """
 
-    with open(f_cc) as fname:
-        for cc in fname:
-
-            # Clean up the country name.
-            cc = cc.strip()
+    with system.FileLock(GRAPH.state_file + ".lock"):
+        state = load_state(GRAPH.state_file)
+        state["config"] = get_path_sig(cfg_file)
+        state.setdefault("cmds", {})
 
-            # Create the BE number file name.
-            #   "_benums" is the default ending for the BE file name.
-            f_be = os.path.join(GRAPH.benum_dir, "".join([cc, "_benums"]))
+        for cmd in GRAPH.validate_cmds:
+            cmd_dir = os.path.join(GRAPH.gp_dir, cmd)
+            entry = {"sig": None, "status": status, "time": time.time(),
+                     "deferred": GRAPH.deferred.get(
+                         cmd, state["cmds"].get(cmd, {}).get("deferred", {}))}
 
-            # If the BE file does not exist, file is empty or not readable.
-            if not os.path.isfile(f_be) or os.stat(f_be).st_size == 0 \
-               or not os.access(f_be, os.R_OK):
+            if status == "ok":
+                # Signature is taken before the listing, so a file arriving
+                #   after the signature will change the signature.
+                entry["sig"] = get_path_sig(cmd_dir)
+                seen = set(GRAPH.all_file_dict.get(cmd, []))
 
-                gen_libs.write_file2(GRAPH.error_log_hdlr,
-                                     "Error: No file, empty, non-readable: " +
-                                     f_be)
+                if [x for x in os.listdir(cmd_dir) if x not in seen
+                        and os.path.isfile(os.path.join(cmd_dir, x))]:
+                    entry["status"] = "pending"
 
-                # Go to the next country.
-                continue
+                # A file arriving after the listing within the same modify
+                #   time tick would not change the signature.
+                elif not entry["sig"] \
+                        or entry["sig"][1] + MTIME_TICK > time.time():
+                    entry["status"] = "pending"
 
-            else:
-                with open(f_be) as fname2:
-                    # Read BEs into a list, clean up the BE number.
-                    be_list = [x.strip() for x in fname2]
+            state["cmds"][cmd] = entry
 
-            # Process the F_Graph instances.
-            process_fgraph_dir(GRAPH, fgraph_ary, cc, reg_dir, be_list)
+        write_json(GRAPH, GRAPH.state_file, state)
 
 
-def process_valid_files(GRAPH, fgraph_ary, **kwargs):
+def select_cmds(GRAPH, cmd_list, **kwargs):
 
-    """Function:  process_valid_files
+    """Function:  select_cmds
 
-    Description:  Setup the Region's country list file and directories and then
-        call the function to process each country in the region.
+    Description:  Restricts the commands to be processed to the selected
+        commands.  Selected commands not in the configuration are reported.
 
     Arguments:
         (input) GRAPH -> Graph class instance.
-        (input) fgraph_ary -> Dictionary-list of F_Graph instances.
+        (input) cmd_list -> List of selected command names.
         (input) **kwargs:
             None
 
     """
 
-    for region in GRAPH.process_cmds:
-
-        # Create the Region's Country list file name.
-        #   "-country_list" is default ending for the Country list file name.
-        f_cc = os.path.join(GRAPH.list_dir, "".join([region, "-country_list"]))
-
-        # If the Region Country list file does not exist, file is empty
-        #   or not readable.
-        if not os.path.isfile(f_cc) or os.stat(f_cc).st_size == 0 \
-           or not os.access(f_cc, os.R_OK):
-
-            gen_libs.write_file2(GRAPH.error_log_hdlr,
-                                 "Error: No file, empty, or non-readable: " +
-                                 f_cc)
-
-            # Go to the next command.
-            continue
-
-        # NOTE: "targets" directory may not be required if the web pages are
-        #   created from the Mongodb database.
-        # Create the Region's directory variables.
-        reg_dir = os.path.join(GRAPH.graphbase_dir, region)
-        tgt_dir = os.path.join(reg_dir, "targets")
+    for cmd in cmd_list:
 
-        create_dir(reg_dir, GRAPH.web_id, GRAPH.web_grp, GRAPH.d_perm,
-                   **kwargs)
-        create_dir(tgt_dir, GRAPH.web_id, GRAPH.web_grp, GRAPH.d_perm,
-                   **kwargs)
+        if cmd not in GRAPH.validate_cmds:
+            print("Error:  Command {0} is not in validate_cmds.".format(cmd))
 
-        # Process each Country within the Region.
-        process_region_cc(GRAPH, fgraph_ary, f_cc, reg_dir, tgt_dir, **kwargs)
+    GRAPH.validate_cmds = [x for x in GRAPH.validate_cmds if x in cmd_list]
 
 
-def find_nonproc_files(GRAPH, **kwargs):
+def lock_cmds(GRAPH, **kwargs):
 
-    """Function:  find_nonproc_files
+    """Function:  lock_cmds
 
-    Description:  Compare the current list of files in the input directories
-        with the original file list.  Any files listed means the file was
-        not processed.  Send out an email on non-processed files and
-        write entry to error log.  Also looks for files that have
-        passed name validation, but have failed for another reason and
-        handles those files by moving them to another directory and
-        sending out email and log notifications.
+    Description:  Locks each command to be processed so independent commands
+        can be processed by concurrent runs.  Commands locked by another run
+        are skipped and removed from the commands to be processed.
 
     Arguments:
         (input) GRAPH -> Graph class instance.
         (input) **kwargs:
-            fgraph_ary ->  Dictionary-list of F_Graph instances.
+            None
+        (output) True|False -> At least one command was locked.
 
     """
 
-    full_list = {}
-    proc_flag = False
+    locked = []
 
     for cmd in GRAPH.validate_cmds:
+        LOCK = system.FileLock(".".join([GRAPH.lock_prog, cmd]))
 
-        cmd_dir = os.path.join(GRAPH.gp_dir, cmd)
-
-        # Return all files in the commands's input directory as a list.
-        all_file_list = [x for x in os.listdir(cmd_dir)
-                         if os.path.isfile(os.path.join(cmd_dir, x))]
-
-        # Intersect the original file list with the current file list.
-        diff_list = list(set(GRAPH.all_file_dict[cmd]) & set(all_file_list))
+        if LOCK.acquire(blocking=False):
+            GRAPH.cmd_locks.append(LOCK)
+            locked.append(cmd)
 
-        # Any file listed means it was not processed.
-        if diff_list:
-            # Add the list to a dictionary-list.
-            full_list[cmd] = diff_list
-            proc_flag = True
+        else:
+            print("WARNING:  Lock in place for command: {0}".format(cmd))
 
-    # If any files were detected that were not processed.
-    if proc_flag:
-        MAIL = gen_class.Mail(GRAPH.emailtowarn, "Non-Processed File Names",
-                              GRAPH.emailfrom)
-        MAIL.add_2_msg("File names that were not processed:\n")
+    GRAPH.validate_cmds = locked
 
-        for cmd in full_list:
+    return bool(locked)
 
-            for fname in full_list[cmd]:
-                MAIL.add_2_msg(fname + "\n")
-                gen_libs.write_file2(GRAPH.error_log_hdlr, cmd + "/" + fname +
-                                     ":  File was not processed.")
 
-        MAIL.send_mail()
+def unlock_cmds(GRAPH, **kwargs):
 
-    # 20160830 - Added handling of valid name non-processed files.
-    ###########################################################################
-    fgraph_ary = kwargs.get("fgraph_ary", None)
-    file_list = []
+    """Function:  unlock_cmds
 
-    # Have any files been processed.
-    if fgraph_ary:
+    Description:  Releases the command locks held by this run.
 
-        for cmd in fgraph_ary:
+    Arguments:
+        (input) GRAPH -> Graph class instance.
+        (input) **kwargs:
+            None
 
-            for f_inst in fgraph_ary[cmd]:
+    """
 
-                # If file has not been processed.
-                if f_inst.processed is False:
+    for LOCK in GRAPH.cmd_locks:
+        LOCK.release()
 
-                    file_list.append("/".join([f_inst.cmd, f_inst.new_fname]))
+    GRAPH.cmd_locks = []
 
-                    # Move file to non-processed directory.
-                    gen_libs.mv_file(f_inst.new_fname,
-                                     os.path.join(GRAPH.gp_dir, cmd),
-                                     GRAPH.web_nonproc_dir, **kwargs)
 
-        if file_list:
+def load_config(cfg_name, cfg_dir, **kwargs):
 
-            MAIL = gen_class.Mail(GRAPH.emailtowarn,
-                                  "Valid File Name, but Non-Processed File(s)",
-                                  GRAPH.emailfrom)
-            MAIL.add_2_msg("These file(s) passed name validation, but failed ")
-            MAIL.add_2_msg("for another reason.  Please investigate.\n")
-            MAIL.add_2_msg("Files moved to " + GRAPH.web_nonproc_dir + "\n\n")
+    """Function:  load_config
 
-            for fname in file_list:
+    Description:  Loads the configuration module as a read-only settings
+        object.  The settings are cached in marshal format in the
+        configuration directory and the cache is used, instead of importing
+        the module, while the configuration file is unchanged.  If the
+        settings cannot be cached, the module itself is returned.
 
-                MAIL.add_2_msg(fname + "\n")
-                gen_libs.write_file2(GRAPH.error_log_hdlr,
-                                     "Warning: " + fname + " valid name, but" +
-                                     " has failed for another reason." +
-                                     "  Please investigate.")
+    Arguments:
+        (input) cfg_name -> Name of the configuration module.
+        (input) cfg_dir -> Directory of the configuration module.
+        (input) **kwargs:
+            None
+        (output) prog_cfg -> FrozenConfig instance or configuration module.
 
-            MAIL.send_mail()
-    ###########################################################################
+    """
 
+    cfg_file = os.path.join(cfg_dir, cfg_name + ".py")
+    cache_file = os.path.join(cfg_dir, "." + cfg_name + ".cache")
+    st = os.stat(cfg_file)
+    sig = [sys.hexversion, st.st_ino, st.st_size, st.st_mtime]
 
-def process_reject_dict(GRAPH, **kwargs):
+    try:
+        with open(cache_file, "rb") as f_hdlr:
+            cache_sig, settings = marshal.load(f_hdlr)
 
-    """Function:  process_reject_dict
+        if cache_sig == sig:
+            return system.FrozenConfig(settings)
 
-    Description:  Looks for any files that are in the reject dictionary and if
-        detected creates an email with a list of rejected files and the
-        reason for the reject.
+    except (IOError, EOFError, ValueError, TypeError):
+        pass
 
-    Arguments:
-        (input) GRAPH -> Graph class instance.
-        (input) **kwargs:
-            None
+    module = gen_libs.load_module(cfg_name, cfg_dir)
+    settings = {}
 
-    """
+    for name in dir(module):
 
-    proc_flag = False
+        if not name.startswith("_") \
+           and not isinstance(getattr(module, name), types.ModuleType):
+            settings[name] = getattr(module, name)
 
-    for cmd in GRAPH.reject_dict:
+    tmp_file = ".".join([cache_file, str(os.getpid())])
 
-        # If there are files to be processed and proc_flag is False.
-        if GRAPH.reject_dict[cmd] and not proc_flag:
+    try:
+        data = marshal.dumps([sig, settings])
+        fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
 
-            MAIL = gen_class.Mail(GRAPH.emailtowarn, "GP:  Rejected files",
-                                  GRAPH.emailfrom)
-            MAIL.add_2_msg("File names that were not processed:\n")
-            proc_flag = True
+        try:
+            while data:
+                data = data[os.write(fd, data):]
 
-        for reject in GRAPH.reject_dict[cmd]:
+        finally:
+            os.close(fd)
 
-            for dict_key in reject:
+        os.rename(tmp_file, cache_file)
 
-                MAIL.add_2_msg(dict_key + ":  " + reject[dict_key] + "\n")
+    # Settings which cannot be marshalled or a read-only directory.
+    except (ValueError, OSError):
+        return module
 
-    if proc_flag:
-        MAIL.send_mail()
+    return system.FrozenConfig(settings)
 
 
-def dir_cleanup(GRAPH, **kwargs):
+def open_log(GRAPH, **kwargs):
 
-    """Function:  dir_cleanup
+    """Function:  open_log
 
-    Description:  Clean up a number of directories of old files based on the
-        last modified date for the files.  The expiration day value is
-        hardcoded into the function call.
+    Description:  Returns the error log of the run.  Dry run log entries are
+        written to standard out.  With the consolidated log mode, the run
+        writes to the log shared by all runs, which is only opened on the
+        first entry.  Otherwise a new log is opened for the run.
 
     Arguments:
         (input) GRAPH -> Graph class instance.
         (input) **kwargs:
             None
+        (output) File handler of the error log.
 
     """
 
-    for cmd in GRAPH.validate_cmds:
-        # Cleans the input directory of each command.
-        gen_libs.file_cleanup(os.path.join(GRAPH.gp_dir, cmd), 9, **kwargs)
+    if GRAPH.dry_run:
+        return sys.stdout
 
-    # Removes old reject files after N days old.
-    gen_libs.file_cleanup(GRAPH.rejected_dir, 60, **kwargs)
+    elif GRAPH.log_mode == "consolidated":
+        return system.RunLog(GRAPH.error_abs_log, GRAPH.run_id,
+                             GRAPH.log_max_size, GRAPH.log_rotate,
+                             GRAPH.log_keep)
 
+    return open(GRAPH.error_abs_log, "w")
 
-def process_files(GRAPH, **kwargs):
 
-    """Function:  process_files
+def run_backfill(prog_cfg, args_array, dir_set, file_set, prog_name,
+                 pattern, **kwargs):
 
-    Description:  Controls the processing of graph plot files.  Fetch a list of
-        files, runs a number of validation checks against the files,
-        creates an array of F_Graph instances which holds all of the
-        information for each file in a seperate class instance.  Also
-        processes rejected and non-processed files and finally runs a
-        clean up of old files and directories.
+    """Function:  run_backfill
+
+    Description:  Initializes the parent Graph class for a backfill or a
+        relayout, opens up the error log, validates the directories and
+        files required to run the program, locks the backfill or relayout
+        and then calls the function to backfill the source tree or to
+        migrate the web tree to the web layout.
 
     Arguments:
-        (input) GRAPH -> Graph class instance.
+        (input) prog_cfg -> Program configuration variable.
+        (input) args_array -> Array of command line options and values.
+        (input) dir_set -> Dictionary list of directories and perms.
+        (input) file_set -> Dictionary list of files and perms.
+        (input) prog_name -> Name of the program.
+        (input) pattern -> Regex search parameter for file names.
         (input) **kwargs:
-            pattern -> Regex search parameter for file names.
-            ext_list -> List of allowable extensions to graphplot files.
+            cfg_file -> Full path and name of the configuration file.
+            null_dir -> List of directory variables that can be null.
 
     """
 
-    fetch_files(GRAPH, **kwargs)
-
-    # Are there files to process.
-    if files_to_proc(GRAPH.file_dict, **kwargs):
+    source = args_array.get("-b")
+    mode = "relayout" if "-L" in args_array else "backfill"
+    pattern = pattern + "(" + "|".join(prog_cfg.file_ext) + ")"
+    ext_list = ["." + x for x in prog_cfg.file_ext]
 
-        # Regex expr for valid file names.
-        filter_file_names(GRAPH, **kwargs)
+    if mode == "backfill" and not os.path.isdir(source):
+        print("Error:  Backfill source {0} is not a directory."
+              .format(source))
+        return
 
-        # Are there valid files to process.
-        if files_to_proc(GRAPH.filtered_file_dict, **kwargs):
+    GRAPH = system.Graph(prog_cfg=prog_cfg, prog_name=prog_name)
+    GRAPH.dry_run = "-n" in args_array
 
-            fgraph_ary = process_dir_files(GRAPH, **kwargs)
+    if not setup_validation(GRAPH, dir_set, file_set, **kwargs):
+        print("Error:  Directory or file validation failure.")
+        return
 
-            if fgraph_ary:
-                find_rejects(GRAPH, fgraph_ary, **kwargs)
+    LOCK = system.FileLock(".".join([GRAPH.lock_prog, mode]))
 
-                process_valid_files(GRAPH, fgraph_ary, **kwargs)
+    if not LOCK.acquire(blocking=False):
+        print("WARNING:  Lock in place for {0}.".format(mode))
+        return
 
-                # Create JSON document.
-                process_fgraph_web(GRAPH, fgraph_ary, **kwargs)
+    try:
+        GRAPH.error_log_hdlr = open_log(GRAPH, **kwargs)
 
-            # 20160830 - Added fgraph_ary to argument list.
-            find_nonproc_files(GRAPH, fgraph_ary=fgraph_ary, **kwargs)
+        if mode == "relayout":
+            relayout(GRAPH, pattern=pattern, ext_list=ext_list, **kwargs)
 
-            process_reject_dict(GRAPH, **kwargs)
+        else:
+            backfill(GRAPH, source, pattern=pattern, ext_list=ext_list,
+                     **kwargs)
 
-            dir_cleanup(GRAPH, **kwargs)
+    finally:
+        LOCK.release()
 
-        else:
-            gen_libs.write_file2(GRAPH.error_log_hdlr,
-                                 "There are no valid file names to process.")
+        if GRAPH.error_log_hdlr and GRAPH.error_log_hdlr is not sys.stdout:
+            GRAPH.error_log_hdlr.close()
 
-    else:
-        gen_libs.write_file2(GRAPH.error_log_hdlr,
-                             "There are no files to process.")
+        GRAPH.error_log_hdlr = None
 
 
 def run_program(args_array, dir_set, file_set, prog_name, pattern, **kwargs):
@@ -1067,12 +5177,14 @@ def run_program(args_array, dir_set, file_set, prog_name, pattern, **kwargs):
     """Function:  run_program
 
     Description:  Loads the configuration for the program, sets up additional
-        variables for the program.  Initializes the parent Graph class
-        for processing of graph plot files, opens up the error log for
-        writing any errors and/or warning messages to.  Validates the
-        the existence and permissions for the directories and files
-        required to run the program and then calls the function to
-        start processing graph plot files.
+        variables for the program.  Exits if the configuration and command
+        directories are unchanged since the last run (unless forced).
+        Initializes the parent Graph class for processing of graph plot
+        files, opens up the error log for writing any errors and/or warning
+        messages to.  Validates the the existence and permissions for the
+        directories and files required to run the program, locks the
+        commands to be processed and then calls the function to start
+        processing graph plot files.
 
     Arguments:
         (input) args_array -> Array of command line options and values.
@@ -1085,39 +5197,95 @@ def run_program(args_array, dir_set, file_set, prog_name, pattern, **kwargs):
 
     """
 
-    try:
-        PROG_LOCK = gen_class.ProgramLock(sys.argv)
+    prog_cfg = load_config(args_array["-c"], args_array["-d"], **kwargs)
+    cfg_file = os.path.join(args_array["-d"], args_array["-c"] + ".py")
 
-        prog_cfg = gen_libs.load_module(args_array["-c"], args_array["-d"])
+    # Query the catalog instead of processing.
+    if "-q" in args_array:
 
-        pattern = pattern + "(" + "|".join(prog_cfg.file_ext) + ")"
-        ext_list = ["." + x for x in prog_cfg.file_ext]
+        if getattr(prog_cfg, "catalog_db", None):
+            query_catalog(prog_cfg.catalog_db, args_array["-q"], **kwargs)
 
-        GRAPH = system.Graph(prog_cfg=prog_cfg, prog_name=prog_name)
+        else:
+            print("Error:  catalog_db is not set in the configuration.")
 
-        if setup_validation(GRAPH, dir_set, file_set, **kwargs):
+        return
 
-            # Is there log already open.
-            if not GRAPH.error_log_hdlr:
+    # Backfill a source tree or relayout the web tree instead of processing
+    #   the commands.
+    if "-b" in args_array or "-L" in args_array:
+        run_backfill(prog_cfg, args_array, dir_set, file_set, prog_name,
+                     pattern, cfg_file=cfg_file, **kwargs)
+        return
 
-                GRAPH.error_log_hdlr = open(GRAPH.error_abs_log, "w")
+    state_file = os.path.join(prog_cfg.temp_dir,
+                              getattr(prog_cfg, "state_file",
+                                      "process_graphplots.state"))
 
-                process_files(GRAPH, pattern=pattern, ext_list=ext_list,
-                              **kwargs)
+    if "-s" in args_array:
+        cmd_list = [x for x in prog_cfg.validate_cmds
+                    if x in args_array["-s"].split(",")]
 
-            else:
-                print("Error:  File {0} already open."
-                      .format(GRAPH.error_abs_log))
+    else:
+        cmd_list = prog_cfg.validate_cmds
+
+    # No-op fast path:  Nothing has changed since the last run.
+    if "-f" not in args_array and "-n" not in args_array \
+       and is_unchanged(prog_cfg, cmd_list, state_file, cfg_file, **kwargs):
+
+        return
+
+    pattern = pattern + "(" + "|".join(prog_cfg.file_ext) + ")"
+    ext_list = ["." + x for x in prog_cfg.file_ext]
+
+    GRAPH = system.Graph(prog_cfg=prog_cfg, prog_name=prog_name)
+    GRAPH.dry_run = "-n" in args_array
+    GRAPH.state_file = state_file
+
+    # Restrict the run to the selected commands.
+    if "-s" in args_array:
+        select_cmds(GRAPH, args_array["-s"].split(","), **kwargs)
+
+    if GRAPH.validate_cmds and setup_validation(GRAPH, dir_set, file_set,
+                                                cfg_file=cfg_file,
+                                                **kwargs):
+
+        if lock_cmds(GRAPH, **kwargs):
+
+            try:
+                # Is there log already open.
+                if not GRAPH.error_log_hdlr:
+
+                    GRAPH.error_log_hdlr = open_log(GRAPH, **kwargs)
+
+                    if not GRAPH.dry_run:
+                        save_state(GRAPH, cfg_file, "running", **kwargs)
+
+                    process_files(GRAPH, pattern=pattern, ext_list=ext_list,
+                                  **kwargs)
+
+                    if not GRAPH.dry_run:
+                        save_state(GRAPH, cfg_file, "ok", **kwargs)
+
+                else:
+                    print("Error:  File {0} already open."
+                          .format(GRAPH.error_abs_log))
+
+            finally:
+                release_claims(GRAPH, **kwargs)
+                unlock_cmds(GRAPH, **kwargs)
 
         else:
-            print("Error:  Directory or file validation failure.")
+            print("WARNING:  Lock in place for all commands.")
 
-        # Close up log file and remove lock file.
+    elif GRAPH.validate_cmds:
+        print("Error:  Directory or file validation failure.")
+
+    # Close up log file.
+    if GRAPH.error_log_hdlr and GRAPH.error_log_hdlr is not sys.stdout:
         GRAPH.error_log_hdlr.close()
-        GRAPH.error_log_hdlr = None
 
-    except gen_class.SingleInstanceException:
-        print("WARNING:  Lock in place for: process_graphplots")
+    GRAPH.error_log_hdlr = None
 
 
 def main():
@@ -1152,6 +5320,8 @@ def main():
                "archive_dir": {"create": False, "write": True, "read": True},
                "rejected_dir": {"create": True, "write": True, "read": True},
                "gp_meta_dir": {"create": True, "write": True, "read": True},
+               "web_nonproc_dir": {"create": True, "write": True,
+                                   "read": True},
                "temp_dir": {"create": True, "write": True, "read": True},
                "json_dir": {"create": True, "write": True, "read": True}}
     file_set = {"tgtdeck": {"create": False, "write": False, "read": True},
@@ -1159,7 +5329,7 @@ def main():
                 "rejected_gps": {"create": True, "write": True, "read": True}}
     null_dir = ["metacard_dir", "image_dir"]
     opt_req_list = ["-c", "-d"]
-    opt_val_list = ["-c", "-d"]
+    opt_val_list = ["-c", "-d", "-s", "-q", "-b"]
     prog_name = "process_graphplots.py"
 
     # Regex search pattern for the file name.
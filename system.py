@@ -8,6 +8,14 @@
 
     Classes:
         FGraph
+        ActionPlan
+        FileLock
+        TokenBucket
+        StatCounter
+        OutcomeTable
+        RunLog
+        LazyImport
+        FrozenConfig
         System
             Graph
 
@@ -17,12 +25,17 @@
 
 # Standard
 import sys
-import smtplib
-import yum
+import fcntl
 import socket
 import os
 import datetime
 import re
+import threading
+import time
+import errno
+import gzip
+import shutil
+import stat
 
 # Local
 import gen_libs
@@ -49,13 +62,18 @@ class FGraph(object):
         add_to_loc -> Add file name and path as dictionary format to a list.
         del_from_loc -> Remove file name and path dictionary from list
         upd_to_loc -> Update file name and path in dictionary format in a list.
+        set_hash -> Set the content hash of the file.
         set_dirs -> Set the processing directory locations.
+        get_dirs -> Return the web directories from the country directory down.
         set_processed -> Set attribute to say the file has been processed.
         set_xml -> Set attribute to say that a XML file exists.
+        set_derivative -> Set the location of a derivative of the file.
+        set_image_info -> Set the image information of the file.
 
     """
 
-    def __init__(self, fname, cmd, tgtdeck, path):
+    def __init__(self, fname, cmd, tgtdeck, path, deck=None,
+                 reprocessed=False):
 
         """Method:  __init__
 
@@ -66,6 +84,10 @@ class FGraph(object):
             (input) cmd -> Name of command.
             (input) tgtdeck -> Full path and name of target deck file.
             (input) path -> File name's directory path.
+            (input) deck -> Dictionary of BE number:  target deck line, used
+                instead of searching the target deck file.
+            (input) reprocessed -> True|False - File is a parked file being
+                reprocessed, whose name already has the target name.
 
         """
 
@@ -88,7 +110,11 @@ class FGraph(object):
         self.f_restofname = "_".join(self.parsed_fname.split("_")[3:])
 
         # Target Name setup
-        self.f_line = gen_libs.file_search(self.tgtdeck, self.f_be)
+        if deck is not None:
+            self.f_line = deck.get(self.f_be)
+
+        else:
+            self.f_line = gen_libs.file_search(self.tgtdeck, self.f_be)
 
         if self.f_line:
             # Set the Target name from tgtDeck & remove any trailing newlines.
@@ -96,135 +122,1259 @@ class FGraph(object):
         else:
             self.tgt_name = "NOT_IN_TARGET_DECK"
 
-        # New file name.
-        self.new_fname = "_".join([self.f_date, self.f_time, self.f_be,
-                                   self.tgt_name, self.f_restofname])
+        # Reprocessed files already have the target name after the BE number.
+        if reprocessed and self.f_restofname.startswith(self.tgt_name + "_"):
+            self.f_restofname = self.f_restofname[len(self.tgt_name) + 1:]
+
+        # New file name.
+        self.new_fname = "_".join([self.f_date, self.f_time, self.f_be,
+                                   self.tgt_name, self.f_restofname])
+
+        # Replacement in file name.
+        #   Reason for RDRR change is unknown - from the original code.
+        self.new_fname = re.sub(r"_RDRR", "_RDR", self.new_fname, count=1)
+
+        # Set other attributes with the new file name.
+        self.xml_file = False
+        self.new_xml_fname = ".".join([self.new_fname, "xml"])
+        self.new_xml_dctm_fname = ".".join([self.new_fname, "IPL", "xml"])
+
+        # Initial file location list/dictionary attribute.
+        self.file_loc_ary = [{"File": fname, "Path": os.path.join(path, cmd)}]
+
+        # Parse dates.
+        self.f_year = self.f_date[0:4]
+        self.f_mon = self.f_date[4:6]
+
+        # Processed directory locations.
+        self.region = None
+        self.cc = None
+        self.cc_dir = None
+        self.gp_dir = None
+        self.yy_dir = None
+        self.mm_dir = None
+        self.leaf_dir = None
+
+        # Content hash and the original file if this file is a duplicate.
+        self.f_hash = None
+        self.dup_of = None
+
+        # Derivatives (i.e. thumbnail) of the file:  kind:  full path.
+        self.derivatives = {}
+
+        # Image information from the file header.
+        self.f_size = None
+        self.img_width = None
+        self.img_height = None
+        self.img_components = None
+        self.exif_datetime = None
+
+        # File has been processed
+        self.processed = False
+
+    def add_file_loc(self, fname, path, f_hash=None):
+
+        """Method:  add_to_loc
+
+        Description:  Add file name and path as dictionary format to a list.
+
+        Arguments:
+            (input) fname -> File name.
+            (input) path -> Path name
+            (input) f_hash -> Content hash of the file.
+
+        """
+
+        f_loc = {"File": fname, "Path": path}
+
+        if f_hash:
+            f_loc["Hash"] = f_hash
+
+        self.file_loc_ary.append(f_loc)
+
+    def del_from_loc(self, fname, path):
+
+        """Method:  del_from_loc
+
+        Description:  Remove file name and path dictionary from list.
+
+        Arguments:
+            (input) fname -> File name.
+            (input) path -> Path name.
+
+        """
+
+        for x in self.file_loc_ary[:]:
+
+            if x["File"] == fname and x["Path"] == path:
+                self.file_loc_ary.remove(x)
+
+    def upd_to_loc(self, fname, path, new_fname=None, new_path=None):
+
+        """Method:  upd_to_loc
+
+        Description:  Update file name and path in dictionary format in a list.
+
+        Arguments:
+            (input) fname -> File name.
+            (input) path -> Path name.
+            (input) new_fname -> New file name.
+            (input) new_path -> New path name.
+
+        """
+
+        for x in self.file_loc_ary[:]:
+
+            # Update only if both values match original arguments.
+            if x["File"] == fname and x["Path"] == path:
+
+                # If updating only one part of the dictionary, set the other
+                #   part to the original value.
+                if not new_fname:
+                    new_fname = fname
+
+                if not new_path:
+                    new_path = path
+
+                x.update({"File": new_fname, "Path": new_path})
+
+    def set_hash(self, f_hash):
+
+        """Method:  set_hash
+
+        Description:  Set the content hash of the file and add it to the
+            initial file location.
+
+        Arguments:
+            (input) f_hash -> Content hash of the file.
+
+        """
+
+        self.f_hash = f_hash
+        self.file_loc_ary[0]["Hash"] = f_hash
+
+    def set_dirs(self, cc, reg_dir, layout="month"):
+
+        """Method:  set_dirs
+
+        Description:  Set the processing directory locations.  The file is
+            placed in the leaf directory, which is the month directory or,
+            for the day and hash layouts, a sub-directory of it named for
+            the day of the month or for the hash bucket (00-ff) of the new
+            file name.
+
+        Arguments:
+            (input) cc -> Country name.
+            (input) reg_dir -> Region directory path.
+            (input) layout -> Web directory layout:  month, day or hash.
+
+        """
+
+        self.region = os.path.basename(reg_dir)
+        self.cc = cc
+        self.cc_dir = os.path.join(reg_dir, self.cc)
+        # Reason for 'Gp' directory is unknown - part of the original code.
+        self.gp_dir = os.path.join(self.cc_dir, "Gp")
+        self.yy_dir = os.path.join(self.gp_dir, self.f_year)
+        self.mm_dir = os.path.join(self.yy_dir, self.f_mon)
+
+        if layout == "day":
+            self.leaf_dir = os.path.join(self.mm_dir, self.f_date[6:8])
+
+        elif layout == "hash":
+            import hashlib
+
+            self.leaf_dir = os.path.join(
+                self.mm_dir,
+                hashlib.md5(self.new_fname.encode("utf-8")).hexdigest()[0:2])
+
+        else:
+            self.leaf_dir = self.mm_dir
+
+    def get_dirs(self):
+
+        """Method:  get_dirs
+
+        Description:  Return the web directories from the country directory
+            down to the leaf directory.
+
+        Arguments:
+            (output) List of directory paths.
+
+        """
+
+        d_list = [self.cc_dir, self.gp_dir, self.yy_dir, self.mm_dir]
+
+        if self.leaf_dir != self.mm_dir:
+            d_list.append(self.leaf_dir)
+
+        return d_list
+
+    def set_processed(self):
+
+        """Method:  set_processed
+
+        Description:  Set attribute to say the file has been processed.
+
+        Arguments:
+
+        """
+
+        self.processed = True
+
+    def set_xml(self):
+
+        """Method:  fetch_update_pkgs
+
+        Description:  Set attribute to say that a XML file exists.
+
+        Arguments:
+
+        """
+
+        self.xml_file = True
+
+    def set_derivative(self, kind, fname):
+
+        """Method:  set_derivative
+
+        Description:  Set the location of a derivative of the file and add it
+            to the file locations.
+
+        Arguments:
+            (input) kind -> Kind of derivative (i.e. thumb, preview).
+            (input) fname -> Full path and name of the derivative.
+
+        """
+
+        self.derivatives[kind] = fname
+        self.add_file_loc(os.path.basename(fname), os.path.dirname(fname))
+
+    def set_image_info(self, info):
+
+        """Method:  set_image_info
+
+        Description:  Set the image information of the file.
+
+        Arguments:
+            (input) info -> Dictionary of size, width, height, components and
+                datetime.
+
+        """
+
+        self.f_size = info.get("size")
+        self.img_width = info.get("width")
+        self.img_height = info.get("height")
+        self.img_components = info.get("components")
+        self.exif_datetime = info.get("datetime")
+
+
+class ActionPlan(object):
+
+    """Class:  ActionPlan
+
+    Description:  Class which is a representation of the filesystem actions
+        for a processing run.  Actions are recorded during the planning
+        stages and are then executed in batches of intake files, in the
+        processing order of the files, and within a batch in phase order,
+        grouped by destination device and directory.
+
+    Super-Class:  object
+
+    Sub-Classes:
+
+    Methods:
+        __init__ -> Class instance initilization.
+        add -> Add a filesystem action to the plan.
+        get_device -> Return the device id for a directory path.
+        schedule -> Set the processing order of the intake files.
+        ordered -> Return the actions in execution order.
+        estimate -> Return the estimated bytes and system calls of the plan.
+        take -> Return the actions in execution order and remove them.
+        clear -> Remove all actions from the plan.
+
+    """
+
+    # Execution phase for each action type.  Actions for a single file must
+    #   be planned in ascending phase order.
+    phases = {"mkdir": 0, "copy": 1, "chmod": 2, "chown": 2, "rename": 3,
+              "move": 4, "link": 5, "unlink": 6}
+
+    # Read/write buffer size for copies.
+    buf_size = 1048576
+
+    def __init__(self, batch_size=0):
+
+        """Method:  __init__
+
+        Description:  Initialization of an instance of the ActionPlan class.
+
+        Arguments:
+            (input) batch_size -> Number of intake files in an execution
+                batch.  Zero executes the actions of all files as one batch.
+
+        """
+
+        self.actions = []
+        self.mkdirs = set()
+        self.dev_cache = {}
+        self.renames = {}
+        self.order = {}
+        self.batch_size = batch_size
+
+    def add(self, op, src, dst, key=None, **kwargs):
+
+        """Method:  add
+
+        Description:  Add a filesystem action to the plan.  Directory creation
+            is only added once per directory and only if the directory does
+            not already exist.  The size of a file renamed by an earlier
+            action in the plan is taken from its name before the rename, as
+            the file does not exist under its new name until the plan is
+            executed.
+
+        Arguments:
+            (input) op -> Action type:
+                mkdir|copy|chmod|chown|rename|move|link|unlink.
+            (input) src -> Full path of source file, None for
+                mkdir/chmod/chown/unlink.
+            (input) dst -> Full path of destination file or directory.
+            (input) key -> Identifier of the intake file the action is for.
+            (input) **kwargs:
+                owner -> Numeric id for owner.
+                group -> Numeric id for group.
+                perm -> Octal permission setting.
+                hash -> Content hash to verify a copy against.
+                fallback -> File to copy from if a link fails.
+
+        """
+
+        if op == "mkdir":
+
+            if dst in self.mkdirs:
+                return
+
+            self.mkdirs.add(dst)
+
+            if os.path.isdir(dst):
+                return
+
+        action = {"op": op, "src": src, "dst": dst, "key": key,
+                  "phase": self.phases[op], "seq": len(self.actions),
+                  "bytes": 0}
+        action.update(kwargs)
+
+        if op == "copy" or \
+           (op == "move" and self.get_device(os.path.dirname(src)) !=
+                self.get_device(os.path.dirname(dst))):
+
+            action["bytes"] = os.stat(self.renames.get(src, src)).st_size
+
+        if op == "rename":
+            self.renames[dst] = self.renames.pop(src, src)
+
+        self.actions.append(action)
+
+    def get_device(self, path):
+
+        """Method:  get_device
+
+        Description:  Return the device id for a directory path.  If the
+            directory does not exist yet, the device of the nearest existing
+            parent directory is returned.
+
+        Arguments:
+            (input) path -> Directory path.
+            (output) Device id of the directory.
+
+        """
+
+        if path not in self.dev_cache:
+
+            try:
+                self.dev_cache[path] = os.stat(path).st_dev
+
+            except OSError:
+                parent = os.path.dirname(path)
+
+                if parent == path:
+                    self.dev_cache[path] = None
+
+                else:
+                    self.dev_cache[path] = self.get_device(parent)
+
+        return self.dev_cache[path]
+
+    def schedule(self, keys):
+
+        """Method:  schedule
+
+        Description:  Set the processing order of the intake files.  The
+            actions of the files are executed in batches in this order.
+
+        Arguments:
+            (input) keys -> List of intake file identifiers in processing
+                order.
+
+        """
+
+        self.order = dict([(x, cnt) for cnt, x in enumerate(keys)])
+
+    def ordered(self):
+
+        """Method:  ordered
+
+        Description:  Return the actions in execution order:  by the batch of
+            their intake file, then by phase, then by destination device and
+            directory and finally in the order they were planned.  Actions
+            not for an intake file, such as directory creation, are in the
+            first batch and actions of files not in the processing order are
+            in the last batch.  A link is executed in the batch placing the
+            file it links to, if that batch is later.
+
+        Arguments:
+            (output) List of actions in execution order.
+
+        """
+
+        batches = {None: -1}
+        placed = {}
+
+        for action in self.actions:
+
+            if action["key"] not in batches:
+                batches[action["key"]] = self.order.get(
+                    action["key"], len(self.order)) // (self.batch_size or
+                                                        len(self.order) + 1)
+
+            if action["op"] != "mkdir":
+                placed[action["dst"]] = action["key"]
+
+        for action in self.actions:
+
+            if action["op"] == "link" and action["src"] in placed:
+                batches[action["key"]] = max(
+                    batches[action["key"]],
+                    batches[placed[action["src"]]])
+
+        def sort_key(action):
+
+            if action["op"] == "mkdir":
+                d_name = action["dst"]
+
+            else:
+                d_name = os.path.dirname(action["dst"])
+
+            return (batches[action["key"]], action["phase"],
+                    self.get_device(d_name), d_name, action["seq"])
+
+        return sorted(self.actions, key=sort_key)
+
+    def estimate(self):
+
+        """Method:  estimate
+
+        Description:  Return the estimated bytes transferred and the estimated
+            number of system calls to execute the plan.
+
+        Arguments:
+            (output) t_bytes -> Estimated bytes transferred.
+            (output) t_calls -> Estimated number of system calls.
+            (output) op_cnt -> Dictionary of action type counts.
+
+        """
+
+        t_bytes = 0
+        t_calls = 0
+        op_cnt = {}
+
+        for action in self.actions:
+            op_cnt[action["op"]] = op_cnt.get(action["op"], 0) + 1
+            t_bytes += action["bytes"]
+
+            # Open and close for each side, fstat, the final read plus a read
+            #   and a write for each buffer.
+            copy_calls = 6 + 2 * ((action["bytes"] + self.buf_size - 1) //
+                                  self.buf_size)
+
+            if action["op"] == "mkdir":
+                # Stat, mkdir, open, fstat and close.
+                t_calls += 5
+
+            elif action["op"] == "copy":
+                t_calls += copy_calls
+
+            elif action["op"] == "move" and action["bytes"]:
+                # Cross device:  copy, utime, chmod and unlink.
+                t_calls += copy_calls + 3
+
+            elif action["op"] == "move":
+                # Stat and rename.
+                t_calls += 2
+
+            else:
+                t_calls += 1
+
+        return t_bytes, t_calls, op_cnt
+
+    def take(self):
+
+        """Method:  take
+
+        Description:  Return the actions in execution order and remove them
+            from the plan.  Directories already planned are remembered, so
+            they are not planned again.
+
+        Arguments:
+            (output) actions -> List of actions in execution order.
+
+        """
+
+        actions = self.ordered()
+        self.actions = []
+        self.renames = {}
+
+        return actions
+
+    def clear(self):
+
+        """Method:  clear
+
+        Description:  Remove all actions from the plan.
+
+        Arguments:
+
+        """
+
+        self.actions = []
+        self.mkdirs = set()
+        self.dev_cache = {}
+        self.renames = {}
+        self.order = {}
+
+
+class FileLock(object):
+
+    """Class:  FileLock
+
+    Description:  Class which is a representation of an advisory lock on a
+        file.  The lock uses fcntl record locking so it is honored across
+        servers sharing the file over NFS.  Can be used as a context manager.
+
+    Super-Class:  object
+
+    Sub-Classes:
+
+    Methods:
+        __init__ -> Class instance initilization.
+        acquire -> Open the file and lock it.
+        release -> Unlock and close the file.
+
+    """
+
+    def __init__(self, fname, shared=False, perm=None, owner=-1, group=-1):
+
+        """Method:  __init__
+
+        Description:  Initialization of an instance of the FileLock class.
+
+        Arguments:
+            (input) fname -> Full path and name of file to lock.
+            (input) shared -> True|False - Shared (read) lock.
+            (input) perm -> Octal permission setting of the lock file.
+            (input) owner -> Numeric id for owner.  -1 leaves id unchanged.
+            (input) group -> Numeric id for group.  -1 leaves id unchanged.
+
+        """
+
+        self.fname = fname
+        self.shared = shared
+        self.perm = perm
+        self.owner = owner
+        self.group = group
+        self.f_hdlr = None
+
+    def acquire(self, blocking=True):
+
+        """Method:  acquire
+
+        Description:  Open the file (creating it if required) and lock it.
+            The permissions, owner and group of the file are set if they do
+            not already match.
+
+        Arguments:
+            (input) blocking -> True|False - Wait for the lock.
+            (output) True|False -> Lock was acquired.
+
+        """
+
+        if self.shared:
+            op = fcntl.LOCK_SH
+
+        else:
+            op = fcntl.LOCK_EX
+
+        if not blocking:
+            op = op | fcntl.LOCK_NB
+
+        fd = os.open(self.fname, os.O_RDWR | os.O_CREAT | os.O_APPEND,
+                     self.perm or 0o666)
+
+        try:
+            st = os.fstat(fd)
+
+            if self.perm and stat.S_IMODE(st.st_mode) != self.perm:
+                os.fchmod(fd, self.perm)
+
+            if self.owner not in (-1, st.st_uid) \
+               or self.group not in (-1, st.st_gid):
+                os.fchown(fd, self.owner, self.group)
+
+        except EnvironmentError:
+            os.close(fd)
+            raise
+
+        self.f_hdlr = os.fdopen(fd, "a+")
+
+        try:
+            fcntl.lockf(self.f_hdlr, op)
+
+        except IOError:
+            self.f_hdlr.close()
+            self.f_hdlr = None
+
+            if blocking:
+                raise
+
+            return False
+
+        return True
+
+    def release(self):
+
+        """Method:  release
+
+        Description:  Flush, unlock and close the file.
+
+        Arguments:
+
+        """
+
+        if self.f_hdlr:
+            self.f_hdlr.flush()
+            fcntl.lockf(self.f_hdlr, fcntl.LOCK_UN)
+            self.f_hdlr.close()
+            self.f_hdlr = None
+
+    def __enter__(self):
+
+        """Method:  __enter__
+
+        Description:  Acquire the lock on entry to a with statement.
+
+        Arguments:
+            (output) self -> FileLock instance.
+
+        """
+
+        self.acquire()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        """Method:  __exit__
+
+        Description:  Release the lock on exit from a with statement.
+
+        Arguments:
+            (input) exc_type -> Exception type.
+            (input) exc_value -> Exception value.
+            (input) traceback -> Exception traceback.
+
+        """
+
+        self.release()
+
+
+class TokenBucket(object):
+
+    """Class:  TokenBucket
+
+    Description:  Class which is a representation of a token bucket rate
+        limiter, such as the bytes or operations per second to a
+        destination.  Tokens are added at the rate up to the burst size.
+        Taking more tokens than are available waits for them to be added,
+        so callers are paced to the rate.  Thread safe.
+
+    Super-Class:  object
+
+    Sub-Classes:
+
+    Methods:
+        __init__ -> Class instance initilization.
+        take -> Take tokens, waiting until they are available.
+
+    """
+
+    def __init__(self, rate, burst=None):
+
+        """Method:  __init__
+
+        Description:  Initialization of an instance of the TokenBucket class.
+
+        Arguments:
+            (input) rate -> Tokens added per second.
+            (input) burst -> Maximum tokens held.  Default is the rate.
+
+        """
+
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self.tokens = self.burst
+        self.stamp = time.time()
+        self.taken = 0
+        self.waited = 0.0
+        self.lock = threading.Lock()
+
+    def take(self, cnt=1):
+
+        """Method:  take
+
+        Description:  Take tokens from the bucket.  If there are not enough
+            tokens, the bucket goes into debt and the caller waits until the
+            debt would be repaid at the rate.
+
+        Arguments:
+            (input) cnt -> Number of tokens.
+            (output) wait -> Seconds waited.
+
+        """
+
+        with self.lock:
+            now = time.time()
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            self.tokens -= cnt
+            self.taken += cnt
+            wait = max(0.0, -self.tokens / self.rate)
+            self.waited += wait
+
+        if wait:
+            time.sleep(wait)
+
+        return wait
+
+
+class StatCounter(object):
+
+    """Class:  StatCounter
+
+    Description:  Class which is a representation of a set of named counters,
+        such as the number of system calls made by type.
+
+    Super-Class:  object
+
+    Sub-Classes:
+
+    Methods:
+        __init__ -> Class instance initilization.
+        add -> Add to a named counter.
+        report -> Return the counters as a single line.
+
+    """
 
-        # Replacement in file name.
-        #   Reason for RDRR change is unknown - from the original code.
-        self.new_fname = re.sub(r"_RDRR", "_RDR", self.new_fname, count=1)
+    def __init__(self, name):
 
-        # Set other attributes with the new file name.
-        self.xml_file = False
-        self.new_xml_fname = ".".join([self.new_fname, "xml"])
-        self.new_xml_dctm_fname = ".".join([self.new_fname, "IPL", "xml"])
+        """Method:  __init__
 
-        # Initial file location list/dictionary attribute.
-        self.file_loc_ary = [{"File": fname, "Path": os.path.join(path, cmd)}]
+        Description:  Initialization of an instance of the StatCounter class.
 
-        # Parse dates.
-        self.f_year = self.f_date[0:4]
-        self.f_mon = self.f_date[4:6]
+        Arguments:
+            (input) name -> Name of the set of counters.
 
-        # Processed directory locations.
-        self.cc = None
-        self.cc_dir = None
-        self.gp_dir = None
-        self.yy_dir = None
-        self.mm_dir = None
+        """
 
-        # File has been processed
-        self.processed = False
+        self.name = name
+        self.counts = {}
+        self.lock = threading.Lock()
 
-    def add_file_loc(self, fname, path):
+    def add(self, key, cnt=1):
 
-        """Method:  add_to_loc
+        """Method:  add
 
-        Description:  Add file name and path as dictionary format to a list.
+        Description:  Add to a named counter.
 
         Arguments:
-            (input) fname -> File name.
-            (input) path -> Path name
+            (input) key -> Name of counter.
+            (input) cnt -> Amount to add to the counter.
 
         """
 
-        self.file_loc_ary.append({"File": fname, "Path": path})
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + cnt
 
-    def del_from_loc(self, fname, path):
+    def report(self):
 
-        """Method:  del_from_loc
+        """Method:  report
 
-        Description:  Remove file name and path dictionary from list.
+        Description:  Return the counters as a single line.
+
+        Arguments:
+            (output) Line with the name and each counter as key=value.
+
+        """
+
+        return self.name + ":  " + ", ".join(
+            ["{0}={1}".format(x, self.counts[x]) for x in sorted(self.counts)])
+
+
+class OutcomeTable(object):
+
+    """Class:  OutcomeTable
+
+    Description:  Class which is a representation of the outcome of each
+        intake file of a run.  Each file moves through the states:
+
+        listed -> accepted|rejected
+        accepted -> not_in_deck|published|non_processed|rejected
+        not_in_deck -> published|non_processed|rejected
+        published -> non_processed (the placement of the file has failed)
+
+        The table also records when a file has been moved out of the
+        intake directory, so the files left behind are known without
+        listing the directory again.  Updates are thread safe.
+
+    Super-Class:  object
+
+    Sub-Classes:
+
+    Methods:
+        __init__ -> Class instance initilization.
+        add -> Add an intake file to the table.
+        set_state -> Move a file to a new state.
+        set_moved -> Record a file has left the intake directory.
+        entries -> Return the entries in the order they were added.
+
+    """
+
+    # Allowed state transitions.
+    transitions = {
+        "listed": ["accepted", "rejected"],
+        "accepted": ["not_in_deck", "published", "non_processed", "rejected"],
+        "not_in_deck": ["published", "non_processed", "rejected"],
+        "published": ["non_processed"],
+        "non_processed": [],
+        "rejected": []}
+
+    def __init__(self):
+
+        """Method:  __init__
+
+        Description:  Initialization of an instance of the OutcomeTable class.
+
+        Arguments:
+
+        """
+
+        self.files = {}
+        self.paths = {}
+        self.order = []
+        self.lock = threading.Lock()
+
+    def add(self, cmd, fname, path):
+
+        """Method:  add
+
+        Description:  Add an intake file to the table in the listed state.
 
         Arguments:
+            (input) cmd -> Name of command.
             (input) fname -> File name.
-            (input) path -> Path name.
+            (input) path -> Full path and name of the file.
 
         """
 
-        self.file_loc_ary.remove({"File": fname, "Path": path})
+        with self.lock:
 
-    def upd_to_loc(self, fname, path, new_fname=None, new_path=None):
+            if (cmd, fname) not in self.files:
+                self.files[(cmd, fname)] = {"cmd": cmd, "fname": fname,
+                                            "state": "listed", "reason": None,
+                                            "not_in_deck": False,
+                                            "moved": False}
+                self.paths[path] = (cmd, fname)
+                self.order.append((cmd, fname))
 
-        """Method:  upd_to_loc
+    def set_state(self, cmd, fname, state, reason=None, **kwargs):
 
-        Description:  Update file name and path in dictionary format in a list.
+        """Method:  set_state
+
+        Description:  Move a file to a new state.  Raises ValueError for a
+            transition which is not allowed.
 
         Arguments:
+            (input) cmd -> Name of command.
             (input) fname -> File name.
-            (input) path -> Path name.
-            (input) new_fname -> New file name.
-            (input) new_path -> New path name.
+            (input) state -> New state.
+            (input) reason -> Reason for the state, i.e. the reject reason.
+            (input) **kwargs:
+                Any other attributes to save for the file.
 
         """
 
-        for x in self.file_loc_ary[:]:
+        with self.lock:
+            entry = self.files[(cmd, fname)]
 
-            # Update only if both values match original arguments.
-            if x["File"] == fname and x["Path"] == path:
+            if state not in self.transitions[entry["state"]]:
+                raise ValueError(
+                    "Invalid outcome for {0}/{1}: {2} -> {3}".format(
+                        cmd, fname, entry["state"], state))
 
-                # If updating only one part of the dictionary, set the other
-                #   part to the original value.
-                if not new_fname:
-                    new_fname = fname
+            entry["state"] = state
+            entry["reason"] = reason
+            entry.update(kwargs)
 
-                if not new_path:
-                    new_path = path
+            if state == "not_in_deck":
+                entry["not_in_deck"] = True
 
-                x.update({"File": new_fname, "Path": new_path})
+    def set_moved(self, path):
 
-    def set_dirs(self, cc, reg_dir):
+        """Method:  set_moved
 
-        """Method:  set_dirs
+        Description:  Record a file has left the intake directory.  Paths
+            which are not intake files are ignored.
+
+        Arguments:
+            (input) path -> Full path and name of the file.
+
+        """
+
+        with self.lock:
+
+            if path in self.paths:
+                self.files[self.paths[path]]["moved"] = True
 
-        Description:  Set the processing directory locations.
+    def entries(self):
+
+        """Method:  entries
+
+        Description:  Return the entries in the order they were added.
 
         Arguments:
-            (input) cc -> Country name.
-            (input) reg_dir -> Region directory path.
+            (output) List of entry dictionaries.
 
         """
 
-        self.cc = cc
-        self.cc_dir = os.path.join(reg_dir, self.cc)
-        # Reason for 'Gp' directory is unknown - part of the original code.
-        self.gp_dir = os.path.join(self.cc_dir, "Gp")
-        self.yy_dir = os.path.join(self.gp_dir, self.f_year)
-        self.mm_dir = os.path.join(self.yy_dir, self.f_mon)
+        with self.lock:
+            return [self.files[x] for x in self.order]
 
-    def set_processed(self):
 
-        """Method:  set_processed
+class RunLog(object):
 
-        Description:  Set attribute to say the file has been processed.
+    """Class:  RunLog
+
+    Description:  Class which is a representation of a consolidated log
+        shared by all runs.  The log is a file-like object which is only
+        opened on the first write.  Each line is prefixed with the time and
+        the run id and is appended to the log with a single write, so
+        concurrent runs do not interleave within a line.  On open, the log
+        is rotated by size and time period, the rotated segments no longer
+        written to are compressed and the oldest segments are removed.  A
+        run holds a shared lock on the log while it has it open.
+
+    Super-Class:  object
+
+    Sub-Classes:
+
+    Methods:
+        __init__ -> Class instance initilization.
+        open -> Rotate the log and open it for appending.
+        rotate -> Rotate, compress and remove the log segments.
+        write -> Write data to the log, prefixing each line.
+        flush -> Flush the log.
+        close -> Write any partial line and close the log.
+
+    """
+
+    # Time stamp formats of the rotation periods.
+    periods = {"hourly": "%Y%m%d%H", "daily": "%Y%m%d", "monthly": "%Y%m"}
+
+    def __init__(self, fname, run_id, max_size=10485760, period="daily",
+                 keep=30):
+
+        """Method:  __init__
+
+        Description:  Initialization of an instance of the RunLog class.
 
         Arguments:
+            (input) fname -> Full path and name of the log.
+            (input) run_id -> Run id prefixed to each line.
+            (input) max_size -> Size in bytes at which the log is rotated.
+            (input) period -> Rotation period:  hourly|daily|monthly|None.
+            (input) keep -> Number of rotated segments kept or None for all.
 
         """
 
-        self.processed = True
+        self.fname = fname
+        self.run_id = run_id
+        self.max_size = max_size
+        self.period = period
+        self.keep = keep
+        self.fd = None
+        self.buf = ""
+        self.lock = threading.Lock()
 
-    def set_xml(self):
+    def open(self):
 
-        """Method:  fetch_update_pkgs
+        """Method:  open
 
-        Description:  Set attribute to say that a XML file exists.
+        Description:  Rotate the log under a lock and open it for appending.
+            A shared lock is held on the log until it is closed, so it is
+            not compressed while this run may still write to it.
 
         Arguments:
 
         """
 
-        self.xml_file = True
+        with FileLock(self.fname + ".lock"):
+            self.rotate()
+            self.fd = os.open(self.fname,
+                              os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+            fcntl.lockf(self.fd, fcntl.LOCK_SH)
+
+    def rotate(self):
+
+        """Method:  rotate
+
+        Description:  Rename the log to a segment named after its last
+            modified time when it has reached the maximum size or was last
+            modified in an earlier period.  Rotated segments are then
+            compressed, except for those a run started before the rotation
+            still has open, which are locked by the run.  The oldest segments
+            beyond the number kept are removed.
+
+        Arguments:
+
+        """
+
+        d_name, base = os.path.split(self.fname)
+        fmt = self.periods.get(self.period)
+
+        try:
+            st = os.stat(self.fname)
+            mtime = datetime.datetime.fromtimestamp(st.st_mtime)
+
+            if st.st_size >= self.max_size or \
+               (fmt and mtime.strftime(fmt) !=
+                    datetime.datetime.now().strftime(fmt)):
+
+                seg = ".".join([self.fname, mtime.strftime("%Y%m%d_%H%M%S")])
+
+                while os.path.exists(seg) or os.path.exists(seg + ".gz"):
+                    seg = seg + "_"
+
+                os.rename(self.fname, seg)
+
+        except OSError:
+            pass
+
+        segs = sorted([x for x in os.listdir(d_name or ".")
+                       if re.match(re.escape(base) + r"\.\d{8}_\d{6}", x)])
+
+        for seg in [x for x in segs if not x.endswith(".gz")]:
+            seg = os.path.join(d_name, seg)
+            f_in = open(seg, "r+b")
+
+            try:
+                try:
+                    fcntl.lockf(f_in, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+                except EnvironmentError as err:
+
+                    # Still open by a run.
+                    if err.errno in [errno.EACCES, errno.EAGAIN]:
+                        continue
+
+                    raise
+
+                f_out = gzip.open(seg + ".gz", "wb")
+
+                try:
+                    shutil.copyfileobj(f_in, f_out)
+
+                finally:
+                    f_out.close()
+
+                os.remove(seg)
+
+            finally:
+                f_in.close()
+
+        if self.keep:
+            segs = sorted([x for x in os.listdir(d_name or ".")
+                           if re.match(re.escape(base) + r"\.\d{8}_\d{6}", x)])
+
+            for seg in segs[:-self.keep]:
+                os.remove(os.path.join(d_name, seg))
+
+    def write(self, data):
+
+        """Method:  write
+
+        Description:  Write data to the log, opening it on first use.  Each
+            complete line is prefixed with the time and the run id and any
+            partial line is held until it is completed.  Thread safe.
+
+        Arguments:
+            (input) data -> Data to be written.
+
+        """
+
+        with self.lock:
+            lines = (self.buf + data).split("\n")
+            self.buf = lines.pop()
+
+            if lines:
+
+                if self.fd is None:
+                    self.open()
+
+                prefix = " ".join([datetime.datetime.now().strftime(
+                    "%Y-%m-%d %H:%M:%S"), self.run_id, ""])
+                data = "".join([prefix + x + "\n" for x in lines])
+
+                if not isinstance(data, bytes):
+                    data = data.encode("utf-8")
+
+                while data:
+                    data = data[os.write(self.fd, data):]
+
+    def flush(self):
+
+        """Method:  flush
+
+        Description:  Flush the log.  Complete lines are written as they are
+            received, so there is nothing to flush.
+
+        Arguments:
+
+        """
+
+        pass
+
+    def close(self):
+
+        """Method:  close
+
+        Description:  Write any partial line and close the log.
+
+        Arguments:
+
+        """
+
+        if self.buf:
+            self.write("\n")
+
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class LazyImport(object):
+
+    """Class:  LazyImport
+
+    Description:  Class which is a proxy for a module which is only imported
+        when one of its attributes is first used.
+
+    Super-Class:  object
+
+    Sub-Classes:
+
+    Methods:
+        __init__ -> Class instance initilization.
+        __getattr__ -> Import the module and return one of its attributes.
+
+    """
+
+    def __init__(self, name):
+
+        """Method:  __init__
+
+        Description:  Initialization of an instance of the LazyImport class.
+
+        Arguments:
+            (input) name -> Full name of the module.
+
+        """
+
+        self.name = name
+        self.module = None
+
+    def __getattr__(self, attr):
+
+        """Method:  __getattr__
+
+        Description:  Import the module on first use and return one of its
+            attributes.
+
+        Arguments:
+            (input) attr -> Attribute name.
+            (output) Attribute of the module.
+
+        """
+
+        if self.module is None:
+            __import__(self.name)
+            self.module = sys.modules[self.name]
+
+        return getattr(self.module, attr)
+
+
+class FrozenConfig(object):
+
+    """Class:  FrozenConfig
+
+    Description:  Class which is a read-only representation of the settings
+        of a configuration module.
+
+    Super-Class:  object
+
+    Sub-Classes:
+
+    Methods:
+        __init__ -> Class instance initilization.
+        __setattr__ -> Refuse to change a setting.
+
+    """
+
+    def __init__(self, settings):
+
+        """Method:  __init__
+
+        Description:  Initialization of an instance of the FrozenConfig class.
+
+        Arguments:
+            (input) settings -> Dictionary of setting names and values.
+
+        """
+
+        self.__dict__.update(settings)
+
+    def __setattr__(self, name, value):
+
+        """Method:  __setattr__
+
+        Description:  Refuse to change a setting.
+
+        Arguments:
+            (input) name -> Setting name.
+            (input) value -> Setting value.
+
+        """
+
+        raise AttributeError("Configuration setting is read-only: " + name)
 
 
 class System(object):
@@ -380,6 +1530,18 @@ class Graph(System):
         self.error_abs_log = os.path.join(self.error_dir, self.error_file)
         self.error_log_hdlr = None
 
+        # Consolidated log shared by all runs instead of a log per run.
+        self.log_mode = getattr(prog_cfg, "log_mode", "run")
+        self.log_max_size = getattr(prog_cfg, "log_max_size", 10485760)
+        self.log_rotate = getattr(prog_cfg, "log_rotate", "daily")
+        self.log_keep = getattr(prog_cfg, "log_keep", 30)
+
+        if self.log_mode == "consolidated":
+            self.error_file = getattr(prog_cfg, "log_file",
+                                      "process_graphplots.log")
+            self.error_abs_log = os.path.join(self.error_dir,
+                                              self.error_file)
+
         # Derived directories.
         self.benum_dir = os.path.join(self.list_dir, self.be_folder)
         self.rejected_dir = os.path.join(self.archive_dir,
@@ -402,17 +1564,135 @@ class Graph(System):
         self.gp_rejects = []
         self.reject_dict = {}
 
+        # Valid name, but non-processed files and files left in the input
+        #   directories.
+        self.gp_nonproc = []
+        self.gp_left = {}
+
+        # Multiple node processing with per-file claim leases.
+        self.multi_node = getattr(prog_cfg, "multi_node", False)
+        self.claim_dir = getattr(prog_cfg, "claim_dir", None) or \
+            os.path.join(self.gp_dir, ".claims")
+        self.lease_time = getattr(prog_cfg, "lease_time", 3600)
+        self.worker_id = ".".join([self.host_name, str(self.pid)])
+        self.claims = []
+        self.claims_renewed = time.time()
+
+        # Scheduling of files across commands.
+        self.cmd_weights = getattr(prog_cfg, "cmd_weights", None) or {}
+        self.dtg_order = getattr(prog_cfg, "dtg_order", None)
+        self.queue_wait = {}
+        self.queue_start = time.time()
+
+        # State file for the no-op fast path.
+        self.state_file = None
+
+        # Backfill of a source tree.
+        self.backfill_workers = getattr(prog_cfg, "backfill_workers", 8)
+        self.backfill_batch = getattr(prog_cfg, "backfill_batch", 5000)
+
+        # Thumbnails and previews of the placed files.
+        self.derivatives = getattr(prog_cfg, "derivatives", False)
+        self.thumb_size = getattr(prog_cfg, "thumb_size", 200)
+        self.preview_size = getattr(prog_cfg, "preview_size", 1024)
+        self.derivative_workers = getattr(prog_cfg, "derivative_workers",
+                                          None)
+
+        # Pipeline mode.
+        self.pipeline = getattr(prog_cfg, "pipeline", False)
+        self.pipeline_queue = getattr(prog_cfg, "pipeline_queue", 100)
+
+        # Files deferred as still being written.
+        self.quiet_window = getattr(prog_cfg, "quiet_window", 0)
+        self.deferred = {}
+
+        # Archive bundles for rejected and non-processed files.
+        self.bundle_archive = getattr(prog_cfg, "bundle_archive", False)
+        self.bundle_period = getattr(prog_cfg, "bundle_period", "daily")
+        self.nonproc_bundle_days = getattr(prog_cfg, "nonproc_bundle_days", 7)
+
+        # Manifests in the web directories.
+        self.web_manifest = getattr(prog_cfg, "web_manifest", False)
+        self.manifest_name = getattr(prog_cfg, "manifest_name", "index.json")
+
+        # Catalog of processed and rejected files.
+        self.catalog_db = getattr(prog_cfg, "catalog_db", None)
+        self.catalog_rows = []
+        self.run_id = ".".join([self.host_name, str(self.pid), self.dtg])
+        self.catalog_conn = None
+
+        # Structure validation of JPEG files.
+        self.validate_jpeg = getattr(prog_cfg, "validate_jpeg", True)
+
+        # Duplicate detection by content hash.
+        self.dup_policy = getattr(prog_cfg, "dup_policy", None)
+        self.hash_index = {}
+        self.hash_rows = []
+
+        # Bandwidth and IOPS limits of the copies and moves to each
+        #   destination:  image_dir, metacard_dir, web and archive.
+        self.io_limits = getattr(prog_cfg, "io_limits", None) or {}
+        self.throttles = {}
+
+        for dest in self.io_limits:
+            self.throttles[dest] = {}
+
+            for unit in ["bytes", "ops"]:
+
+                if self.io_limits[dest].get(unit):
+                    self.throttles[dest][unit] = TokenBucket(
+                        self.io_limits[dest][unit])
+
+        # Retries of filesystem actions failing with a transient error and
+        #   the intake files with an action which has failed permanently.
+        self.retry_max = getattr(prog_cfg, "retry_max", 4)
+        self.retry_delay = getattr(prog_cfg, "retry_delay", 0.5)
+        self.retry_stats = StatCounter("Retries")
+        self.failed = {}
+
+        # Publication mode:  direct, atomic (temporary file and rename) or
+        #   durable (atomic and a sync of the file systems after each batch)
+        #   and the directories, and files in them, written since the sync.
+        self.publish_mode = getattr(prog_cfg, "publish_mode", "direct")
+        self.touched = {}
+
+        # Layout of the month directories of the web tree:  month, day (a
+        #   sub-directory for each day) or hash (256 hash buckets).
+        self.web_layout = getattr(prog_cfg, "web_layout", "month")
+
+        # System calls made executing the filesystem actions.
+        self.sys_calls = StatCounter("System calls")
+
         # JSON Document
-        self.json_name = ".".join(["gp_doc", str(self.pid), self.dtg, "json"])
+        #   Host name is included so names are unique across nodes.
+        if self.multi_node:
+            self.json_name = ".".join(["gp_doc", self.host_name,
+                                       str(self.pid), self.dtg, "json"])
+
+        else:
+            self.json_name = ".".join(["gp_doc", str(self.pid), self.dtg,
+                                       "json"])
+
         self.json_doc = os.path.join(self.json_dir, self.json_name)
 
         # File lists attributes.
         # Raw (full) list of files.
         self.all_file_dict = {}
+        # Parked files moved back for reprocessing, as command/file name.
+        self.reprocessed = set()
+
+        # Outcome of each file.
+        self.outcomes = OutcomeTable()
         # Filtered list of files on extensions.
         self.file_dict = {}
         # Filtered list of files on valid file names.
         self.filtered_file_dict = {}
 
         # Program lock file.
+        #   Base name of the per command lock files.
         self.lock_prog = os.path.join(self.temp_dir, self.lock_file)
+        self.cmd_locks = []
+
+        # Filesystem action plan and dry run setting.
+        self.plan = ActionPlan(getattr(prog_cfg, "schedule_batch", 50))
+        self.dry_run = False
@@ -0,0 +1,222 @@
+#!/usr/bin/python
+# Classification (U)
+
+"""Program:  startup.py
+
+    Description:  Benchmark of the startup time of process_graphplots.py for
+        a run with nothing to do.  A scratch configuration with empty
+        command directories is created in a temporary directory and one full
+        run is made to save the state file.  Each timed run is then made in
+        a new interpreter, which times the import of the program and main()
+        taking the no-op fast path.  The runs are timed with the cached
+        configuration and with the configuration cache removed before each
+        run.  The lib modules must be importable, as for a normal run.
+
+    Usage:
+        test/benchmark/startup.py [runs]
+
+    Arguments:
+        runs -> Number of timed runs of each case.  Default is 20.
+
+"""
+
+# Libraries and Global Variables
+
+# Standard
+import sys
+import os
+import shutil
+import tempfile
+import subprocess
+
+# Local
+sys.path.append(os.getcwd())
+import version
+
+__version__ = version.__version__
+
+CFG_NAME = "graphplots"
+
+# Settings of the scratch configuration, formatted with the base directory.
+CFG = """validate_cmds = ["CMDA", "CMDB"]
+process_cmds = ["EUR"]
+error_dir = "{0}/err"
+temp_dir = "{0}/tmp"
+list_dir = "{0}/list"
+graphbase_dir = "{0}/web"
+gp_dir = "{0}/drop"
+archive_dir = "{0}/arch"
+json_dir = "{0}/json"
+be_folder = "gp"
+rejected_folder = "GP_rejected"
+gp_meta_folder = "GP_metacards"
+web_nonproc_folder = "GP_non_processed"
+tgtdeck_file = "tgtDeck"
+mail_notdeck_file = "gpnotindeck-mailed"
+gp_reject_file = "rejected_graphplots"
+lock_file = "process_graphplots.lock"
+metacard_dir = None
+image_dir = None
+emailfrom = "gp@localhost"
+emailtowarn = "gp@localhost"
+emailtotgt = "gp@localhost"
+img_id = {1}
+img_grp = {2}
+web_id = {1}
+web_grp = {2}
+f_perm = 0o664
+d_perm = 0o775
+file_ext = ["jpg", "JPG"]
+"""
+
+# Run in a new interpreter:  time the import of the program and main().
+DRIVER = """
+import sys
+import time
+start = time.time()
+sys.path.insert(0, {0!r})
+sys.argv = ["process_graphplots.py", "-c", {1!r}, "-d", {2!r}]
+import process_graphplots
+try:
+    process_graphplots.main()
+except SystemExit:
+    pass
+sys.stdout.write("\\nELAPSED {{0:.6f}}\\n".format(time.time() - start))
+"""
+
+
+def create_env(base_dir):
+
+    """Function:  create_env
+
+    Description:  Creates the scratch configuration, list files and empty
+        command directories.  The modify times are set in the past, so the
+        fast path is not skipped for a directory modified in the same tick
+        as the listing.
+
+    Arguments:
+        (input) base_dir -> Base directory of the scratch environment.
+        (output) cfg_dir -> Directory of the configuration file.
+
+    """
+
+    cfg_dir = os.path.join(base_dir, "config")
+
+    for d_name in ["config", "err", "tmp", "list/gp", "web", "drop/CMDA",
+                   "drop/CMDB", "arch", "json"]:
+        os.makedirs(os.path.join(base_dir, d_name))
+
+    files = {
+        "config/" + CFG_NAME + ".py": CFG.format(base_dir, os.getuid(),
+                                                 os.getgid()),
+        "list/gp/tgtDeck": "1234E56789\tTARGETONE\n",
+        "list/gp/gpnotindeck-mailed": "",
+        "list/gp/rejected_graphplots": "",
+        "list/EUR-country_list": "FR\n",
+        "list/gp/FR_benums": "1234E56789\n"}
+
+    for fname in files:
+        with open(os.path.join(base_dir, fname), "w") as f_hdlr:
+            f_hdlr.write(files[fname])
+
+    for root, dirs, f_list in os.walk(base_dir):
+        for name in dirs + f_list:
+            os.utime(os.path.join(root, name), (1e9, 1e9))
+
+    return cfg_dir
+
+
+def time_run(cfg_dir):
+
+    """Function:  time_run
+
+    Description:  Runs the program in a new interpreter and returns the time
+        of the import and main().  Bytecode writing is enabled, so the
+        compile of the program is not timed after the first run.
+
+    Arguments:
+        (input) cfg_dir -> Directory of the configuration file.
+        (output) Seconds of the import and main().
+
+    """
+
+    # Use the bytecode cache, as an installed program would.
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+
+    proc = subprocess.Popen(
+        [sys.executable, "-c", DRIVER.format(os.getcwd(), CFG_NAME,
+                                             cfg_dir)],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    out, err = proc.communicate()
+    lines = [x for x in out.decode("utf-8").splitlines()
+             if x.startswith("ELAPSED ")]
+
+    if not lines:
+        sys.exit("Error:  Run failed:\n" + err.decode("utf-8"))
+
+    return float(lines[-1].split()[1])
+
+
+def report(name, times):
+
+    """Function:  report
+
+    Description:  Prints the minimum, median and maximum time of a case.
+
+    Arguments:
+        (input) name -> Name of the case.
+        (input) times -> List of the run times in seconds.
+
+    """
+
+    times = sorted(times)
+
+    print("{0:<16} min {1:7.1f} ms  median {2:7.1f} ms  max {3:7.1f} ms"
+          .format(name, times[0] * 1000, times[len(times) // 2] * 1000,
+                  times[-1] * 1000))
+
+
+def main():
+
+    """Function:  main
+
+    Description:  Creates the scratch environment, saves the state with a
+        full run and times the runs of each case.
+
+    Arguments:
+        (input) argv -> Arguments from the command line.
+
+    """
+
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    base_dir = tempfile.mkdtemp()
+
+    try:
+        cfg_dir = create_env(base_dir)
+        cache_file = os.path.join(cfg_dir, "." + CFG_NAME + ".cache")
+
+        # Full run to save the state file and the configuration cache.
+        time_run(cfg_dir)
+
+        cached = [time_run(cfg_dir) for _ in range(runs)]
+        uncached = []
+
+        for _ in range(runs):
+            if os.path.exists(cache_file):
+                os.remove(cache_file)
+
+            uncached.append(time_run(cfg_dir))
+
+        print("Python {0}.{1}.{2}, {3} runs".format(
+            sys.version_info[0], sys.version_info[1], sys.version_info[2],
+            runs))
+        report("Cached config", cached)
+        report("Uncached config", uncached)
+
+    finally:
+        shutil.rmtree(base_dir)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
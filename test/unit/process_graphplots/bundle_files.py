@@ -0,0 +1,164 @@
+#!/usr/bin/python
+# Classification (U)
+
+"""Program:  bundle_files.py
+
+    Description:  Unit testing of bundle_files in process_graphplots.py.
+
+    Usage:
+        test/unit/process_graphplots/bundle_files.py
+
+    Arguments:
+
+"""
+
+# Libraries and Global Variables
+
+# Standard
+import sys
+import os
+import shutil
+import tempfile
+
+if sys.version_info < (2, 7):
+    import unittest2 as unittest
+else:
+    import unittest
+
+# Local
+sys.path.append(os.getcwd())
+import process_graphplots
+import version
+
+__version__ = version.__version__
+
+
+class Graph(object):
+
+    """Class:  Graph
+
+    Description:  Class stub holder for the Graph class.
+
+    Methods:
+        __init__
+
+    """
+
+    def __init__(self):
+
+        """Method:  __init__
+
+        Description:  Class initialization.
+
+        Arguments:
+
+        """
+
+        self.bundle_period = "daily"
+        self.pid = os.getpid()
+
+
+class UnitTest(unittest.TestCase):
+
+    """Class:  UnitTest
+
+    Description:  Class which is a representation of a unit testing.
+
+    Methods:
+        setUp -> Initialize testing environment.
+        test_bundle -> Test files are bundled and removed.
+        test_bundled_already -> Test files bundled by another worker.
+        test_disappeared -> Test a file which has disappeared is skipped.
+        tearDown -> Clean up of testing environment.
+
+    """
+
+    def setUp(self):
+
+        """Function:  setUp
+
+        Description:  Initialization for unit testing.
+
+        Arguments:
+
+        """
+
+        self.base_dir = tempfile.mkdtemp()
+        self.graph = Graph()
+        self.f_list = ["a.jpg", "b.jpg"]
+
+        for fname in self.f_list:
+            with open(os.path.join(self.base_dir, fname), "wb") as f_hdlr:
+                f_hdlr.write(b"\xff" * 100)
+
+    def test_bundle(self):
+
+        """Function:  test_bundle
+
+        Description:  Test files are bundled and removed.
+
+        Arguments:
+
+        """
+
+        bundle, f_list = process_graphplots.bundle_files(
+            self.graph, self.base_dir, 0)
+
+        self.assertEqual(sorted(f_list), self.f_list)
+        self.assertTrue(os.path.isfile(bundle))
+        self.assertEqual(
+            sorted(process_graphplots.load_state(bundle + ".idx")),
+            self.f_list)
+        self.assertFalse(os.path.exists(os.path.join(self.base_dir,
+                                                     "a.jpg")))
+
+    def test_bundled_already(self):
+
+        """Function:  test_bundled_already
+
+        Description:  Test a second worker does not bundle the files already
+            bundled by the first.
+
+        Arguments:
+
+        """
+
+        process_graphplots.bundle_files(self.graph, self.base_dir, 0)
+        bundle, f_list = process_graphplots.bundle_files(
+            self.graph, self.base_dir, 0)
+
+        self.assertEqual(f_list, [])
+
+    def test_disappeared(self):
+
+        """Function:  test_disappeared
+
+        Description:  Test a file which has disappeared is skipped.
+
+        Arguments:
+
+        """
+
+        os.symlink(os.path.join(self.base_dir, "gone.jpg"),
+                   os.path.join(self.base_dir, "c.jpg"))
+
+        bundle, f_list = process_graphplots.bundle_files(
+            self.graph, self.base_dir, 0)
+
+        self.assertEqual(sorted(f_list), self.f_list)
+
+    def tearDown(self):
+
+        """Function:  tearDown
+
+        Description:  Clean up of unit testing.
+
+        Arguments:
+
+        """
+
+        shutil.rmtree(self.base_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,185 @@
+#!/usr/bin/python
+# Classification (U)
+
+"""Program:  claim_lease.py
+
+    Description:  Unit testing of claim_lease in process_graphplots.py.
+
+    Usage:
+        test/unit/process_graphplots/claim_lease.py
+
+    Arguments:
+
+"""
+
+# Libraries and Global Variables
+
+# Standard
+import sys
+import os
+import time
+import shutil
+import tempfile
+
+if sys.version_info < (2, 7):
+    import unittest2 as unittest
+else:
+    import unittest
+
+# Local
+sys.path.append(os.getcwd())
+import process_graphplots
+import version
+
+__version__ = version.__version__
+
+
+class Graph(object):
+
+    """Class:  Graph
+
+    Description:  Class stub holder for the Graph class.
+
+    Methods:
+        __init__
+
+    """
+
+    def __init__(self, claim_dir, worker_id):
+
+        """Method:  __init__
+
+        Description:  Class initialization.
+
+        Arguments:
+            (input) claim_dir -> Directory for the claim leases.
+            (input) worker_id -> Worker identifier.
+
+        """
+
+        self.claim_dir = claim_dir
+        self.worker_id = worker_id
+        self.lease_time = 3600
+        self.claims = []
+
+
+class UnitTest(unittest.TestCase):
+
+    """Class:  UnitTest
+
+    Description:  Class which is a representation of a unit testing.
+
+    Methods:
+        setUp -> Initialize testing environment.
+        test_claim -> Test claim of an unclaimed file.
+        test_active_lease -> Test claim of a file with an active lease.
+        test_stale_lease -> Test claim of a file with a stale lease.
+        test_stale_lease_race -> Test stale lease broken by another worker.
+        tearDown -> Clean up of testing environment.
+
+    """
+
+    def setUp(self):
+
+        """Function:  setUp
+
+        Description:  Initialization for unit testing.
+
+        Arguments:
+
+        """
+
+        self.base_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.base_dir, "CMDA"))
+        self.graph_a = Graph(self.base_dir, "host1.100")
+        self.graph_b = Graph(self.base_dir, "host2.200")
+        self.key = "20190304_0506Z_1234E56789_ABC_FR_AB.jpg"
+        self.lease = os.path.join(self.base_dir, "CMDA", self.key + ".lease")
+
+    def test_claim(self):
+
+        """Function:  test_claim
+
+        Description:  Test claim of an unclaimed file writes the worker to
+            the lease.
+
+        Arguments:
+
+        """
+
+        self.assertTrue(process_graphplots.claim_lease(self.graph_a, "CMDA",
+                                                       self.key))
+
+        with open(self.lease) as f_hdlr:
+            self.assertEqual(f_hdlr.read(), "host1.100\n")
+
+        self.assertEqual(self.graph_a.claims, [self.lease])
+
+    def test_active_lease(self):
+
+        """Function:  test_active_lease
+
+        Description:  Test claim of a file with an active lease.
+
+        Arguments:
+
+        """
+
+        process_graphplots.claim_lease(self.graph_a, "CMDA", self.key)
+
+        self.assertFalse(process_graphplots.claim_lease(self.graph_b, "CMDA",
+                                                        self.key))
+
+    def test_stale_lease(self):
+
+        """Function:  test_stale_lease
+
+        Description:  Test claim of a file with a stale lease.
+
+        Arguments:
+
+        """
+
+        process_graphplots.claim_lease(self.graph_a, "CMDA", self.key)
+        old = time.time() - 7200
+        os.utime(self.lease, (old, old))
+
+        self.assertTrue(process_graphplots.claim_lease(self.graph_b, "CMDA",
+                                                       self.key))
+
+    def test_stale_lease_race(self):
+
+        """Function:  test_stale_lease_race
+
+        Description:  Test a worker which found a stale lease does not break
+            the lease of another worker which broke and claimed it first.
+
+        Arguments:
+
+        """
+
+        process_graphplots.claim_lease(self.graph_a, "CMDA", self.key)
+        old = time.time() - 7200
+        os.utime(self.lease, (old, old))
+        self.assertTrue(process_graphplots.claim_lease(self.graph_b, "CMDA",
+                                                       self.key))
+
+        self.assertFalse(process_graphplots.break_lease(self.graph_a, "CMDA",
+                                                        self.lease))
+        self.assertTrue(os.path.exists(self.lease))
+
+    def tearDown(self):
+
+        """Function:  tearDown
+
+        Description:  Clean up of unit testing.
+
+        Arguments:
+
+        """
+
+        shutil.rmtree(self.base_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
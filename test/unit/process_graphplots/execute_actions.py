@@ -0,0 +1,243 @@
+#!/usr/bin/python
+# Classification (U)
+
+"""Program:  execute_actions.py
+
+    Description:  Unit testing of execute_actions in process_graphplots.py.
+
+    Usage:
+        test/unit/process_graphplots/execute_actions.py
+
+    Arguments:
+
+"""
+
+# Libraries and Global Variables
+
+# Standard
+import sys
+import os
+import errno
+import shutil
+import tempfile
+
+if sys.version_info < (2, 7):
+    import unittest2 as unittest
+else:
+    import unittest
+
+# Local
+sys.path.append(os.getcwd())
+import process_graphplots
+import system
+import version
+
+__version__ = version.__version__
+
+
+class Graph(object):
+
+    """Class:  Graph
+
+    Description:  Class stub holder for the Graph class.
+
+    Methods:
+        __init__
+
+    """
+
+    def __init__(self, base_dir, log_hdlr):
+
+        """Method:  __init__
+
+        Description:  Class initialization.
+
+        Arguments:
+            (input) base_dir -> Base directory of the test.
+            (input) log_hdlr -> Error log file handler.
+
+        """
+
+        self.gp_dir = os.path.join(base_dir, "gp")
+        self.web_nonproc_dir = os.path.join(base_dir, "GP_non_processed")
+        self.error_log_hdlr = log_hdlr
+        self.retry_stats = system.StatCounter("Retries")
+        self.retry_max = 3
+        self.retry_delay = 0
+        self.outcomes = system.OutcomeTable()
+        self.failed = {}
+        self.catalog_db = None
+
+
+class UnitTest(unittest.TestCase):
+
+    """Class:  UnitTest
+
+    Description:  Class which is a representation of a unit testing.
+
+    Methods:
+        setUp -> Initialize testing environment.
+        stub_run_action -> Stub of run_action.
+        test_first_attempt_failure -> Test permanent first attempt failure.
+        test_other_file -> Test actions of other files are run.
+        test_nonproc_failure -> Test failure of a non-processed move.
+        tearDown -> Clean up of testing environment.
+
+    """
+
+    def setUp(self):
+
+        """Function:  setUp
+
+        Description:  Initialization for unit testing.
+
+        Arguments:
+
+        """
+
+        self.base_dir = tempfile.mkdtemp()
+        self.log_hdlr = open(os.path.join(self.base_dir, "error.log"), "w")
+        self.graph = Graph(self.base_dir, self.log_hdlr)
+        self.cmd_dir = os.path.join(self.graph.gp_dir, "CMDA")
+        os.makedirs(self.cmd_dir)
+        os.makedirs(self.graph.web_nonproc_dir)
+        self.fname = "20190304_0506Z_1234E56789_ABC_FR_AB.jpg"
+        self.new_fname = "20190304_0506Z_1234E56789_TARGETONE_ABC_FR_AB.jpg"
+        self.key = ("CMDA", self.fname)
+
+        for name in [self.fname, self.fname + ".xml"]:
+            with open(os.path.join(self.cmd_dir, name), "wb") as f_hdlr:
+                f_hdlr.write(b"\xff" * 100)
+
+        self.graph.outcomes.add("CMDA", self.fname,
+                                os.path.join(self.cmd_dir, self.fname))
+        self.graph.outcomes.set_state("CMDA", self.fname, "accepted",
+                                      be="1234E56789")
+
+        self.actions = [
+            {"op": "copy", "key": self.key,
+             "src": os.path.join(self.cmd_dir, self.fname + ".xml"),
+             "dst": os.path.join(self.base_dir, "meta",
+                                 self.new_fname + ".xml")},
+            {"op": "rename", "key": self.key,
+             "src": os.path.join(self.cmd_dir, self.fname),
+             "dst": os.path.join(self.cmd_dir, self.new_fname)},
+            {"op": "move", "key": self.key,
+             "src": os.path.join(self.cmd_dir, self.new_fname),
+             "dst": os.path.join(self.base_dir, "web", self.new_fname)},
+            {"op": "move", "key": self.key,
+             "src": os.path.join(self.cmd_dir, self.fname + ".xml"),
+             "dst": os.path.join(self.base_dir, "meta",
+                                 self.new_fname + ".IPL.xml")}]
+        self.fail_ops = ["copy"]
+        self.ran = []
+        self.run_action = process_graphplots.run_action
+        process_graphplots.run_action = self.stub_run_action
+
+    def stub_run_action(self, GRAPH, action, **kwargs):
+
+        """Function:  stub_run_action
+
+        Description:  Stub of run_action, failing the actions of the
+            failing types with a permanent error.
+
+        Arguments:
+
+        """
+
+        if action["op"] in self.fail_ops:
+            raise EnvironmentError(errno.EISDIR, "Is a directory",
+                                   action["dst"])
+
+        self.ran.append(action)
+
+    def test_first_attempt_failure(self):
+
+        """Function:  test_first_attempt_failure
+
+        Description:  Test a permanent failure on the first attempt drops the
+            remaining actions of the file and parks the graph plot file.
+
+        Arguments:
+
+        """
+
+        self.graph.outcomes.set_state("CMDA", self.fname, "published")
+        process_graphplots.execute_actions(self.graph, self.actions)
+
+        self.assertEqual(self.ran, [])
+        self.assertTrue(self.key in self.graph.failed)
+        self.assertTrue(os.path.isfile(
+            os.path.join(self.graph.web_nonproc_dir, self.fname)))
+        self.assertTrue(os.path.isfile(
+            os.path.join(self.graph.web_nonproc_dir, self.fname + ".xml")))
+        self.assertEqual(self.graph.outcomes.files[self.key]["state"],
+                         "non_processed")
+        self.assertEqual(self.graph.outcomes.files[self.key]["be"],
+                         "1234E56789")
+
+    def test_other_file(self):
+
+        """Function:  test_other_file
+
+        Description:  Test the actions of other files are still run after a
+            permanent failure.
+
+        Arguments:
+
+        """
+
+        other = {"op": "move", "key": ("CMDA", "other.jpg"),
+                 "src": os.path.join(self.cmd_dir, "other.jpg"),
+                 "dst": os.path.join(self.base_dir, "web", "other.jpg")}
+
+        self.graph.outcomes.set_state("CMDA", self.fname, "published")
+        process_graphplots.execute_actions(self.graph, self.actions + [other])
+
+        self.assertEqual(self.ran, [other])
+
+    def test_nonproc_failure(self):
+
+        """Function:  test_nonproc_failure
+
+        Description:  Test a permanent failure of the planned move of a file
+            to the non-processed directory, which is then moved by the
+            fallback, keeps the outcome recorded when it was planned.
+
+        Arguments:
+
+        """
+
+        self.fail_ops = ["move"]
+        self.graph.outcomes.set_state("CMDA", self.fname, "non_processed",
+                                      "Not in a region BE list")
+        action = {"op": "move", "key": self.key,
+                  "src": os.path.join(self.cmd_dir, self.fname),
+                  "dst": os.path.join(self.graph.web_nonproc_dir,
+                                      self.fname)}
+
+        process_graphplots.execute_actions(self.graph, [action])
+
+        self.assertTrue(os.path.isfile(action["dst"]))
+        self.assertEqual(self.graph.outcomes.files[self.key]["state"],
+                         "non_processed")
+        self.assertEqual(self.graph.outcomes.files[self.key]["reason"],
+                         "Not in a region BE list")
+
+    def tearDown(self):
+
+        """Function:  tearDown
+
+        Description:  Clean up of unit testing.
+
+        Arguments:
+
+        """
+
+        process_graphplots.run_action = self.run_action
+        self.log_hdlr.close()
+        shutil.rmtree(self.base_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
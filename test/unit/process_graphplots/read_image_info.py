@@ -0,0 +1,141 @@
+#!/usr/bin/python
+# Classification (U)
+
+"""Program:  read_image_info.py
+
+    Description:  Unit testing of read_image_info in process_graphplots.py.
+
+    Usage:
+        test/unit/process_graphplots/read_image_info.py
+
+    Arguments:
+
+"""
+
+# Libraries and Global Variables
+
+# Standard
+import sys
+import os
+import shutil
+import hashlib
+import tempfile
+
+if sys.version_info < (2, 7):
+    import unittest2 as unittest
+else:
+    import unittest
+
+# Local
+sys.path.append(os.getcwd())
+import process_graphplots
+import system
+import version
+
+__version__ = version.__version__
+
+
+class UnitTest(unittest.TestCase):
+
+    """Class:  UnitTest
+
+    Description:  Class which is a representation of a unit testing.
+
+    Methods:
+        setUp -> Initialize testing environment.
+        test_hash_jpeg -> Test hash of a JPEG file in the header read.
+        test_hash_other -> Test hash of a file which is not a JPEG file.
+        test_no_hash -> Test only the header of a JPEG file is read.
+        tearDown -> Clean up of testing environment.
+
+    """
+
+    def setUp(self):
+
+        """Function:  setUp
+
+        Description:  Initialization for unit testing.
+
+        Arguments:
+
+        """
+
+        self.base_dir = tempfile.mkdtemp()
+        self.data = b"\xff\xd8\xff\xd9" + b"\x11" * (
+            process_graphplots.IMAGE_HEADER_MAX * 2 + 10)
+        self.jpg_file = os.path.join(self.base_dir, "a.jpg")
+        self.txt_file = os.path.join(self.base_dir, "a.txt")
+
+        for fname in [self.jpg_file, self.txt_file]:
+            with open(fname, "wb") as f_hdlr:
+                f_hdlr.write(self.data)
+
+        self.sys_calls = system.StatCounter("System calls")
+
+    def test_hash_jpeg(self):
+
+        """Function:  test_hash_jpeg
+
+        Description:  Test the hash of a JPEG file is computed with a single
+            open of the file.
+
+        Arguments:
+
+        """
+
+        hasher = hashlib.sha256()
+        info = process_graphplots.read_image_info(
+            self.jpg_file, sys_calls=self.sys_calls, hasher=hasher)
+
+        self.assertEqual(info["size"], len(self.data))
+        self.assertEqual(hasher.hexdigest(),
+                         hashlib.sha256(self.data).hexdigest())
+        self.assertEqual(self.sys_calls.counts["open"], 1)
+
+    def test_hash_other(self):
+
+        """Function:  test_hash_other
+
+        Description:  Test the hash of a file which is not a JPEG file.
+
+        Arguments:
+
+        """
+
+        hasher = hashlib.sha256()
+        process_graphplots.read_image_info(self.txt_file, hasher=hasher)
+
+        self.assertEqual(hasher.hexdigest(),
+                         hashlib.sha256(self.data).hexdigest())
+
+    def test_no_hash(self):
+
+        """Function:  test_no_hash
+
+        Description:  Test only the header of a JPEG file is read without a
+            hasher.
+
+        Arguments:
+
+        """
+
+        process_graphplots.read_image_info(self.jpg_file,
+                                           sys_calls=self.sys_calls)
+
+        self.assertEqual(self.sys_calls.counts["read"], 1)
+
+    def tearDown(self):
+
+        """Function:  tearDown
+
+        Description:  Clean up of unit testing.
+
+        Arguments:
+
+        """
+
+        shutil.rmtree(self.base_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
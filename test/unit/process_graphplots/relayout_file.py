@@ -0,0 +1,180 @@
+#!/usr/bin/python
+# Classification (U)
+
+"""Program:  relayout_file.py
+
+    Description:  Unit testing of relayout_file in process_graphplots.py.
+
+    Usage:
+        test/unit/process_graphplots/relayout_file.py
+
+    Arguments:
+
+"""
+
+# Libraries and Global Variables
+
+# Standard
+import sys
+import os
+import shutil
+import hashlib
+import tempfile
+
+if sys.version_info < (2, 7):
+    import unittest2 as unittest
+else:
+    import unittest
+
+# Local
+sys.path.append(os.getcwd())
+import process_graphplots
+import system
+import version
+
+__version__ = version.__version__
+
+
+class Graph(object):
+
+    """Class:  Graph
+
+    Description:  Class stub holder for the Graph class.
+
+    Methods:
+        __init__
+
+    """
+
+    def __init__(self, base_dir, log_hdlr):
+
+        """Method:  __init__
+
+        Description:  Class initialization.
+
+        Arguments:
+            (input) base_dir -> Base directory of the test.
+            (input) log_hdlr -> Error log file handler.
+
+        """
+
+        self.tgtdeck = os.path.join(base_dir, "tgtDeck")
+        self.graphbase_dir = os.path.join(base_dir, "web")
+        self.image_dir = None
+        self.metacard_dir = None
+        self.archive_dir = os.path.join(base_dir, "arch")
+        self.web_layout = "hash"
+        self.error_log_hdlr = log_hdlr
+        self.dry_run = False
+        self.web_id = -1
+        self.web_grp = -1
+        self.d_perm = 0o775
+        self.sys_calls = system.StatCounter("System calls")
+        self.publish_mode = "direct"
+        self.throttles = {}
+        self.touched = {}
+
+
+class UnitTest(unittest.TestCase):
+
+    """Class:  UnitTest
+
+    Description:  Class which is a representation of a unit testing.
+
+    Methods:
+        setUp -> Initialize testing environment.
+        test_renamed_target -> Test file whose target name has changed.
+        test_no_manifest_entry -> Test file without a manifest entry.
+        tearDown -> Clean up of testing environment.
+
+    """
+
+    def setUp(self):
+
+        """Function:  setUp
+
+        Description:  Initialization for unit testing.
+
+        Arguments:
+
+        """
+
+        self.base_dir = tempfile.mkdtemp()
+        self.log_hdlr = open(os.path.join(self.base_dir, "error.log"), "w")
+        self.graph = Graph(self.base_dir, self.log_hdlr)
+        self.mm_dir = os.path.join(self.graph.graphbase_dir, "EUR", "FR",
+                                   "Gp", "2019", "03")
+        os.makedirs(self.mm_dir)
+        self.fname = "20190304_0506Z_1234E56789_TARGETONE_ABC_FR_AB.jpg"
+
+        with open(os.path.join(self.mm_dir, self.fname), "wb") as f_hdlr:
+            f_hdlr.write(b"\xff" * 100)
+
+        # The target name of the BE number has changed since publication.
+        self.opts = {"deck": {"1234E56789": "1234E56789\tNEWNAME\n"},
+                     "files": {self.fname: {"cmd": "CMDA",
+                                            "tgt_name": "TARGETONE"}},
+                     "stats": system.StatCounter("Relayout"),
+                     "created": set()}
+        self.leaf_dir = os.path.join(
+            self.mm_dir,
+            hashlib.md5(self.fname.encode("utf-8")).hexdigest()[0:2])
+
+    def test_renamed_target(self):
+
+        """Function:  test_renamed_target
+
+        Description:  Test the relayout of a file whose name differs from the
+            name for the current target deck.
+
+        Arguments:
+
+        """
+
+        F_INST = process_graphplots.relayout_file(
+            self.graph, self.mm_dir, self.fname, self.mm_dir, **self.opts)
+
+        self.assertEqual(F_INST.new_fname, self.fname)
+        self.assertEqual(F_INST.tgt_name, "TARGETONE")
+        self.assertEqual(F_INST.cmd, "CMDA")
+        self.assertEqual(F_INST.leaf_dir, self.leaf_dir)
+        self.assertTrue(os.path.isfile(os.path.join(self.leaf_dir,
+                                                    self.fname)))
+
+    def test_no_manifest_entry(self):
+
+        """Function:  test_no_manifest_entry
+
+        Description:  Test the relayout of a file without a manifest entry
+            keeps the name of the file.
+
+        Arguments:
+
+        """
+
+        self.opts["files"] = {}
+
+        F_INST = process_graphplots.relayout_file(
+            self.graph, self.mm_dir, self.fname, self.mm_dir, **self.opts)
+
+        self.assertEqual(F_INST.new_fname, self.fname)
+        self.assertEqual(F_INST.leaf_dir, self.leaf_dir)
+        self.assertTrue(os.path.isfile(os.path.join(self.leaf_dir,
+                                                    self.fname)))
+
+    def tearDown(self):
+
+        """Function:  tearDown
+
+        Description:  Clean up of unit testing.
+
+        Arguments:
+
+        """
+
+        self.log_hdlr.close()
+        shutil.rmtree(self.base_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
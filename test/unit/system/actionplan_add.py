@@ -0,0 +1,141 @@
+#!/usr/bin/python
+# Classification (U)
+
+"""Program:  actionplan_add.py
+
+    Description:  Unit testing of ActionPlan.add in system.py.
+
+    Usage:
+        test/unit/system/actionplan_add.py
+
+    Arguments:
+
+"""
+
+# Libraries and Global Variables
+
+# Standard
+import sys
+import os
+import shutil
+import tempfile
+
+if sys.version_info < (2, 7):
+    import unittest2 as unittest
+else:
+    import unittest
+
+# Local
+sys.path.append(os.getcwd())
+import system
+import version
+
+__version__ = version.__version__
+
+
+class UnitTest(unittest.TestCase):
+
+    """Class:  UnitTest
+
+    Description:  Class which is a representation of a unit testing.
+
+    Methods:
+        setUp -> Initialize testing environment.
+        test_cross_device_renamed -> Test cross device move of renamed file.
+        test_same_device_renamed -> Test same device move of renamed file.
+        test_copy -> Test copy of a file.
+        tearDown -> Clean up of testing environment.
+
+    """
+
+    def setUp(self):
+
+        """Function:  setUp
+
+        Description:  Initialization for unit testing.
+
+        Arguments:
+
+        """
+
+        self.base_dir = tempfile.mkdtemp()
+        self.src_dir = os.path.join(self.base_dir, "gp", "CMDA")
+        self.dst_dir = os.path.join(self.base_dir, "web")
+        os.makedirs(self.src_dir)
+        os.makedirs(self.dst_dir)
+        self.fname = os.path.join(self.src_dir, "file.jpg")
+        self.new_fname = os.path.join(self.src_dir, "new_file.jpg")
+
+        with open(self.fname, "wb") as f_hdlr:
+            f_hdlr.write(b"\xff" * 1000)
+
+        self.plan = system.ActionPlan()
+
+    def test_cross_device_renamed(self):
+
+        """Function:  test_cross_device_renamed
+
+        Description:  Test the planned move across devices of a file renamed
+            earlier in the plan, which does not exist under its new name yet.
+
+        Arguments:
+
+        """
+
+        self.plan.dev_cache[self.src_dir] = 1
+        self.plan.dev_cache[self.dst_dir] = 2
+        self.plan.add("rename", self.fname, self.new_fname)
+        self.plan.add("move", self.new_fname,
+                      os.path.join(self.dst_dir, "new_file.jpg"))
+
+        self.assertEqual(self.plan.actions[-1]["bytes"], 1000)
+
+    def test_same_device_renamed(self):
+
+        """Function:  test_same_device_renamed
+
+        Description:  Test the planned move on the same device of a renamed
+            file.
+
+        Arguments:
+
+        """
+
+        self.plan.dev_cache[self.src_dir] = 1
+        self.plan.dev_cache[self.dst_dir] = 1
+        self.plan.add("rename", self.fname, self.new_fname)
+        self.plan.add("move", self.new_fname,
+                      os.path.join(self.dst_dir, "new_file.jpg"))
+
+        self.assertEqual(self.plan.actions[-1]["bytes"], 0)
+
+    def test_copy(self):
+
+        """Function:  test_copy
+
+        Description:  Test the planned copy of a file.
+
+        Arguments:
+
+        """
+
+        self.plan.add("copy", self.fname,
+                      os.path.join(self.dst_dir, "file.jpg"))
+
+        self.assertEqual(self.plan.actions[-1]["bytes"], 1000)
+
+    def tearDown(self):
+
+        """Function:  tearDown
+
+        Description:  Clean up of unit testing.
+
+        Arguments:
+
+        """
+
+        shutil.rmtree(self.base_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,173 @@
+#!/usr/bin/python
+# Classification (U)
+
+"""Program:  actionplan_ordered.py
+
+    Description:  Unit testing of ActionPlan.ordered in system.py.
+
+    Usage:
+        test/unit/system/actionplan_ordered.py
+
+    Arguments:
+
+"""
+
+# Libraries and Global Variables
+
+# Standard
+import sys
+import os
+import shutil
+import tempfile
+
+if sys.version_info < (2, 7):
+    import unittest2 as unittest
+else:
+    import unittest
+
+# Local
+sys.path.append(os.getcwd())
+import system
+import version
+
+__version__ = version.__version__
+
+
+class UnitTest(unittest.TestCase):
+
+    """Class:  UnitTest
+
+    Description:  Class which is a representation of a unit testing.
+
+    Methods:
+        setUp -> Initialize testing environment.
+        plan_file -> Plan the copy and web move of a file.
+        test_batches -> Test files are placed batch by batch.
+        test_one_batch -> Test the actions of all files as one batch.
+        test_link_batch -> Test a link waits for the file it links to.
+        tearDown -> Clean up of testing environment.
+
+    """
+
+    def setUp(self):
+
+        """Function:  setUp
+
+        Description:  Initialization for unit testing.
+
+        Arguments:
+
+        """
+
+        self.base_dir = tempfile.mkdtemp()
+        self.src_dir = os.path.join(self.base_dir, "gp")
+        self.img_dir = os.path.join(self.base_dir, "img")
+        self.web_dir = os.path.join(self.base_dir, "web")
+
+        for d_name in [self.src_dir, self.img_dir, self.web_dir]:
+            os.makedirs(d_name)
+
+        # One command with a large drop planned before the other command.
+        self.keys = [("CMDA", "a1.jpg"), ("CMDB", "b1.jpg"),
+                     ("CMDA", "a2.jpg"), ("CMDA", "a3.jpg")]
+        self.plan = system.ActionPlan(2)
+
+    def plan_file(self, key):
+
+        """Function:  plan_file
+
+        Description:  Plan the copy and web move of a file.
+
+        Arguments:
+            (input) key -> Identifier of the intake file.
+
+        """
+
+        src_file = os.path.join(self.src_dir, key[1])
+
+        with open(src_file, "wb") as f_hdlr:
+            f_hdlr.write(b"\xff" * 10)
+
+        self.plan.add("copy", src_file, os.path.join(self.img_dir, key[1]),
+                      key)
+        self.plan.add("move", src_file, os.path.join(self.web_dir, key[1]),
+                      key)
+
+    def test_batches(self):
+
+        """Function:  test_batches
+
+        Description:  Test the files of the first batch of the processing
+            order are placed before the files of a later batch are copied.
+
+        Arguments:
+
+        """
+
+        for key in [self.keys[0], self.keys[2], self.keys[3], self.keys[1]]:
+            self.plan_file(key)
+
+        self.plan.schedule(self.keys)
+
+        self.assertEqual(
+            [(x["op"], x["key"][1]) for x in self.plan.ordered()],
+            [("copy", "a1.jpg"), ("copy", "b1.jpg"), ("move", "a1.jpg"),
+             ("move", "b1.jpg"), ("copy", "a2.jpg"), ("copy", "a3.jpg"),
+             ("move", "a2.jpg"), ("move", "a3.jpg")])
+
+    def test_one_batch(self):
+
+        """Function:  test_one_batch
+
+        Description:  Test a batch size of zero executes the actions of all
+            files as one batch.
+
+        Arguments:
+
+        """
+
+        self.plan.batch_size = 0
+
+        for key in self.keys:
+            self.plan_file(key)
+
+        self.plan.schedule(self.keys)
+
+        self.assertEqual([x["op"] for x in self.plan.ordered()],
+                         ["copy"] * 4 + ["move"] * 4)
+
+    def test_link_batch(self):
+
+        """Function:  test_link_batch
+
+        Description:  Test a link of an earlier batch is executed in the
+            batch placing the file it links to.
+
+        Arguments:
+
+        """
+
+        self.plan_file(self.keys[3])
+        self.plan.add("link", os.path.join(self.web_dir, "a3.jpg"),
+                      os.path.join(self.web_dir, "a1.jpg"), self.keys[0])
+        self.plan.schedule(self.keys)
+
+        self.assertEqual(
+            [(x["op"], x["key"][1]) for x in self.plan.ordered()],
+            [("copy", "a3.jpg"), ("move", "a3.jpg"), ("link", "a1.jpg")])
+
+    def tearDown(self):
+
+        """Function:  tearDown
+
+        Description:  Clean up of unit testing.
+
+        Arguments:
+
+        """
+
+        shutil.rmtree(self.base_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
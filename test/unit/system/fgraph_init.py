@@ -0,0 +1,113 @@
+#!/usr/bin/python
+# Classification (U)
+
+"""Program:  fgraph_init.py
+
+    Description:  Unit testing of FGraph.__init__ in system.py.
+
+    Usage:
+        test/unit/system/fgraph_init.py
+
+    Arguments:
+
+"""
+
+# Libraries and Global Variables
+
+# Standard
+import sys
+import os
+
+if sys.version_info < (2, 7):
+    import unittest2 as unittest
+else:
+    import unittest
+
+# Local
+sys.path.append(os.getcwd())
+import system
+import version
+
+__version__ = version.__version__
+
+
+class UnitTest(unittest.TestCase):
+
+    """Class:  UnitTest
+
+    Description:  Class which is a representation of a unit testing.
+
+    Methods:
+        setUp -> Initialize testing environment.
+        test_intake -> Test new file name of an intake file.
+        test_intake_target -> Test intake file name with the target name.
+        test_reprocessed -> Test new file name of a reprocessed file.
+
+    """
+
+    def setUp(self):
+
+        """Function:  setUp
+
+        Description:  Initialization for unit testing.
+
+        Arguments:
+
+        """
+
+        self.deck = {"1234E56789": "1234E56789\tTARGETONE\n"}
+        self.fname = "20190304_0506Z_1234E56789_TARGETONE_ABC_FR_AB.jpg"
+
+    def test_intake(self):
+
+        """Function:  test_intake
+
+        Description:  Test the target name is added to the new file name of
+            an intake file.
+
+        Arguments:
+
+        """
+
+        f_inst = system.FGraph("20190304_0506Z_1234E56789_ABC_FR_AB.jpg",
+                               "CMDA", None, "/gp", deck=self.deck)
+
+        self.assertEqual(f_inst.new_fname, self.fname)
+
+    def test_intake_target(self):
+
+        """Function:  test_intake_target
+
+        Description:  Test the target name is added to the new file name of
+            an intake file, even if the rest of its name starts with it.
+
+        Arguments:
+
+        """
+
+        f_inst = system.FGraph(self.fname, "CMDA", None, "/gp",
+                               deck=self.deck)
+
+        self.assertEqual(
+            f_inst.new_fname,
+            "20190304_0506Z_1234E56789_TARGETONE_TARGETONE_ABC_FR_AB.jpg")
+
+    def test_reprocessed(self):
+
+        """Function:  test_reprocessed
+
+        Description:  Test the target name is not added again to the new file
+            name of a reprocessed file.
+
+        Arguments:
+
+        """
+
+        f_inst = system.FGraph(self.fname, "CMDA", None, "/gp",
+                               deck=self.deck, reprocessed=True)
+
+        self.assertEqual(f_inst.new_fname, self.fname)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+#!/usr/bin/python
+# Classification (U)
+
+"""Program:  runlog_rotate.py
+
+    Description:  Unit testing of RunLog.rotate in system.py.
+
+    Usage:
+        test/unit/system/runlog_rotate.py
+
+    Arguments:
+
+"""
+
+# Libraries and Global Variables
+
+# Standard
+import sys
+import os
+import shutil
+import tempfile
+import subprocess
+
+if sys.version_info < (2, 7):
+    import unittest2 as unittest
+else:
+    import unittest
+
+# Local
+sys.path.append(os.getcwd())
+import system
+import version
+
+__version__ = version.__version__
+
+# Run writing to the log until told to stop on standard in.
+WRITER = """
+import sys
+sys.path.append({0!r})
+import system
+log = system.RunLog({1!r}, "run1", max_size=1)
+log.write("first\\n")
+sys.stdout.write("ready\\n")
+sys.stdout.flush()
+sys.stdin.readline()
+log.write("second\\n")
+log.close()
+"""
+
+
+class UnitTest(unittest.TestCase):
+
+    """Class:  UnitTest
+
+    Description:  Class which is a representation of a unit testing.
+
+    Methods:
+        setUp -> Initialize testing environment.
+        get_segs -> Return the rotated segments of the log.
+        test_open_segment -> Test a segment open by a run is not compressed.
+        test_idle_segment -> Test an idle segment is compressed.
+        tearDown -> Clean up of testing environment.
+
+    """
+
+    def setUp(self):
+
+        """Function:  setUp
+
+        Description:  Initialization for unit testing.
+
+        Arguments:
+
+        """
+
+        self.base_dir = tempfile.mkdtemp()
+        self.fname = os.path.join(self.base_dir, "gp.log")
+
+    def get_segs(self):
+
+        """Function:  get_segs
+
+        Description:  Return the rotated segments of the log.
+
+        Arguments:
+            (output) List of segment names.
+
+        """
+
+        return sorted([x for x in os.listdir(self.base_dir)
+                       if x.startswith("gp.log.") and x != "gp.log.lock"])
+
+    def test_open_segment(self):
+
+        """Function:  test_open_segment
+
+        Description:  Test a segment still open by a run is not compressed
+            and the later lines of the run are kept in it.
+
+        Arguments:
+
+        """
+
+        proc = subprocess.Popen(
+            [sys.executable, "-c", WRITER.format(os.getcwd(), self.fname)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        proc.stdout.readline()
+
+        log = system.RunLog(self.fname, "run2", max_size=1)
+        log.write("other\n")
+        log.close()
+        segs = self.get_segs()
+
+        proc.communicate(b"\n")
+
+        self.assertEqual(len(segs), 1)
+        self.assertFalse(segs[0].endswith(".gz"))
+
+        with open(os.path.join(self.base_dir, segs[0])) as f_hdlr:
+            self.assertTrue(f_hdlr.read().endswith("run1 second\n"))
+
+    def test_idle_segment(self):
+
+        """Function:  test_idle_segment
+
+        Description:  Test a segment no longer open by a run is compressed.
+
+        Arguments:
+
+        """
+
+        log = system.RunLog(self.fname, "run1", max_size=1)
+        log.write("first\n")
+        log.close()
+
+        log = system.RunLog(self.fname, "run2", max_size=1)
+        log.write("other\n")
+        log.close()
+
+        segs = self.get_segs()
+
+        self.assertEqual(len(segs), 1)
+        self.assertTrue(segs[0].endswith(".gz"))
+
+    def tearDown(self):
+
+        """Function:  tearDown
+
+        Description:  Clean up of unit testing.
+
+        Arguments:
+
+        """
+
+        shutil.rmtree(self.base_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,4 +6,4 @@
 
 """
 
-__version__ = "2.0.3"
+__version__ = "2.1.0"